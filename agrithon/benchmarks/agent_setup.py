@@ -0,0 +1,158 @@
+# File: agent_setup.py
+"""
+Per-request cost of the contextual tool-calling agent: rebuilding it for every
+message (tools as closures over the user, prompt, chat client, agent and a
+verbose AgentExecutor) vs the shared PrebuiltAgent in users/chat_agent.py,
+which only sets the agent_user context variable per request.
+
+Two numbers per strategy:
+    setup   - work done before the agent runs (what each request pays up front);
+    turn    - a full agent turn against a stub chat model that calls one tool
+              and then answers, so only LangChain's own overhead is measured.
+The verbose AgentExecutor prints its trace to stdout; that is redirected to
+/dev/null while timing, so the cost of formatting it is still counted.
+
+The chat client is ChatGoogleGenerativeAI (with a dummy key, nothing is sent)
+when langchain_google_genai is installed, otherwise the stub model is used
+for the rebuild too and the setup numbers leave out client construction.
+
+Run from the agrithon/ directory:
+    python -m benchmarks.agent_setup --requests 300
+"""
+import argparse
+import contextlib
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from users.chat_agent import PrebuiltAgent, build_agent_executor, current_agent_user
+
+SYSTEM_PROMPT = "You are a helpful and friendly farming assistant."
+
+
+class StubToolCallingModel(BaseChatModel):
+    """Calls get_weather_forecast once, then answers with the tool's output."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-tool-calling"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content=f"Answer: {messages[-1].content}")
+        else:
+            message = AIMessage(content="", tool_calls=[
+                {"name": "get_weather_forecast", "args": {"query": "rain"}, "id": "call_1"},
+            ])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def gemini_client():
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+    except ImportError:
+        return None
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+    return lambda: ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.1)
+
+
+def weather_for(user, query: str) -> str:
+    return f"{query} forecast for {user.latitude},{user.longitude}: clear"
+
+
+def rebuilt_agent(user, llm):
+    """The old per-request construction, closures included."""
+    @tool
+    def get_weather_forecast(query: str) -> str:
+        """Useful for getting the weather forecast for the user's location."""
+        return weather_for(user, query)
+
+    @tool
+    def get_mandi_prices(commodity: str) -> str:
+        """Use this FIRST for crop/commodity price questions."""
+        return f"{commodity} prices for {user.phone}"
+
+    @tool
+    def get_general_agriculture_information(query: str) -> str:
+        """Useful for general agriculture questions."""
+        return query
+
+    tools = [get_weather_forecast, get_mandi_prices, get_general_agriculture_information]
+    return build_agent_executor(llm, tools, SYSTEM_PROMPT, verbose=True, handle_parsing_errors=True)
+
+
+@tool("get_weather_forecast")
+def shared_weather_forecast(query: str) -> str:
+    """Useful for getting the weather forecast for the user's location."""
+    return weather_for(current_agent_user(), query)
+
+
+@tool
+def get_mandi_prices(commodity: str) -> str:
+    """Use this FIRST for crop/commodity price questions."""
+    return f"{commodity} prices for {current_agent_user().phone}"
+
+
+@tool
+def get_general_agriculture_information(query: str) -> str:
+    """Useful for general agriculture questions."""
+    return query
+
+
+def percentiles(samples: list) -> str:
+    return f"p50 {np.percentile(samples, 50):8.1f} µs   p99 {np.percentile(samples, 99):8.1f} µs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    users = [SimpleNamespace(phone=f"+9190000{i:05d}", latitude=20 + i % 10, longitude=75 + i % 7)
+             for i in range(args.requests)]
+    stub = StubToolCallingModel()
+    client = gemini_client()
+    print(f"\n{args.requests} requests, rebuild client: "
+          f"{'ChatGoogleGenerativeAI' if client else 'stub model (langchain_google_genai not installed)'}\n")
+
+    prebuilt = PrebuiltAgent(stub, [shared_weather_forecast, get_mandi_prices, get_general_agriculture_information],
+                             SYSTEM_PROMPT, handle_parsing_errors=True)
+    prebuilt.executor  # built once, outside the timed loop
+
+    rebuild_setup, shared_setup, rebuild_turn, shared_turn = [], [], [], []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for user in users:
+            started = time.perf_counter()
+            rebuilt_agent(user, client() if client else stub)
+            rebuild_setup.append((time.perf_counter() - started) * 1e6)
+
+            started = time.perf_counter()
+            prebuilt.executor
+            shared_setup.append((time.perf_counter() - started) * 1e6)
+
+            started = time.perf_counter()
+            rebuilt = rebuilt_agent(user, stub)
+            rebuilt.invoke({"input": "will it rain", "chat_history": []})
+            rebuild_turn.append((time.perf_counter() - started) * 1e6)
+
+            started = time.perf_counter()
+            output = prebuilt.invoke("will it rain", [], user)["output"]
+            shared_turn.append((time.perf_counter() - started) * 1e6)
+            assert f"{user.latitude},{user.longitude}" in output, output
+
+    print(f"setup  rebuilt per request   {percentiles(rebuild_setup)}")
+    print(f"setup  PrebuiltAgent         {percentiles(shared_setup)}")
+    print(f"turn   rebuilt, verbose      {percentiles(rebuild_turn)}")
+    print(f"turn   PrebuiltAgent         {percentiles(shared_turn)}")
+    print(f"\nsaved per request (mean turn): "
+          f"{(np.mean(rebuild_turn) - np.mean(shared_turn)) / 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
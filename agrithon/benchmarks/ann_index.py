@@ -0,0 +1,124 @@
+# File: ann_index.py
+"""
+Recall-vs-latency benchmark for the index types in users/index_store.py.
+
+Builds flat, HNSW and IVF-PQ indexes over synthetic, clustered corpora (a
+mixture of Gaussians, closer to real chunk embeddings than uniform noise),
+then runs single-query searches the way a RAG request does and reports
+recall@k against exact search together with p50/p99 latency.
+
+Run from the agrithon/ directory (needs faiss-cpu):
+    python -m benchmarks.ann_index --sizes 10000,100000
+    python -m benchmarks.ann_index --sizes 1000000 --dim 768   # ~3 GB of vectors
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from users.index_store import MmapVectorStore, write_mmap_index
+
+
+class _NoEmbeddings:
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+class _Chunk:
+    page_content = ""
+    metadata = {}
+    id = None
+
+
+def make_corpus(count: int, dim: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(16, count // 500), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=count + queries)
+    points = centers[labels] + 0.35 * rng.normal(size=(count + queries, dim)).astype(np.float32)
+    return points[:count], points[count:]
+
+
+def exact_neighbours(corpus, queries, k: int):
+    import faiss
+
+    index = faiss.IndexFlatL2(corpus.shape[1])
+    index.add(corpus)
+    return index.search(queries, k)[1]
+
+
+def run_config(path, queries, truth, k: int, search_params: dict) -> dict:
+    store = MmapVectorStore(path, _NoEmbeddings(), search_params)
+    store.search_rows(queries[0], k)  # warm the page cache
+
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        rows, _ = store.search_rows(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(rows.tolist()) & set(expected.tolist()))
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=768, help="768 matches nomic-embed-text")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--configs", default=None,
+                        help='JSON list of [index_type, build_params, search_params] to override the defaults')
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    configs = json.loads(args.configs) if args.configs else [
+        ["flat", {}, {}],
+        ["hnsw", {"M": 32, "ef_construction": 200}, {"ef_search": 32}],
+        ["hnsw", {"M": 32, "ef_construction": 200}, {"ef_search": 128}],
+        ["ivfpq", {"m": 48}, {"nprobe": 8, "rerank": 0}],
+        ["ivfpq", {"m": 48}, {"nprobe": 16, "rerank": 4}],
+        ["ivfpq", {"m": 48}, {"nprobe": 64, "rerank": 4}],
+    ]
+
+    if not args.json:
+        print(f"{'size':>9}  {'index':<8}{'search params':<30}{'recall@' + str(args.k):>10}"
+              f"{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}")
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        corpus, queries = make_corpus(size, args.dim, args.queries)
+        truth = exact_neighbours(corpus, queries, args.k)
+        chunks = [_Chunk()] * size
+
+        built = {}
+        tmp = tempfile.mkdtemp()
+        try:
+            for index_type, build_params, search_params in configs:
+                key = (index_type, json.dumps(build_params, sort_keys=True))
+                if key not in built:
+                    path = os.path.join(tmp, f"{index_type}-{len(built)}")
+                    started = time.perf_counter()
+                    write_mmap_index(path, corpus, chunks, index_type=index_type, params=build_params)
+                    built[key] = (path, time.perf_counter() - started)
+                path, build_seconds = built[key]
+
+                result = run_config(path, queries, truth, args.k, search_params)
+                result.update(size=size, index_type=index_type, build_params=build_params,
+                              search_params=search_params, build_seconds=build_seconds)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(f"{size:>9}  {index_type:<8}{json.dumps(search_params):<30}{result['recall']:>10.3f}"
+                          f"{result['p50_ms']:>9.3f}{result['p99_ms']:>9.3f}{build_seconds:>9.1f}")
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# File: async_rag.py
+"""
+Concurrent throughput of RAGQueryEngineWithMemory.ask_question (threads) vs
+ask_question_async (one event loop).
+
+Gemini and Ollama are replaced by local stubs that only wait: the stub chat
+model sleeps --llm-ms per call (time.sleep on the sync path, asyncio.sleep
+on the async one) and answers SEARCH_NEEDED for every --fallback-every-th
+question, which triggers the second, web-search call; the stub embedder
+sleeps --embed-ms. The index is a small synthetic memory-mapped directory,
+so the numbers show how many questions one process keeps in flight, not
+model quality.
+
+Run from the agrithon/ directory:
+    python -m benchmarks.async_rag --questions 400 --concurrency 200 --threads 8
+"""
+import argparse
+import asyncio
+import hashlib
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from users.index_store import write_mmap_index
+from users.price_bot import RAGQueryEngineWithMemory
+
+DIM = 64
+
+
+class StubEmbeddings(Embeddings):
+    """Deterministic hash-seeded vectors after a fixed delay."""
+    def __init__(self, delay_ms: float):
+        self.delay = delay_ms / 1000
+
+    def _vector(self, text: str) -> list:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+        return np.random.default_rng(seed).normal(size=DIM).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        time.sleep(self.delay)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+class StubChatModel(BaseChatModel):
+    delay_ms: float = 800
+    fallback_every: int = 4
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _reply(self, messages) -> ChatResult:
+        question = str(messages[-1].content)
+        match = re.search(r"#(\d+)", question)
+        # The RAG prompt has a system message; the web-search prompt is a single user message.
+        is_rag_call = len(messages) > 1
+        if is_rag_call and match and self.fallback_every and int(match.group(1)) % self.fallback_every == 0:
+            text = "SEARCH_NEEDED: not in the stub corpus"
+        else:
+            text = f"Stub answer #{match.group(1) if match else '?'}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.delay_ms / 1000)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.delay_ms / 1000)
+        return self._reply(messages)
+
+
+def build_engine(path: str, args) -> RAGQueryEngineWithMemory:
+    embeddings = StubEmbeddings(args.embed_ms)
+    texts = [f"Stub chunk {i} about crop {i % 17} and pest {i % 11}." for i in range(500)]
+    write_mmap_index(path, np.asarray(embeddings.embed_documents(texts), dtype=np.float32),
+                     [Document(page_content=text) for text in texts])
+    llm = StubChatModel(delay_ms=args.llm_ms, fallback_every=args.fallback_every)
+    return RAGQueryEngineWithMemory(path, embeddings=embeddings, llm=llm, web_search_llm=llm, name="bench")
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_s": latencies[len(latencies) // 2],
+        "p99_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "elapsed_s": elapsed,
+    }
+
+
+def run_sync(engine, questions: list, threads: int) -> dict:
+    def ask(item):
+        number, question = item
+        started = time.perf_counter()
+        engine.ask_question(question, session_id=f"user{number}")
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(ask, enumerate(questions)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def run_async(engine, questions: list, concurrency: int, blocking_threads: int) -> dict:
+    # Embedding and index search run in the loop's default executor via asyncio.to_thread.
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=blocking_threads))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(number, question):
+        async with semaphore:
+            started = time.perf_counter()
+            await engine.ask_question_async(question, session_id=f"user{number}")
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(ask(number, question) for number, question in enumerate(questions)))
+    return summarize(list(latencies), time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8, help="sync path: worker threads (e.g. gunicorn --threads)")
+    parser.add_argument("--concurrency", type=int, default=200, help="async path: questions in flight")
+    parser.add_argument("--blocking-threads", type=int, default=32,
+                        help="async path: threads for the blocking embedding/search steps")
+    parser.add_argument("--llm-ms", type=float, default=800)
+    parser.add_argument("--embed-ms", type=float, default=20)
+    parser.add_argument("--fallback-every", type=int, default=4, help="every n-th question needs the web-search call")
+    args = parser.parse_args()
+
+    questions = [f"How do I protect crop {i % 17} from pest {i % 11}? #{i}" for i in range(args.questions)]
+    tmp = tempfile.mkdtemp()
+    try:
+        engine = build_engine(tmp, args)
+        results = {
+            f"sync, {args.threads} threads": run_sync(engine, questions, args.threads),
+            f"async, {args.concurrency} in flight": asyncio.run(
+                run_async(engine, questions, args.concurrency, args.blocking_threads)
+            ),
+        }
+    finally:
+        shutil.rmtree(tmp)
+
+    print(f"\n{args.questions} questions, stub LLM {args.llm_ms:.0f} ms/call, stub embedder {args.embed_ms:.0f} ms\n")
+    print(f"{'path':<26}{'q/s':>9}{'p50 s':>9}{'p99 s':>9}{'total s':>9}")
+    for name, result in results.items():
+        print(f"{name:<26}{result['throughput']:>9.1f}{result['p50_s']:>9.2f}{result['p99_s']:>9.2f}"
+              f"{result['elapsed_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
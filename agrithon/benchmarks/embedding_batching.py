@@ -0,0 +1,102 @@
+# File: embedding_batching.py
+"""
+Throughput benchmark for micro-batched query embedding.
+
+Starts a local stand-in for Ollama's /api/embed endpoint that charges a fixed
+per-request overhead plus a per-text cost, with one forward pass at a time
+(like a single model instance), then embeds queries from many concurrent
+threads with and without the BatchingEmbeddings dispatcher.
+
+Run from the agrithon/ directory:
+    python -m benchmarks.embedding_batching --threads 32 --queries 20
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from users.embedding_batcher import BatchingEmbeddings, OllamaBatchEmbeddings
+
+DIMENSIONS = 768
+
+
+def fake_vector(text: str) -> list:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [digest[i % len(digest)] / 255.0 for i in range(DIMENSIONS)]
+
+
+def make_handler(request_overhead: float, per_text_cost: float, model_lock: threading.Lock):
+    class StandInEmbedHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep(request_overhead)
+            with model_lock:
+                time.sleep(per_text_cost * len(texts))
+            payload = json.dumps({"embeddings": [fake_vector(text) for text in texts]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StandInEmbedHandler
+
+
+def run_load(embeddings, threads: int, queries: int) -> float:
+    """Returns queries per second for `threads` callers each embedding `queries` texts."""
+    def caller(worker_id):
+        for i in range(queries):
+            embeddings.embed_query(f"worker {worker_id} question {i} about wheat prices")
+
+    workers = [threading.Thread(target=caller, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * queries / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=20, help="queries per thread")
+    parser.add_argument("--request-overhead-ms", type=float, default=4.0)
+    parser.add_argument("--per-text-ms", type=float, default=1.0)
+    parser.add_argument("--windows", default="5,10,20", help="comma-separated batch windows in ms")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    handler = make_handler(args.request_overhead_ms / 1000, args.per_text_ms / 1000, threading.Lock())
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"Stand-in server at {base_url}: {args.request_overhead_ms} ms/request + {args.per_text_ms} ms/text")
+    print(f"{args.threads} threads x {args.queries} queries\n")
+    print(f"{'mode':<28}{'queries/s':>12}{'avg batch':>12}")
+
+    client = OllamaBatchEmbeddings("nomic-embed-text", base_url=base_url)
+    qps = run_load(client, args.threads, args.queries)
+    print(f"{'unbatched':<28}{qps:>12.1f}{1:>12}")
+
+    for window in [float(w) for w in args.windows.split(",")]:
+        batcher = BatchingEmbeddings(
+            OllamaBatchEmbeddings("nomic-embed-text", base_url=base_url),
+            max_wait_ms=window,
+            max_batch_size=args.batch_size,
+        )
+        qps = run_load(batcher, args.threads, args.queries)
+        print(f"{f'batched ({window:g} ms window)':<28}{qps:>12.1f}{batcher.stats()['avg_batch_size']:>12}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
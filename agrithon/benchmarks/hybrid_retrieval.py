@@ -0,0 +1,106 @@
+# File: hybrid_retrieval.py
+"""
+Offline benchmark: BM25 + vector fusion vs vector-only retrieval.
+
+Builds a labelled query set from the index itself: every rare, capitalised
+token in the corpus (trade names and chemicals such as "Confidor", "Amistar",
+"Colonel-S") becomes questions like "What is the dosage of Confidor?", and
+the chunks containing that token are the relevant ones. A query is a
+first-pass hit when one of them is in the top k; misses are the questions
+that would end in SEARCH_NEEDED and a second Gemini call.
+
+Run from the agrithon/ directory with Ollama serving nomic-embed-text (the
+model the bundled indexes were built with):
+    python -m benchmarks.hybrid_retrieval users/faiss_index_agri_pesticide
+"""
+import argparse
+import re
+import time
+
+from users.index_store import iter_texts, load_vector_store, search_rows
+from users.lexical_index import BM25Index, HybridRetriever, tokenize
+
+TEMPLATES = [
+    "What is {name} used for?",
+    "What is the recommended dosage of {name}?",
+    "Which pests does {name} control?",
+]
+
+
+def labelled_queries(texts: list, max_doc_freq: int = 2, limit: int = 200) -> list:
+    """Returns [(query, relevant_rows)] built from rare capitalised tokens."""
+    rows_by_name = {}
+    for row, text in enumerate(texts):
+        for name in set(re.findall(r"\b[A-Z][A-Za-z]{3,}(?:-[A-Za-z0-9]+)?\b", text)):
+            rows_by_name.setdefault(name, set()).add(row)
+
+    queries = []
+    for name, rows in sorted(rows_by_name.items()):
+        if len(rows) > max_doc_freq:
+            continue
+        # Every row containing the token (in any case) counts as relevant.
+        token = tokenize(name)[0]
+        relevant = {row for row, text in enumerate(texts) if token in tokenize(text)}
+        for template in TEMPLATES:
+            queries.append((template.format(name=name), relevant))
+    return queries[:limit]
+
+
+def evaluate(retrieve, queries: list, k: int) -> dict:
+    hits, reciprocal_ranks, latencies = 0, 0.0, []
+    for query, relevant in queries:
+        started = time.perf_counter()
+        rows = list(retrieve(query))[:k]
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranks = [rank for rank, row in enumerate(rows, 1) if row in relevant]
+        hits += bool(ranks)
+        reciprocal_ranks += 1.0 / ranks[0] if ranks else 0.0
+    latencies.sort()
+    return {
+        "hit_rate": hits / len(queries),
+        "mrr": reciprocal_ranks / len(queries),
+        "fallbacks": len(queries) - hits,
+        "p50_ms": latencies[len(latencies) // 2],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", help="index directory (LangChain FAISS or memory-mapped)")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--candidates", type=int, default=10, help="rows taken from each side before fusion")
+    parser.add_argument("--model", default="nomic-embed-text")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import OllamaEmbeddings
+    from users.embedding_cache import CachedEmbeddings
+
+    embeddings = CachedEmbeddings(
+        OllamaEmbeddings(model=args.model), model_name=args.model, namespace="ollama/api/embeddings"
+    )
+    vectorstore = load_vector_store(args.index, embeddings)
+    texts = list(iter_texts(vectorstore))
+    lexical = BM25Index.build(texts)
+    queries = labelled_queries(texts)
+    if not queries:
+        raise SystemExit("No rare capitalised tokens found to build queries from.")
+
+    # Embed every query once up front so both runs measure retrieval, not Ollama.
+    embeddings.embed_documents([query for query, _ in queries])
+
+    hybrid = HybridRetriever(vectorstore=vectorstore, lexical_index=lexical, k=args.k, candidates=args.candidates)
+    results = {
+        "vector-only": evaluate(
+            lambda q: search_rows(vectorstore, embeddings.embed_query(q), args.k)[0].tolist(), queries, args.k
+        ),
+        "bm25+vector (RRF)": evaluate(hybrid.fused_rows, queries, args.k),
+    }
+
+    print(f"{len(texts)} chunks, {len(queries)} labelled queries, k={args.k}\n")
+    print(f"{'retriever':<20}{'hit@' + str(args.k):>8}{'MRR':>8}{'misses':>8}{'p50 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<20}{result['hit_rate']:>8.3f}{result['mrr']:>8.3f}{result['fallbacks']:>8}{result['p50_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
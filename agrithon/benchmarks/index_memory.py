@@ -0,0 +1,102 @@
+# File: index_memory.py
+"""
+Per-worker memory benchmark: pickled FAISS loading vs the memory-mapped format.
+
+For each index, N worker processes load it the way a web worker would, run a
+few searches, and then report their memory while all of them are alive. RSS
+counts shared pages in every process; PSS splits shared pages between the
+processes that map them, so it shows the per-worker cost on the host.
+
+Run from the agrithon/ directory (Linux, needs faiss-cpu and langchain):
+    python -m benchmarks.index_memory --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from users.index_store import convert_faiss_index, is_mmap_index, load_vector_store
+
+USERS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "users")
+DEFAULT_INDEXES = [
+    os.path.join(USERS_DIR, "faiss_index_agri_pesticide"),
+    os.path.join(USERS_DIR, "faiss_index_agri"),
+]
+
+
+def read_memory_kb() -> dict:
+    memory = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                memory["rss"] = int(line.split()[1])
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    memory["pss"] = int(line.split()[1])
+    except FileNotFoundError:
+        memory["pss"] = None
+    return memory
+
+
+def worker(path, barrier, results):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    baseline = read_memory_kb()
+    store = load_vector_store(path, DeterministicFakeEmbedding(size=768))
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(20):
+        store.similarity_search_by_vector(rng.normal(size=768).astype(np.float32).tolist(), k=4)
+
+    # Measure while every worker is alive so shared pages are split between them.
+    barrier.wait()
+    loaded = read_memory_kb()
+    results.put({
+        "rss": loaded["rss"] - baseline["rss"],
+        "pss": None if loaded["pss"] is None else loaded["pss"] - baseline["pss"],
+    })
+    barrier.wait()
+
+
+def measure(path: str, workers: int) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(path, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    pss = [s["pss"] for s in samples if s["pss"] is not None]
+    return {
+        "rss_mb": sum(s["rss"] for s in samples) / len(samples) / 1024,
+        "pss_mb": sum(pss) / len(pss) / 1024 if pss else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("indexes", nargs="*", default=DEFAULT_INDEXES, help="LangChain FAISS directories")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'index':<30}{'format':<12}{'RSS/worker MB':>15}{'PSS/worker MB':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in args.indexes:
+            name = os.path.basename(path.rstrip("/"))
+            mmap_path = path if is_mmap_index(path) else os.path.join(tmp, name)
+            if mmap_path != path:
+                convert_faiss_index(path, mmap_path)
+                pickled = measure(path, args.workers)
+                print(f"{name:<30}{'pickled':<12}{pickled['rss_mb']:>15.1f}{pickled['pss_mb']:>15.1f}")
+            mapped = measure(mmap_path, args.workers)
+            print(f"{name:<30}{'mmap':<12}{mapped['rss_mb']:>15.1f}{mapped['pss_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
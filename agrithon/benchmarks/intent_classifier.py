@@ -0,0 +1,107 @@
+# File: intent_classifier.py
+"""
+Accuracy and latency of the local intent classifier (users/intent_classifier.py)
+on the held-out labelled messages in benchmarks/intent_samples.json.
+
+Reports coverage (share of messages answered locally instead of by Gemini),
+accuracy on the covered messages overall and per source (lexicon, centroid),
+what the two handler checks would return (greeting yes/no, query yes/no), and
+p50/p99 classification latency. --sweep prints coverage/accuracy for a grid of
+confidence thresholds to help tune min_similarity and min_margin.
+
+Run from the agrithon/ directory:
+    python -m benchmarks.intent_classifier
+    python -m benchmarks.intent_classifier --sweep --show-errors
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from users.intent_classifier import EXAMPLES_PATH, GREETING_LABELS, NON_QUERY_LABELS, IntentClassifier
+
+SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_samples.json")
+
+
+def evaluate(classifier: IntentClassifier, samples: list, repeat: int = 1) -> dict:
+    latencies, covered, correct, greeting_correct, query_correct, errors = [], 0, 0, 0, 0, []
+    by_source = {}
+    for sample in samples:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            prediction = classifier.classify(sample["text"])
+            latencies.append((time.perf_counter() - started) * 1e6)
+        if prediction is None:
+            continue
+        covered += 1
+        hit = prediction.label == sample["label"]
+        correct += hit
+        source = by_source.setdefault(prediction.source, [0, 0])
+        source[0] += hit
+        source[1] += 1
+        greeting_correct += (prediction.label in GREETING_LABELS) == (sample["label"] in GREETING_LABELS)
+        query_correct += (prediction.label in NON_QUERY_LABELS) == (sample["label"] in NON_QUERY_LABELS)
+        if not hit:
+            errors.append((sample["text"], sample["label"], prediction.label, prediction.confidence))
+
+    return {
+        "samples": len(samples),
+        "coverage": covered / len(samples),
+        "accuracy": correct / covered if covered else 0.0,
+        "greeting_accuracy": greeting_correct / covered if covered else 0.0,
+        "is_query_accuracy": query_correct / covered if covered else 0.0,
+        "by_source": {name: (hits / total, total) for name, (hits, total) in by_source.items()},
+        "p50_us": float(np.percentile(latencies, 50)),
+        "p99_us": float(np.percentile(latencies, 99)),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES_PATH)
+    parser.add_argument("--min-similarity", type=float, default=0.3)
+    parser.add_argument("--min-margin", type=float, default=0.06)
+    parser.add_argument("--repeat", type=int, default=20, help="timed classifications per message")
+    parser.add_argument("--sweep", action="store_true", help="also report a grid of thresholds")
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    with open(EXAMPLES_PATH, encoding="utf-8") as f:
+        examples = json.load(f)
+    with open(args.samples, encoding="utf-8") as f:
+        samples = json.load(f)
+
+    started = time.perf_counter()
+    classifier = IntentClassifier(examples, min_similarity=args.min_similarity, min_margin=args.min_margin)
+    build_ms = (time.perf_counter() - started) * 1000
+    result = evaluate(classifier, samples, args.repeat)
+
+    print(f"\n{result['samples']} held-out messages, classifier built in {build_ms:.0f} ms "
+          f"(min_similarity={args.min_similarity}, min_margin={args.min_margin})\n")
+    print(f"answered locally      {result['coverage']:>7.1%}   (the rest goes to Gemini)")
+    print(f"label accuracy        {result['accuracy']:>7.1%}")
+    print(f"check_greeting agrees {result['greeting_accuracy']:>7.1%}")
+    print(f"is_query agrees       {result['is_query_accuracy']:>7.1%}")
+    for source, (accuracy, total) in sorted(result["by_source"].items()):
+        print(f"  {source:<19} {accuracy:>7.1%}   on {total} messages")
+    print(f"latency p50 / p99     {result['p50_us']:>7.1f} / {result['p99_us']:.1f} µs")
+
+    if args.show_errors and result["errors"]:
+        print("\nMisclassified:")
+        for text, expected, predicted, confidence in result["errors"]:
+            print(f"  {text!r}: expected {expected}, got {predicted} ({confidence:.2f})")
+
+    if args.sweep:
+        print(f"\n{'min_sim':>8}{'margin':>8}{'coverage':>10}{'accuracy':>10}")
+        for min_similarity in (0.2, 0.25, 0.3, 0.35, 0.4):
+            for min_margin in (0.0, 0.03, 0.06, 0.1):
+                classifier.min_similarity, classifier.min_margin = min_similarity, min_margin
+                sweep = evaluate(classifier, samples)
+                print(f"{min_similarity:>8.2f}{min_margin:>8.2f}{sweep['coverage']:>10.1%}{sweep['accuracy']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
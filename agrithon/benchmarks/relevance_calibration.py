@@ -0,0 +1,89 @@
+# File: relevance_calibration.py
+"""
+Calibrates the relevance gate's per-engine thresholds (RAG_RELEVANCE_GATE).
+
+Runs the in-corpus questions of benchmarks/retrieval_queries.json and the
+off-corpus questions of benchmarks/off_corpus_queries.json through each
+engine's hybrid retriever and records, per question, the squared L2 distance
+of the best vector hit and the keyword overlap the gate sees. The suggested
+`max_distance` is the largest in-corpus distance plus a margin, so no
+labelled question is ever "far"; the report shows how many off-corpus
+questions the gate would then skip at the given `min_keyword_overlap`,
+which should sit between the lowest in-corpus and highest off-corpus overlap.
+
+Distances depend on the embedding endpoint (the legacy /api/embeddings
+vectors have a norm of ~20, /api/embed vectors are unit length), so calibrate
+with the embedder that is deployed:
+    python -m benchmarks.relevance_calibration                     # Ollama, as deployed
+    python -m benchmarks.relevance_calibration --embedder fake     # no Ollama; distances are not comparable
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from users.index_store import documents_for_rows
+from users.lexical_index import HybridRetriever, load_lexical_index
+from users.relevance_gate import keyword_overlap
+
+from .retrieval_regression import BENCHMARK_DIR, INDEX_PATHS, QUERIES_PATH, open_index
+
+OFF_CORPUS_PATH = os.path.join(BENCHMARK_DIR, "off_corpus_queries.json")
+
+
+def signals(engine_path: str, queries: list, embedder: str, workdir: str) -> list:
+    """[(best distance, keyword overlap)] for each query, as the engine's gate would see them."""
+    vectorstore, search_path = open_index(engine_path, embedder, queries, workdir)
+    retriever = HybridRetriever(vectorstore=vectorstore, lexical_index=load_lexical_index(search_path, vectorstore))
+    results = []
+    for query in queries:
+        rows, best_distance = retriever.search(query)
+        context = " ".join(doc.page_content for doc in documents_for_rows(vectorstore, rows))
+        results.append((best_distance, keyword_overlap(query, context)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default=",".join(INDEX_PATHS), help="comma-separated engine names")
+    parser.add_argument("--embedder", choices=("fake", "ollama"), default="ollama")
+    parser.add_argument("--min-keyword-overlap", type=float, default=0.3)
+    parser.add_argument("--margin", type=float, default=0.10, help="headroom over the largest in-corpus distance")
+    args = parser.parse_args()
+
+    with open(QUERIES_PATH) as f:
+        in_corpus = {engine: [item["query"] for item in items] for engine, items in json.load(f).items()}
+    with open(OFF_CORPUS_PATH) as f:
+        off_corpus = json.load(f)
+
+    workdir = tempfile.mkdtemp()
+    try:
+        for engine in [name.strip() for name in args.engines.split(",") if name.strip()]:
+            inside = signals(INDEX_PATHS[engine], in_corpus.get(engine, []), args.embedder, workdir)
+            outside = signals(INDEX_PATHS[engine], off_corpus.get(engine, []), args.embedder, workdir)
+            inside_distances = [distance for distance, _ in inside if distance is not None]
+            if not inside_distances:
+                print(f"⚠️ {engine}: no in-corpus questions to calibrate on")
+                continue
+            max_distance = round(max(inside_distances) * (1 + args.margin), 1)
+            gated = sum(1 for distance, overlap in outside
+                        if distance is not None and distance > max_distance and overlap < args.min_keyword_overlap)
+
+            print(f"{engine}: in-corpus distance p50 {np.percentile(inside_distances, 50):.1f}, "
+                  f"max {max(inside_distances):.1f}")
+            print(f"{engine}: off-corpus distance p50 "
+                  f"{np.percentile([distance for distance, _ in outside], 50):.1f}, "
+                  f"min {min(distance for distance, _ in outside):.1f}")
+            print(f"{engine}: keyword overlap in-corpus min {min(overlap for _, overlap in inside):.2f}, "
+                  f"off-corpus max {max(overlap for _, overlap in outside):.2f}")
+            print(f"✅ {engine}: {{'max_distance': {max_distance}, 'min_keyword_overlap': {args.min_keyword_overlap}}} "
+                  f"skips {gated}/{len(outside)} off-corpus questions\n")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# File: retrieval_regression.py
+"""
+Retrieval quality and speed regression check for the RAG indexes.
+
+Runs the labelled questions in benchmarks/retrieval_queries.json against each
+engine's index and reports recall@k (share of questions with a relevant
+chunk in the top k), MRR, p50/p99 search latency and on-disk index size. A
+chunk is relevant when it contains every string in the question's
+"relevant" list, so labels survive re-chunking and re-indexing.
+
+With the default --embedder fake, the index texts are re-embedded with a
+deterministic feature-hashing embedder, so the run needs no Ollama and gives
+the same numbers on every machine: it tracks chunking, the index format and
+the retriever. With --embedder ollama the index is searched as deployed.
+
+Run from the agrithon/ directory:
+    python -m benchmarks.retrieval_regression                     # report
+    python -m benchmarks.retrieval_regression --check             # exit 1 on regression (CI)
+    python -m benchmarks.retrieval_regression --update-baseline   # accept the current numbers
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from users.index_store import MmapVectorStore, documents_for_rows, load_vector_store, search_rows, write_mmap_index
+from users.lexical_index import HybridRetriever, load_lexical_index, tokenize
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+QUERIES_PATH = os.path.join(BENCHMARK_DIR, "retrieval_queries.json")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "retrieval_baseline.json")
+USERS_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), "users")
+INDEX_PATHS = {
+    "pesticide": os.getenv("RAG_INDEX_PATH_PESTICIDE", os.path.join(USERS_DIR, "faiss_index_agri_pesticide")),
+    "price": os.getenv("RAG_INDEX_PATH_PRICE", os.path.join(USERS_DIR, "faiss_index_agri")),
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic feature-hashing embedder: signed counts of tokens and character trigrams."""
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> list:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = tokenize(text)
+        features = tokens + [token[i:i + 3] for token in tokens for i in range(max(1, len(token) - 2))]
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self.embed_query(text) for text in texts]
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Serves query vectors computed up front, so latency measures the search only."""
+    def __init__(self, embeddings, texts: list):
+        self.embeddings = embeddings
+        self.vectors = dict(zip(texts, embeddings.embed_documents(texts)))
+
+    def embed_query(self, text: str) -> list:
+        return self.vectors.get(text) or self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: list) -> list:
+        return [self.embed_query(text) for text in texts]
+
+
+def directory_mb(path: str) -> float:
+    total = sum(os.path.getsize(os.path.join(parent, name)) for parent, _, names in os.walk(path) for name in names)
+    return total / 2 ** 20
+
+
+def open_index(path: str, embedder: str, queries: list, workdir: str):
+    """Returns (vectorstore, path of the index that is searched)."""
+    if embedder == "fake":
+        source = load_vector_store(path, HashingEmbeddings())
+        rows = range(len(source)) if isinstance(source, MmapVectorStore) else range(source.index.ntotal)
+        documents = documents_for_rows(source, rows)
+        fake = HashingEmbeddings()
+        search_path = os.path.join(workdir, os.path.basename(os.path.normpath(path)))
+        write_mmap_index(search_path, np.asarray(fake.embed_documents([doc.page_content for doc in documents])),
+                         [Document(page_content=doc.page_content, metadata=doc.metadata) for doc in documents])
+        return MmapVectorStore(search_path, PrecomputedEmbeddings(fake, queries)), search_path
+
+    from langchain_community.embeddings import OllamaEmbeddings
+    embeddings = PrecomputedEmbeddings(OllamaEmbeddings(model="nomic-embed-text"), queries)
+    return load_vector_store(path, embeddings), path
+
+
+def evaluate(engine: str, path: str, labelled: list, args, workdir: str) -> dict:
+    queries = [item["query"] for item in labelled]
+    vectorstore, search_path = open_index(path, args.embedder, queries, workdir)
+    texts = [doc.page_content.casefold() for doc in documents_for_rows(
+        vectorstore, range(len(vectorstore) if isinstance(vectorstore, MmapVectorStore) else vectorstore.index.ntotal)
+    )]
+
+    if args.vector_only:
+        def retrieve(query):
+            return search_rows(vectorstore, vectorstore.embeddings.embed_query(query), args.k)[0].tolist()
+    else:
+        retriever = HybridRetriever(vectorstore=vectorstore, lexical_index=load_lexical_index(search_path, vectorstore),
+                                    k=args.k)
+        retrieve = retriever.fused_rows
+
+    hits, reciprocal_ranks, latencies, unlabelled = 0, 0.0, [], []
+    for item in labelled:
+        needles = [needle.casefold() for needle in item["relevant"]]
+        relevant = {row for row, text in enumerate(texts) if all(needle in text for needle in needles)}
+        if not relevant:
+            unlabelled.append(item["query"])
+            continue
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            rows = list(retrieve(item["query"]))[:args.k]
+            latencies.append((time.perf_counter() - started) * 1000)
+        ranks = [rank for rank, row in enumerate(rows, 1) if row in relevant]
+        hits += bool(ranks)
+        reciprocal_ranks += 1.0 / ranks[0] if ranks else 0.0
+
+    labelled_count = len(labelled) - len(unlabelled)
+    return {
+        "queries": labelled_count,
+        "unlabelled": len(unlabelled),
+        f"recall@{args.k}": round(hits / labelled_count, 4) if labelled_count else 0.0,
+        "mrr": round(reciprocal_ranks / labelled_count, 4) if labelled_count else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3) if latencies else 0.0,
+        "index_mb": round(directory_mb(search_path), 3),
+        "_unlabelled_queries": unlabelled,
+    }
+
+
+def regressions(result: dict, baseline: dict, args) -> list:
+    """Compares one engine's result with its baseline; returns human-readable failures."""
+    failures = []
+    for metric in (f"recall@{args.k}", "mrr"):
+        if metric in baseline and result[metric] < baseline[metric] - args.max_quality_drop:
+            failures.append(f"{metric} {result[metric]:.3f} < baseline {baseline[metric]:.3f}")
+    for metric in ("p50_ms", "p99_ms"):
+        limit = baseline.get(metric, 0) * args.max_latency_ratio + args.latency_slack_ms
+        if metric in baseline and result[metric] > limit:
+            failures.append(f"{metric} {result[metric]:.2f} > {limit:.2f} (baseline {baseline[metric]:.2f})")
+    if "index_mb" in baseline and result["index_mb"] > baseline["index_mb"] * args.max_memory_ratio:
+        failures.append(f"index_mb {result['index_mb']:.2f} > baseline {baseline['index_mb']:.2f}")
+    if result["unlabelled"] > baseline.get("unlabelled", 0):
+        failures.append(f"{result['unlabelled']} questions have no relevant chunk in the index any more")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", default=",".join(INDEX_PATHS), help="comma-separated engine names")
+    parser.add_argument("--index", action="append", default=[], metavar="ENGINE=PATH", help="override an index path")
+    parser.add_argument("--embedder", choices=("fake", "ollama"), default="fake")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--vector-only", action="store_true", help="skip BM25 fusion")
+    parser.add_argument("--repeat", type=int, default=5, help="timed searches per question")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if any metric regressed")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02, help="allowed absolute recall/MRR drop")
+    parser.add_argument("--max-latency-ratio", type=float, default=2.0, help="allowed latency growth factor")
+    parser.add_argument("--latency-slack-ms", type=float, default=1.0, help="absolute latency allowance for noisy CI")
+    parser.add_argument("--max-memory-ratio", type=float, default=1.10)
+    args = parser.parse_args()
+
+    paths = dict(INDEX_PATHS)
+    for item in args.index:
+        engine, _, path = item.partition("=")
+        paths[engine] = path
+    with open(QUERIES_PATH) as f:
+        labelled = json.load(f)
+
+    profile = f"{args.embedder}/{'vector' if args.vector_only else 'hybrid'}/k{args.k}"
+    baseline_all = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline_all = json.load(f)
+    baseline = baseline_all.get(profile, {})
+
+    results, failures = {}, []
+    workdir = tempfile.mkdtemp()
+    try:
+        for engine in [name.strip() for name in args.engines.split(",") if name.strip()]:
+            results[engine] = evaluate(engine, paths[engine], labelled.get(engine, []), args, workdir)
+            if args.check and engine in baseline:
+                failures += [f"{engine}: {failure}" for failure in regressions(results[engine], baseline[engine], args)]
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"Profile {profile}\n")
+    print(f"{'engine':<12}{'queries':>8}{'recall@' + str(args.k):>10}{'MRR':>8}{'p50 ms':>9}{'p99 ms':>9}{'index MB':>10}")
+    for engine, result in results.items():
+        print(f"{engine:<12}{result['queries']:>8}{result[f'recall@{args.k}']:>10.3f}{result['mrr']:>8.3f}"
+              f"{result['p50_ms']:>9.3f}{result['p99_ms']:>9.3f}{result['index_mb']:>10.2f}")
+        for query in result.pop("_unlabelled_queries"):
+            print(f"  ⚠️ no chunk matches the labels of: {query}")
+
+    if args.update_baseline:
+        baseline_all[profile] = {**baseline, **results}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline_all, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n✅ Baseline for {profile} written to {args.baseline}")
+
+    if args.check:
+        if not baseline:
+            print(f"\n⚠️ No baseline for {profile}; run with --update-baseline first.")
+        elif failures:
+            print("\n❌ Retrieval regressions:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        else:
+            print("\n✅ No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
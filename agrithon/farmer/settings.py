@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 # import os
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+# Load the RAG indexes in the background at startup instead of on the first question
+RAG_WARMUP_ON_STARTUP = os.getenv('RAG_WARMUP_ON_STARTUP', '0') == '1'
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -106,6 +108,156 @@ CACHES = {
     }
 }
 
+# --- LLM client pool ---
+# Named Gemini profiles shared by all callers (users/llm_pool.py). 'timeout' is the per-request
+# deadline in seconds; at most 'max_concurrency' calls per profile are in flight, and a call that
+# waits longer than 'queue_timeout' seconds for a slot fails fast with a canned reply. After
+# 'failure_threshold' consecutive failures a profile rejects calls for 'reset_seconds'.
+LLM_PROFILES = {
+    'agent': {'model': 'gemini-2.0-flash-exp', 'temperature': 0.1, 'convert_system_message_to_human': True,
+              'timeout': 30, 'max_concurrency': 16},
+    'guardrail': {'model': 'gemini-2.0-flash-exp', 'temperature': 0.2, 'timeout': 15, 'max_concurrency': 16},
+    'classifier': {'model': 'gemini-2.5-flash', 'temperature': 0, 'timeout': 10, 'max_concurrency': 16,
+                   'classification': True},
+    'weather': {'model': 'gemini-2.5-flash', 'temperature': 0, 'timeout': 20, 'max_concurrency': 8},
+    'rag': {'model': 'gemini-2.0-flash-exp', 'temperature': 0.5, 'timeout': 30, 'max_concurrency': 16},
+    'web_search': {'model': 'gemini-2.0-flash-exp', 'temperature': 0.3, 'timeout': 45, 'max_concurrency': 8},
+}
+LLM_CIRCUIT_BREAKER = {
+    'failure_threshold': int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', '5')),
+    'reset_seconds': float(os.getenv('LLM_CIRCUIT_RESET_SECONDS', '30')),
+}
+
+# Structured-output results of temperature-0 profiles marked 'classification' are cached by
+# exact prompt (users/llm_cache.py), in-process and in the default cache (Redis).
+LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED', '1') == '1'
+LLM_RESPONSE_CACHE_TTL = int(os.getenv('LLM_RESPONSE_CACHE_TTL', str(7 * 24 * 60 * 60)))
+
+# --- Weather ---
+# Google Weather API key for the direct forecast path (users/weather.py). With WEATHER_LLM_PHRASING=1
+# the templated forecast is rewritten as an answer to the question by the 'weather' LLM profile.
+WEATHER_API_KEY = os.getenv('GOOGLE_WEATHER_API_KEY', '')
+WEATHER_TIMEOUT_SECONDS = float(os.getenv('WEATHER_TIMEOUT_SECONDS', '10'))
+WEATHER_LLM_PHRASING = os.getenv('WEATHER_LLM_PHRASING', '0') == '1'
+# Forecasts are shared per geohash cell (precision 5 ~ 5 km) and date, in-process and in the
+# default cache (Redis), and expire at each provider refresh boundary (hourly by default).
+WEATHER_CACHE_ENABLED = os.getenv('WEATHER_CACHE_ENABLED', '1') == '1'
+WEATHER_CACHE_GEOHASH_PRECISION = int(os.getenv('WEATHER_CACHE_GEOHASH_PRECISION', '5'))
+WEATHER_CACHE_REFRESH_SECONDS = int(os.getenv('WEATHER_CACHE_REFRESH_SECONDS', str(60 * 60)))
+
+# --- Answer guardrail ---
+# Agent answers go through the Gemini confidence guardrail only when the local refusal detector
+# (users/refusal_detector.py) flags them, plus a random REFUSAL_AUDIT_RATE share of the rest to
+# measure misses. Guardrail outcomes are appended to REFUSAL_LOG_PATH (JSON lines) as labelled
+# examples; set it to '' to disable logging. `manage.py train_refusal_detector` trains the classifier
+# on the newest REFUSAL_LOG_MAX_RECORDS of them and saves it to REFUSAL_MODEL_PATH, which workers load
+# at startup (they train once themselves when the file is missing).
+REFUSAL_DETECTOR_ENABLED = os.getenv('REFUSAL_DETECTOR_ENABLED', '1') == '1'
+REFUSAL_THRESHOLD = float(os.getenv('REFUSAL_THRESHOLD', '0.5'))
+REFUSAL_AUDIT_RATE = float(os.getenv('REFUSAL_AUDIT_RATE', '0.05'))
+REFUSAL_LOG_PATH = os.getenv('REFUSAL_LOG_PATH', str(BASE_DIR / 'guardrail_outcomes.jsonl'))
+REFUSAL_LOG_MAX_RECORDS = int(os.getenv('REFUSAL_LOG_MAX_RECORDS', '5000'))
+REFUSAL_MODEL_PATH = os.getenv('REFUSAL_MODEL_PATH', str(BASE_DIR / 'refusal_model.npz'))
+
+# --- Chat agent ---
+# Print LangChain's step-by-step agent trace to the console (debugging only; slow on busy workers).
+AGENT_VERBOSE = os.getenv('AGENT_VERBOSE', '0') == '1'
+
+# --- RAG answer cache ---
+# Questions whose embedding is within RAG_ANSWER_CACHE_SIMILARITY (cosine) of an earlier
+# one reuse its answer. Engines listed in RAG_ANSWER_CACHE_REGIONAL are also scoped by
+# the user's state/district. The shared tier uses the default cache (Redis) above.
+RAG_ANSWER_CACHE_ENABLED = os.getenv('RAG_ANSWER_CACHE_ENABLED', '1') == '1'
+RAG_ANSWER_CACHE_SIMILARITY = float(os.getenv('RAG_ANSWER_CACHE_SIMILARITY', '0.96'))
+RAG_ANSWER_CACHE_TTL = int(os.getenv('RAG_ANSWER_CACHE_TTL', str(6 * 60 * 60)))
+RAG_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('RAG_ANSWER_CACHE_MAX_ENTRIES', '2048'))
+RAG_ANSWER_CACHE_REGIONAL = ['price']
+
+# --- RAG fallback answer cache ---
+# Web-search fallback answers are shared through Redis per engine, region, calendar month and
+# normalised question, so each topic is generated once per period. At most
+# RAG_FALLBACK_CACHE_MAX_ENTRIES answers are kept; the oldest are evicted first.
+RAG_FALLBACK_CACHE_ENABLED = os.getenv('RAG_FALLBACK_CACHE_ENABLED', '1') == '1'
+RAG_FALLBACK_CACHE_TTL = int(os.getenv('RAG_FALLBACK_CACHE_TTL', str(7 * 24 * 60 * 60)))
+RAG_FALLBACK_CACHE_MAX_ENTRIES = int(os.getenv('RAG_FALLBACK_CACHE_MAX_ENTRIES', '5000'))
+
+# --- RAG embedding cache ---
+# Query embeddings are cached by content hash in memory and in this SQLite file, which
+# survives restarts and is shared by all workers on the host. Set the path to '' to disable the disk tier.
+RAG_EMBEDDING_CACHE_PATH = os.getenv('RAG_EMBEDDING_CACHE_PATH', str(BASE_DIR / 'embedding_cache.sqlite3')) or None
+RAG_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('RAG_EMBEDDING_CACHE_MAX_ENTRIES', '10000'))
+
+# --- RAG context compression ---
+# Near-duplicate chunks are dropped and the rest trimmed to the question's most relevant
+# sentences so each engine's prompt context stays within its token budget (~4 chars/token).
+RAG_CONTEXT_COMPRESSION = os.getenv('RAG_CONTEXT_COMPRESSION', '1') == '1'
+RAG_CONTEXT_TOKEN_BUDGET = {
+    'pesticide': 700,
+    'price': 900,
+}
+
+# --- RAG conversation history ---
+# 'redis' keeps each session's history in the default cache's Redis, shared by all workers;
+# 'memory' keeps up to RAG_HISTORY_MAX_SESSIONS sessions per process. Either way only the
+# last RAG_HISTORY_MAX_TURNS question/answer pairs are kept, for RAG_HISTORY_TTL idle seconds.
+RAG_HISTORY_BACKEND = os.getenv('RAG_HISTORY_BACKEND', 'redis')
+RAG_HISTORY_MAX_TURNS = int(os.getenv('RAG_HISTORY_MAX_TURNS', '10'))
+RAG_HISTORY_TTL = int(os.getenv('RAG_HISTORY_TTL', str(24 * 60 * 60)))
+RAG_HISTORY_MAX_SESSIONS = int(os.getenv('RAG_HISTORY_MAX_SESSIONS', '10000'))
+
+# --- Mandi price store ---
+# SQLite table of daily mandi prices loaded with `manage.py load_mandi_prices`; the chat agent's
+# get_mandi_prices tool answers price questions from it without an LLM call.
+MANDI_PRICE_DB_PATH = os.getenv('MANDI_PRICE_DB_PATH', str(BASE_DIR / 'mandi_prices.sqlite3'))
+
+# --- Gazetteer ---
+# SQLite table of India Post offices (pincode, taluk, district, state, coordinates) loaded with
+# `manage.py load_gazetteer`; onboarding resolves addresses from it and uses Nominatim only as a last resort.
+GAZETTEER_DB_PATH = os.getenv('GAZETTEER_DB_PATH', str(BASE_DIR / 'gazetteer.sqlite3'))
+
+# --- RAG embedding micro-batching ---
+# When the window is > 0, concurrent query embeddings are collected for up to that many
+# milliseconds (or RAG_EMBEDDING_BATCH_SIZE texts) and sent to Ollama's batch /api/embed
+# endpoint in one request. That endpoint returns unit-length vectors, so enable it for
+# indexes built with the same endpoint.
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+RAG_EMBEDDING_BATCH_WINDOW_MS = float(os.getenv('RAG_EMBEDDING_BATCH_WINDOW_MS', '0'))
+RAG_EMBEDDING_BATCH_SIZE = int(os.getenv('RAG_EMBEDDING_BATCH_SIZE', '32'))
+
+# --- RAG index search parameters ---
+# Per-engine overrides for approximate indexes built with `convert_rag_index --index-type`,
+# e.g. {'price': {'ef_search': 128}} or {'price': {'nprobe': 32, 'rerank': 4}}.
+RAG_INDEX_SEARCH_PARAMS = {}
+# Fuse BM25 hits (exact trade names and chemicals) with vector hits in the RAG retriever
+RAG_HYBRID_RETRIEVAL = os.getenv('RAG_HYBRID_RETRIEVAL', '1') == '1'
+
+# --- RAG relevance gate ---
+# Questions whose retrieved context is clearly off-corpus skip the RAG call and go straight
+# to web search. Context is irrelevant when the best vector hit is farther than 'max_distance'
+# (squared L2; None = distance not checked) AND less than 'min_keyword_overlap' of the
+# question's content words appear in it. Decisions are logged by users.relevance_gate.
+# On the retrieval regression questions (benchmarks/retrieval_queries.json) in-corpus overlap is
+# >= 0.33 and off-corpus overlap <= 0.25. The distances are cosine 0.5 at the norm of the bundled
+# nomic-embed-text vectors (~20.6 and ~21.8): 2 * norm^2 * (1 - 0.5). Re-derive both with
+# `python -m benchmarks.relevance_calibration` after changing the embedder or the corpus.
+RAG_RELEVANCE_GATE_ENABLED = os.getenv('RAG_RELEVANCE_GATE_ENABLED', '1') == '1'
+RAG_RELEVANCE_GATE = {
+    'pesticide': {'max_distance': 425.0, 'min_keyword_overlap': 0.3},
+    'price': {'max_distance': 475.0, 'min_keyword_overlap': 0.3},
+}
+
+
+# --- RAG speculative fallback ---
+# Opt-in. Questions predicted to need web search start it alongside the RAG call; when RAG
+# answers on its own the web call is cancelled. A topic is speculated once its fallback rate
+# reaches 'threshold' over at least 'min_observations' answers; unseen topics when they ask for
+# live data or share less than 'max_overlap' of their words with the retrieved chunks.
+# Saved vs wasted LLM seconds are reported under "speculation" in rag_registry.cache_stats().
+RAG_SPECULATIVE_FALLBACK = os.getenv('RAG_SPECULATIVE_FALLBACK', '0') == '1'
+RAG_SPECULATION = {
+    'pesticide': {'threshold': 0.6, 'max_overlap': 0.34},
+    'price': {'threshold': 0.4, 'max_overlap': 0.5},
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
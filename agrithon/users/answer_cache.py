@@ -0,0 +1,290 @@
+# File: answer_cache.py
+"""
+Semantic answer cache for the RAG engines.
+
+Answers are stored against the normalised embedding of the question that
+produced them. A later question is a hit when its embedding is within the
+configured cosine similarity of a cached one in the same scope (engine name,
+plus state/district for engines whose answers depend on the region).
+
+There are two tiers: a bounded in-process LRU with TTL, and an optional shared
+tier backed by any Django-style cache (`get`/`set`/`add`/`delete` with a
+timeout), which in this project is Redis through django-redis. The shared
+tier keeps one bucket per scope; writers take a short per-bucket lock
+(`add` is an atomic set-if-absent) around the read-modify-write, so two
+workers storing at once cannot drop each other's answers. The lock holds a
+random token and is only deleted by its owner (atomically, in a Lua script,
+on django-redis), so a writer whose lock expired mid-write cannot release
+the next writer's lock.
+
+Follow-ups ("what about for wheat?", "how much of it per acre?") only make
+sense with the conversation before them, so `is_follow_up` spots them by
+their opening words and pronouns; the engines skip the cache for those and
+only those, so a farmer's later, standalone questions still hit it.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .intent_classifier import normalize
+
+# Deletes the lock only if it still holds our token.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Words that refer back to the conversation ("is it safe", "uska dose"), over normalized text.
+FOLLOW_UP_WORDS = {
+    "it", "its", "they", "them", "their", "those", "these", "same", "above", "previous", "mentioned",
+    "iska", "iski", "iske", "uska", "uski", "uske", "isme", "usme", "isko", "usko", "inka", "unka",
+    "इसका", "इसकी", "इसके", "उसका", "उसकी", "उसके", "इसमें", "उसमें", "इसको", "उसको", "इनका", "उनका",
+}
+# "this"/"that" are only anaphoric when they don't start a time phrase ("this year", "this season").
+DEMONSTRATIVE = re.compile(
+    r"(^| )(this|that|ye|yeh|wo|woh|vo|यह|ये|वह|वो)( (?!(year|season|week|month|time|kharif|rabi|saal|sal|"
+    r"mausam|hafte|mahine|साल|मौसम|हफ्ते|महीने)( |$))|$)"
+)
+# Openers that continue the previous question ("and for rice?", "what about onion").
+FOLLOW_UP_OPENERS = re.compile(
+    r"^(and|but|also|then|so|what about|how about|what if|same for|aur|phir|toh|और|फिर|तो)( |$)"
+)
+
+
+def is_follow_up(query: str) -> bool:
+    """True when `query` probably depends on the previous turns (pronouns, "and for ...", "what about ...")."""
+    text = normalize(query)
+    if FOLLOW_UP_OPENERS.search(text) or DEMONSTRATIVE.search(text):
+        return True
+    return any(word in FOLLOW_UP_WORDS for word in text.split())
+
+
+class SemanticAnswerCache:
+    """
+    Looks up previously generated answers by query similarity so repeated
+    questions skip retrieval and the LLM entirely.
+    """
+    def __init__(
+        self,
+        embeddings,
+        similarity_threshold: float = 0.96,
+        ttl_seconds: int = 6 * 60 * 60,
+        max_entries: int = 2048,
+        shared_cache=None,
+        shared_bucket_size: int = 128,
+        regional_namespaces=(),
+        shared_lock_seconds: float = 2,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_cache = shared_cache
+        self.shared_bucket_size = shared_bucket_size
+        self.regional_namespaces = set(regional_namespaces)
+        self.shared_lock_seconds = shared_lock_seconds
+
+        # entry_id -> (scope_key, vector, answer, expires_at); order is LRU order.
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "local_hits": 0, "shared_hits": 0, "misses": 0,
+            "stores": 0, "evictions": 0, "expired": 0, "shared_errors": 0,
+            "shared_lock_timeouts": 0,
+        }
+
+    # --- Keys and vectors ---
+    def scope_key(self, namespace: str, region: str = None) -> str:
+        if region and namespace in self.regional_namespaces:
+            return f"{namespace}:{region.strip().lower()}"
+        return namespace
+
+    def _shared_key(self, scope_key: str) -> str:
+        return "rag_answer_cache:" + hashlib.sha1(scope_key.encode("utf-8")).hexdigest()
+
+    def embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # --- Public API ---
+    def lookup(self, namespace: str, query: str, region: str = None):
+        """
+        Returns `(answer, vector)`. `answer` is None on a miss; `vector` is the
+        query embedding so the caller can pass it back to `store` without re-embedding.
+        """
+        key = self.scope_key(namespace, region)
+        vector = self.embed(query)
+
+        answer = self._lookup_local(key, vector)
+        if answer is not None:
+            self._count("local_hits")
+            return answer, vector
+
+        answer = self._lookup_shared(key, vector)
+        if answer is not None:
+            self._count("shared_hits")
+            self._store_local(key, vector, answer)
+            return answer, vector
+
+        self._count("misses")
+        return None, vector
+
+    def store(self, namespace: str, vector: np.ndarray, answer: str, region: str = None):
+        if vector is None or not answer:
+            return
+        key = self.scope_key(namespace, region)
+        self._store_local(key, vector, answer)
+        self._store_shared(key, vector, answer)
+        self._count("stores")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["local_hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    # --- Local tier ---
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _lookup_local(self, key: str, vector: np.ndarray):
+        now = time.time()
+        with self._lock:
+            ids = self._scopes.get(key)
+            if not ids:
+                return None
+
+            live_ids = []
+            for entry_id in list(ids):
+                if self._entries[entry_id][3] <= now:
+                    self._remove(entry_id)
+                    self._counters["expired"] += 1
+                else:
+                    live_ids.append(entry_id)
+            if not live_ids:
+                return None
+
+            matrix = np.stack([self._entries[entry_id][1] for entry_id in live_ids])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            entry_id = live_ids[best]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+
+    def _store_local(self, key: str, vector: np.ndarray, answer: str):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, vector, answer, time.time() + self.ttl_seconds)
+            self._scopes.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._counters["evictions"] += 1
+
+    def _remove(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        ids = self._scopes.get(key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._scopes[key]
+
+    # --- Shared tier ---
+    def _lookup_shared(self, key: str, vector: np.ndarray):
+        if self.shared_cache is None:
+            return None
+        try:
+            bucket = self.shared_cache.get(self._shared_key(key)) or []
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Shared answer cache unavailable: {e}")
+            return None
+
+        now = time.time()
+        bucket = [item for item in bucket if item["expires_at"] > now]
+        if not bucket:
+            return None
+
+        matrix = np.stack([np.frombuffer(item["vector"], dtype=np.float16).astype(np.float32) for item in bucket])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return bucket[best]["answer"]
+
+    def _store_shared(self, key: str, vector: np.ndarray, answer: str):
+        if self.shared_cache is None:
+            return
+        shared_key = self._shared_key(key)
+        try:
+            token = self._acquire_bucket_lock(shared_key)
+            if token is None:
+                # Another worker is writing this bucket; dropping one store is cheaper than waiting.
+                self._count("shared_lock_timeouts")
+                return
+            try:
+                now = time.time()
+                bucket = self.shared_cache.get(shared_key) or []
+                bucket = [item for item in bucket if item["expires_at"] > now]
+                # Newest first; float16 keeps each bucket small enough to fetch on every miss.
+                bucket.insert(0, {
+                    "vector": vector.astype(np.float16).tobytes(),
+                    "answer": answer,
+                    "expires_at": now + self.ttl_seconds,
+                })
+                self.shared_cache.set(shared_key, bucket[:self.shared_bucket_size], self.ttl_seconds)
+            finally:
+                self._release_bucket_lock(shared_key, token)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Could not write to shared answer cache: {e}")
+
+    def _acquire_bucket_lock(self, shared_key: str, interval: float = 0.02):
+        """
+        Set-if-absent lock on one bucket. Returns the token stored in it, or None when
+        the lock stays held for `shared_lock_seconds`.
+        """
+        # An int, because django-redis stores integers unpickled and the Lua release compares raw values.
+        token = random.getrandbits(62) + 1
+        timeout = max(1, int(self.shared_lock_seconds))
+        deadline = time.monotonic() + self.shared_lock_seconds
+        while True:
+            if self.shared_cache.add(shared_key + ":lock", token, timeout):
+                return token
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def _release_bucket_lock(self, shared_key: str, token: int):
+        """Deletes the bucket lock if it still holds `token` (it may have expired and been retaken)."""
+        lock_key = shared_key + ":lock"
+        client = getattr(self.shared_cache, "client", None)
+        if hasattr(client, "get_client"):
+            # django-redis: compare and delete in one step inside Redis.
+            redis = client.get_client(write=True)
+            redis.eval(RELEASE_LOCK_SCRIPT, 1, self.shared_cache.make_key(lock_key), token)
+        elif self.shared_cache.get(lock_key) == token:
+            self.shared_cache.delete(lock_key)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.conf import settings
+        # Optionally load the FAISS indexes in the background while the worker boots.
+        if getattr(settings, "RAG_WARMUP_ON_STARTUP", False):
+            from .rag_registry import rag_registry
+            rag_registry.warm_up(background=True)
+        # Load (or train) the refusal detector before the first answer needs it.
+        if getattr(settings, "REFUSAL_DETECTOR_ENABLED", False):
+            from . import refusal_detector
+            refusal_detector.warm_up(background=True)
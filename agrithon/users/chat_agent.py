@@ -0,0 +1,84 @@
+# File: chat_agent.py
+"""
+Tool-calling agent that is built once and shared by every chat request.
+
+The contextual reply paths used to define their tools as closures over the
+user, then build a prompt, an OpenAI-tools agent and a verbose AgentExecutor
+on every message. Nothing in that setup depends on the user except the
+closures, so here the executor is built on first use and reused, and the
+user for the current run travels in the `agent_user` context variable:
+
+    reply = agent.invoke(text, history, user)      # sets agent_user for the run
+    user = current_agent_user()                    # inside a tool
+
+Context variables follow the run into LangChain's executor threads (sync
+tools on `ainvoke`) and into tool coroutines, and concurrent requests each
+see their own user.
+"""
+import threading
+from contextvars import ContextVar
+
+from langchain.agents import AgentExecutor, create_openai_tools_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+agent_user: ContextVar = ContextVar("agent_user", default=None)
+
+
+def current_agent_user():
+    """The user whose message the agent is answering; raises outside an agent run."""
+    user = agent_user.get()
+    if user is None:
+        raise RuntimeError("Agent tool called outside PrebuiltAgent.invoke/ainvoke.")
+    return user
+
+
+def build_agent_executor(llm, tools: list, system_prompt: str, verbose: bool = False, **executor_options):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+    agent = create_openai_tools_agent(llm, tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=verbose, **executor_options)
+
+
+class PrebuiltAgent:
+    """
+    Lazily builds one AgentExecutor from `tools` and `system_prompt`. `llm` is either a
+    chat model or a zero-argument callable returning one (e.g. a pool lookup), so
+    importing the module that defines the agent doesn't create a client.
+    """
+    def __init__(self, llm, tools: list, system_prompt: str, verbose: bool = False, **executor_options):
+        self._llm = llm
+        self.tools = list(tools)
+        self.system_prompt = system_prompt
+        self.verbose = verbose
+        self.executor_options = executor_options
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> AgentExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    llm = self._llm() if callable(self._llm) and not hasattr(self._llm, "invoke") else self._llm
+                    self._executor = build_agent_executor(
+                        llm, self.tools, self.system_prompt, verbose=self.verbose, **self.executor_options
+                    )
+        return self._executor
+
+    def invoke(self, user_input: str, history: list, user) -> dict:
+        token = agent_user.set(user)
+        try:
+            return self.executor.invoke({"input": user_input, "chat_history": history})
+        finally:
+            agent_user.reset(token)
+
+    async def ainvoke(self, user_input: str, history: list, user) -> dict:
+        token = agent_user.set(user)
+        try:
+            return await self.executor.ainvoke({"input": user_input, "chat_history": history})
+        finally:
+            agent_user.reset(token)
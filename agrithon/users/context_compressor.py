@@ -0,0 +1,142 @@
+# File: context_compressor.py
+"""
+Context assembly for the RAG prompt.
+
+Retrieved chunks overlap (the splitter's chunk_overlap, and the same table
+row indexed from several pages), so pasting the k chunks verbatim repeats
+text and inflates prompt tokens and Gemini latency. Before the chunks go
+into the prompt this stage:
+    1. drops near-duplicate chunks, comparing MinHash signatures of word shingles;
+    2. splits each remaining chunk into sentences (table rows count as sentences)
+       and, when the chunk is over its share of the budget, keeps the sentences
+       that share the most content words with the question, in their original order;
+    3. stops at the engine's token budget.
+Tokens are estimated as characters / 4, close enough for Gemini's tokenizer on
+this mostly-English text. Every call logs the tokens saved.
+"""
+import logging
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from .relevance_gate import content_words
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+MERSENNE_PRIME = (1 << 61) - 1
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_sentences(text: str) -> list:
+    """Splits on sentence ends and line breaks; a line that doesn't start a new row or sentence joins the previous one."""
+    sentences = []
+    for piece in SENTENCE_BREAK.split(text or ""):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and not (piece[0].isupper() or piece[0].isdigit()):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+class MinHasher:
+    """MinHash signatures over word shingles; equal-slot fraction estimates Jaccard similarity."""
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.casefold())
+        size = min(self.shingle_size, max(1, len(words)))
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+        # (a * x + b) mod p for every permutation and shingle; uint64 wraps, which keeps it a valid hash family.
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        return float(np.mean(first == second))
+
+
+class ContextCompressor:
+    def __init__(self, name: str, token_budget: int = 1000, dedup_threshold: float = 0.8,
+                 num_perm: int = 64, shingle_size: int = 5):
+        self.name = name
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "duplicates_dropped": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def deduplicate(self, texts: list) -> list:
+        """Keeps the first of every group of near-duplicate texts (retrieval order = best first)."""
+        kept, signatures = [], []
+        for text in texts:
+            signature = self.hasher.signature(text)
+            if any(self.hasher.similarity(signature, other) >= self.dedup_threshold for other in signatures):
+                continue
+            kept.append(text)
+            signatures.append(signature)
+        return kept
+
+    def trim(self, text: str, query_words: set, budget: int) -> str:
+        """Returns `text` if it fits in `budget` tokens, else its most query-relevant sentences."""
+        if estimate_tokens(text) <= budget:
+            return text
+        sentences = split_sentences(text)
+        # Most shared content words first; earlier sentences win ties.
+        ranked = sorted(range(len(sentences)),
+                        key=lambda i: (-len(content_words(sentences[i]) & query_words), i))
+        chosen, used = set(), 0
+        for i in ranked:
+            cost = estimate_tokens(sentences[i]) + 1
+            if used + cost > budget:
+                continue
+            chosen.add(i)
+            used += cost
+        return "\n".join(sentences[i] for i in sorted(chosen))
+
+    def compress(self, query: str, texts: list) -> list:
+        """Returns the texts to put in the prompt, deduplicated, trimmed and within the token budget."""
+        tokens_in = sum(estimate_tokens(text) for text in texts)
+        unique = self.deduplicate(texts)
+        query_words = content_words(query)
+
+        compressed, remaining = [], self.token_budget
+        for position, text in enumerate(unique):
+            # Each chunk may use an equal share of what the earlier chunks left over.
+            share = remaining // (len(unique) - position)
+            trimmed = self.trim(text, query_words, share)
+            if trimmed:
+                compressed.append(trimmed)
+                remaining -= estimate_tokens(trimmed)
+
+        tokens_out = sum(estimate_tokens(text) for text in compressed)
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["duplicates_dropped"] += len(texts) - len(unique)
+            self._counters["tokens_in"] += tokens_in
+            self._counters["tokens_out"] += tokens_out
+        logger.info(
+            "rag_context engine=%s chunks=%d duplicates=%d tokens_in=%d tokens_out=%d tokens_saved=%d",
+            self.name, len(texts), len(texts) - len(unique), tokens_in, tokens_out, tokens_in - tokens_out,
+        )
+        return compressed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["tokens_saved"] = stats["tokens_in"] - stats["tokens_out"]
+        return stats
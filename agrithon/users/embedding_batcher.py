@@ -0,0 +1,132 @@
+# File: embedding_batcher.py
+"""
+Micro-batching for query embeddings.
+
+Concurrent WhatsApp, voice and app requests each embed a single query. The
+BatchingEmbeddings dispatcher collects the queries that arrive within a short
+window (or until the batch is full), sends them to the wrapped client as one
+`embed_documents` call and hands each caller its own vector back.
+
+OllamaBatchEmbeddings is the client to put behind it: it talks to Ollama's
+`/api/embed` endpoint, which embeds a whole list in one HTTP request and one
+forward pass (langchain_community's OllamaEmbeddings sends one request per text).
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from langchain_core.embeddings import Embeddings
+
+
+class OllamaBatchEmbeddings(Embeddings):
+    """
+    Minimal Ollama client for the batch `/api/embed` endpoint. Note that this
+    endpoint returns unit-length vectors, unlike the legacy `/api/embeddings`.
+    """
+    def __init__(self, model: str, base_url: str = "http://localhost:11434", timeout: float = 30):
+        self.model = model
+        self.url = base_url.rstrip("/") + "/api/embed"
+        self.timeout = timeout
+        # One pooled connection per process instead of a new one per question.
+        self.session = requests.Session()
+
+    def embed_documents(self, texts: list) -> list:
+        if not texts:
+            return []
+        response = self.session.post(self.url, json={"model": self.model, "input": texts}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Coalesces concurrent single-text embedding calls into batched calls on the
+    wrapped client. A batch is flushed when it holds `max_batch_size` texts or
+    `max_wait_ms` after its first text arrived, whichever comes first. Callers
+    wait at most `timeout_seconds` for their vector (concurrent.futures.TimeoutError).
+    """
+    def __init__(self, embeddings, max_wait_ms: float = 10, max_batch_size: int = 32,
+                 timeout_seconds: float = 60):
+        self.embeddings = embeddings
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.timeout_seconds = timeout_seconds
+
+        self._queue = queue.Queue()
+        self._counters = {"texts": 0, "batches": 0, "largest_batch": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    # --- Embeddings interface ---
+    def embed_query(self, text: str) -> list:
+        return self._submit(text).result(timeout=self.timeout_seconds)
+
+    def embed_documents(self, texts: list) -> list:
+        # Large batches (e.g. index builds) are already efficient; send them straight through.
+        if len(texts) >= self.max_batch_size:
+            return self.embeddings.embed_documents(texts)
+        futures = [self._submit(text) for text in texts]
+        deadline = time.monotonic() + self.timeout_seconds
+        return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+
+    # --- Dispatcher ---
+    def _submit(self, text: str) -> Future:
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # Never let one bad batch stop the dispatcher thread and strand every later caller.
+                print(f"⚠️ Embedding batch failed: {e}")
+                self._fail(batch, e)
+
+    def _flush(self, batch: list):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding client returned {len(vectors)} vectors for {len(batch)} texts.")
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        with self._lock:
+            self._counters["texts"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["largest_batch"] = max(self._counters["largest_batch"], len(batch))
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(list(vector))
+
+    def _fail(self, batch: list, error: Exception):
+        with self._lock:
+            self._counters["errors"] += 1
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["avg_batch_size"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
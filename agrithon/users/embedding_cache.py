@@ -0,0 +1,145 @@
+# File: embedding_cache.py
+"""
+Content-hashed cache around an embeddings client (OllamaEmbeddings here).
+
+Texts are normalised (Unicode NFKC, case-folded, whitespace collapsed) and
+hashed together with the model name and a `namespace` naming the endpoint
+that produced the vectors: Ollama's `/api/embed` returns unit-length vectors
+and `/api/embeddings` raw ones, so the two must never share entries. Vectors live in a bounded in-process LRU
+and in an SQLite file that survives restarts and can be shared by every
+worker on the host. Only misses reach the wrapped client.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.casefold().split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in `Embeddings` that answers repeated texts from memory or disk and
+    forwards only unseen texts to the wrapped client.
+    """
+    def __init__(self, embeddings, model_name: str, db_path: str = None, max_memory_entries: int = 10000,
+                 namespace: str = ""):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.namespace = namespace
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._miss_seconds = 0.0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+            # WAL lets several worker processes read while one writes.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def cache_key(self, text: str) -> str:
+        payload = f"{self.namespace}\x00{self.model_name}\x00{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    # --- Embeddings interface ---
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [self.cache_key(text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = {}
+
+        for i, key in enumerate(keys):
+            vector = self._get(key)
+            if vector is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                vectors[i] = vector
+
+        if missing:
+            miss_keys = list(missing)
+            started = time.perf_counter()
+            fresh = self.embeddings.embed_documents([texts[missing[key][0]] for key in miss_keys])
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self._counters["misses"] += len(miss_keys)
+                self._miss_seconds += elapsed
+            self._put_many(zip(miss_keys, fresh))
+
+            for key, vector in zip(miss_keys, fresh):
+                for i in missing[key]:
+                    vectors[i] = list(vector)
+        return vectors
+
+    # --- Tiers ---
+    def _get(self, key: str):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return vector
+
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self._counters["disk_hits"] += 1
+            self._remember(key, vector)
+            return vector
+
+    def _put_many(self, items):
+        rows = []
+        with self._lock:
+            for key, vector in items:
+                vector = list(vector)
+                self._remember(key, vector)
+                rows.append((key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), time.time()))
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Could not persist embeddings: {e}")
+
+    def _remember(self, key: str, vector: list):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    # --- Reporting ---
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            miss_seconds = self._miss_seconds
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        avg_miss = miss_seconds / stats["misses"] if stats["misses"] else 0.0
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["avg_miss_ms"] = round(avg_miss * 1000, 2)
+        # Each hit saves roughly one round trip to the embedding server.
+        stats["seconds_saved"] = round(hits * avg_miss, 3)
+        return stats
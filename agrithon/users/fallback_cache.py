@@ -0,0 +1,143 @@
+# File: fallback_cache.py
+"""
+Cache for the web-search fallback answers of the RAG engines.
+
+`search_with_gemini` writes a long market-analysis answer from scratch, yet
+the same topic ("best time to sell apples in Himachal") comes up from many
+farmers in the same weeks. Answers are cached under a normalised form of the
+question (function words dropped, lightly stemmed, order-insensitive) plus
+the farmer's region and the calendar month, so each topic is generated once
+per region and month. Unlike the relevance gate's content words, the topic
+keeps question words and numbers: "when to sell" and "how to sell", or
+"price in 2022" and "price in 2024", are different questions.
+
+Two tiers: a bounded in-process LRU, and Redis, shared by all workers. In
+Redis every answer has its own TTL, and a sorted set of keys by last write
+caps the number of entries by evicting the oldest ones.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# Words that don't change what is being asked. Question words (what, when, how, which, ...) are kept.
+TOPIC_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for", "and", "or",
+    "do", "does", "did", "can", "could", "should", "would", "will", "i", "my", "me", "we", "our", "you",
+    "your", "it", "its", "this", "that", "these", "those", "with", "about", "from", "at", "by", "as",
+    "tell", "please", "give", "get", "any", "some", "there",
+}
+TOPIC_WORD = re.compile(r"\d+(?:\.\d+)?|\w+(?:-\w+)*")
+
+
+def topic_words(query: str) -> list:
+    """Words of the question that define its topic, numbers and question words included."""
+    return [word for word in TOPIC_WORD.findall((query or "").casefold()) if word not in TOPIC_STOPWORDS]
+
+
+def topic_key(query: str) -> str:
+    """Normalises a question: "Best time to sell apples in Himachal?" -> "apple best himachal sell time"."""
+    words = set()
+    for word in topic_words(query):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and not word[0].isdigit():
+            word = word[:-1]
+        words.add(word)
+    return " ".join(sorted(words))
+
+
+class FallbackAnswerCache:
+    def __init__(self, redis_client=None, ttl_seconds: int = 7 * 24 * 60 * 60, max_entries: int = 5000,
+                 local_max_entries: int = 512, key_prefix: str = "rag_fallback:"):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.local_max_entries = local_max_entries
+        self.key_prefix = key_prefix
+        self._local = OrderedDict()  # key -> (answer, expires_at)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "shared_errors": 0}
+
+    def key(self, namespace: str, query: str, region: str = None, when: datetime = None) -> str:
+        month = (when or datetime.now()).strftime("%Y-%m")
+        topic = topic_key(query) or " ".join(query.casefold().split())
+        raw = f"{namespace}|{(region or '').casefold()}|{month}|{topic}"
+        return self.key_prefix + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, namespace: str, query: str, region: str = None):
+        key = self.key(namespace, query, region)
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._local[key]
+
+        answer = self._get_shared(key)
+        if answer is None:
+            self._count("misses")
+            return None
+        self._count("shared_hits")
+        self._set_local(key, answer)
+        return answer
+
+    def set(self, namespace: str, query: str, region: str, answer: str):
+        if not answer:
+            return
+        key = self.key(namespace, query, region)
+        self._count("stores")
+        self._set_local(key, answer)
+        self._set_shared(key, answer)
+
+    def _set_local(self, key: str, answer: str):
+        with self._lock:
+            self._local[key] = (answer, time.time() + self.ttl_seconds)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    # --- Shared tier ---
+    def _get_shared(self, key: str):
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(key)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Shared fallback cache unavailable: {e}")
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def _set_shared(self, key: str, answer: str):
+        if self.redis is None:
+            return
+        index_key = self.key_prefix + "index"
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(key, answer, ex=self.ttl_seconds)
+            pipe.zadd(index_key, {key: time.time()})
+            pipe.zcard(index_key)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                # Evict the least recently written answers beyond the cap.
+                evicted = [item[0] for item in self.redis.zpopmin(index_key, size - self.max_entries)]
+                if evicted:
+                    self.redis.delete(*evicted)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Could not write to shared fallback cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, local_entries=len(self._local))
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,239 @@
+# File: forecast_cache.py
+"""
+Forecast cache shared by every farmer in the same geohash cell.
+
+Neighbouring farms get the same daily forecast, but each question used to
+call the weather API with the user's exact coordinates. Forecasts are cached
+per geohash cell (precision 5 is roughly 5 x 5 km) and calendar date, and
+the API is always asked about the cell's centre, so every user in the cell
+gets the same forecast, whoever asked first.
+
+    - Expiry follows the provider's refresh cycle: entries expire at the next
+      multiple of `refresh_seconds` (the top of the hour by default), not a
+      fixed time after they were written, so no worker serves a forecast
+      older than one refresh.
+    - Two tiers: a bounded in-process LRU and Redis, shared by all workers.
+    - Single flight: concurrent misses for a cell in one process wait for the
+      first; across processes a short Redis lock lets one worker fetch while
+      the others poll Redis for its result. A storm of rain questions in a
+      district therefore costs one API call per cell per refresh. When Redis
+      is down, workers fetch straight away instead of polling it.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Outcomes of trying to take the shared fetch lock.
+LOCK_ACQUIRED = "acquired"        # this worker fetches
+LOCK_HELD = "held"                # another worker is fetching; wait for its result
+LOCK_UNAVAILABLE = "unavailable"  # no Redis; fetch without coordinating
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 5) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate longitude, latitude; each halves the remaining range.
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(cell: str) -> tuple:
+    """(latitude, longitude) of the centre of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class ForecastCache:
+    def __init__(self, redis_client=None, precision: int = 5, refresh_seconds: int = 60 * 60,
+                 local_max_entries: int = 2048, lock_seconds: float = 15, key_prefix: str = "weather:"):
+        self.redis = redis_client
+        self.precision = precision
+        self.refresh_seconds = refresh_seconds
+        self.local_max_entries = local_max_entries
+        self.lock_seconds = lock_seconds
+        self.key_prefix = key_prefix
+        self._local = OrderedDict()  # key -> (forecast days, expires_at)
+        self._flights = {}  # key -> Future of the fetch in progress
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0, "shared_hits": 0, "coalesced": 0, "shared_waits": 0, "fetches": 0, "shared_errors": 0,
+        }
+
+    def key(self, cell: str, when: datetime = None) -> str:
+        return f"{self.key_prefix}{cell}:{(when or datetime.now()).strftime('%Y-%m-%d')}"
+
+    def ttl(self, now: float = None) -> int:
+        """Seconds until the provider's next refresh boundary."""
+        now = time.time() if now is None else now
+        return max(1, int(self.refresh_seconds - now % self.refresh_seconds))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get_or_fetch(self, latitude: float, longitude: float, fetch) -> list:
+        """
+        Returns the cached forecast days for the cell containing the point, or calls
+        `fetch(cell_latitude, cell_longitude)` once for all concurrent callers.
+        """
+        cell = geohash_encode(latitude, longitude, self.precision)
+        key = self.key(cell)
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._local[key]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            # The leader may wait out another worker's lock before fetching itself.
+            return flight.result(timeout=2 * self.lock_seconds)
+
+        try:
+            days = self._load(key, cell, fetch)
+            flight.set_result(days)
+            return days
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def _load(self, key: str, cell: str, fetch) -> list:
+        days = self._get_shared(key)
+        if days is not None:
+            self._count("shared_hits")
+            self._set_local(key, days)
+            return days
+
+        lock = self._acquire_shared_lock(key)
+        if lock == LOCK_HELD:
+            days = self._wait_shared(key)
+            if days is not None:
+                return days
+        try:
+            self._count("fetches")
+            days = fetch(*geohash_center(cell))
+            self._set_local(key, days)
+            self._set_shared(key, days)
+            return days
+        finally:
+            if lock == LOCK_ACQUIRED:
+                self._release_shared_lock(key)
+
+    def _set_local(self, key: str, days: list):
+        with self._lock:
+            self._local[key] = (days, time.time() + self.ttl())
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    # --- Shared tier ---
+    def _get_shared(self, key: str):
+        if self.redis is None:
+            return None
+        try:
+            return self._read_shared(key)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Shared forecast cache unavailable: {e}")
+            return None
+
+    def _read_shared(self, key: str):
+        """Like _get_shared, but Redis errors propagate."""
+        value = self.redis.get(key)
+        return json.loads(value) if value else None
+
+    def _set_shared(self, key: str, days: list):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(key, json.dumps(days), ex=self.ttl())
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Could not write to shared forecast cache: {e}")
+
+    def _acquire_shared_lock(self, key: str) -> str:
+        """LOCK_ACQUIRED, LOCK_HELD when another worker is already fetching, or LOCK_UNAVAILABLE."""
+        if self.redis is None:
+            return LOCK_UNAVAILABLE
+        try:
+            acquired = self.redis.set(key + ":lock", "1", nx=True, ex=max(1, int(self.lock_seconds)))
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Shared forecast lock unavailable: {e}")
+            return LOCK_UNAVAILABLE
+        return LOCK_ACQUIRED if acquired else LOCK_HELD
+
+    def _release_shared_lock(self, key: str):
+        try:
+            self.redis.delete(key + ":lock")
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Could not release shared forecast lock: {e}")
+
+    def _wait_shared(self, key: str, interval: float = 0.1):
+        """
+        Polls Redis for another worker's fetch; None if it doesn't land within lock_seconds
+        or Redis fails, in which case the caller fetches itself.
+        """
+        self._count("shared_waits")
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            try:
+                days = self._read_shared(key)
+            except Exception as e:
+                self._count("shared_errors")
+                print(f"⚠️ Shared forecast cache failed while waiting, fetching instead: {e}")
+                return None
+            if days is not None:
+                self._count("shared_hits")
+                self._set_local(key, days)
+                return days
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, local_entries=len(self._local), in_flight=len(self._flights))
+        lookups = stats["hits"] + stats["shared_hits"] + stats["coalesced"] + stats["fetches"]
+        stats["api_call_ratio"] = round(stats["fetches"] / lookups, 4) if lookups else 0.0
+        return stats
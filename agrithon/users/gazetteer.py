@@ -0,0 +1,312 @@
+# File: gazetteer.py
+"""
+Offline gazetteer of Indian post offices for onboarding and weather lookups.
+
+Address onboarding used to ask Gemini to pull state/district/village out of
+the message and then geocode the raw text with public Nominatim (a 10 s
+timeout and 1 request/s). Here every post office from the India Post
+"All India Pincode Directory" (data.gov.in) is kept in a read-only SQLite
+table with its pincode, taluk, district, state and coordinates, plus one
+row per district and state at the mean of its offices' coordinates.
+
+Place names (and any alias, e.g. names in Indic scripts loaded with
+--aliases) are indexed by character trigrams in a second table, so a
+message like "vill. Rampur, teh. Rampur Bushahr, distt Shimla" is matched
+with a handful of index lookups and a Dice-similarity re-rank, tolerant of
+spelling variants and script. Load it with
+`python manage.py load_gazetteer <directory.csv> [--aliases aliases.csv]`.
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import defaultdict
+
+from pydantic import BaseModel
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS places (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pincode TEXT NOT NULL DEFAULT '',
+    taluk TEXT NOT NULL DEFAULT '',
+    district TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT '',
+    latitude REAL,
+    longitude REAL
+);
+CREATE INDEX IF NOT EXISTS places_by_pincode ON places (pincode, latitude, longitude);
+CREATE TABLE IF NOT EXISTS place_names (
+    place_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (place_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS name_grams (
+    gram TEXT NOT NULL,
+    place_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, place_id)
+) WITHOUT ROWID;
+"""
+
+# CSV header (normalised) -> column. Covers the data.gov.in pincode directory exports.
+CSV_COLUMNS = {
+    "officename": "name", "office name": "name", "office_name": "name", "pincode": "pincode",
+    "taluk": "taluk", "divisionname": "division", "districtname": "district", "district": "district",
+    "statename": "state", "state": "state", "latitude": "latitude", "longitude": "longitude",
+}
+OFFICE_SUFFIX = re.compile(r"\s+\(?\b[BSHG]\.?\s?O\.?\)?$", re.IGNORECASE)
+DIVISION_SUFFIX = re.compile(r"\s+division$", re.IGNORECASE)
+PINCODE = re.compile(r"(?<!\d)[1-9]\d{2}\s?\d{3}(?!\d)")
+# Address words that say what a name is without being part of it.
+ADDRESS_WORDS = {
+    "village", "vill", "vil", "gaon", "gram", "post", "po", "tehsil", "teh", "taluka", "taluk", "tq", "block",
+    "district", "distt", "dist", "city", "town", "state", "near", "pin", "pincode", "code", "my", "address",
+    "is", "at", "in", "and", "the", "of", "गांव", "ग्राम", "तहसील", "जिला", "जिल्ला", "पोस्ट", "राज्य",
+}
+KIND_ORDER = {"office": 0, "alias": 0, "district": 1, "state": 2}
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", (text or "").casefold())
+    text = "".join(ch if unicodedata.category(ch)[0] in "LNM" else " " for ch in text)
+    return " ".join(text.split())
+
+
+def trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(first: set, second: set) -> float:
+    return 2.0 * len(first & second) / (len(first) + len(second)) if first and second else 0.0
+
+
+def _parse_coordinate(value):
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if number else None
+
+
+def read_directory_csv(path: str):
+    """Yields post office dicts; offices without a name or pincode are skipped."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        mapping = {header: CSV_COLUMNS.get(header.strip().lower()) for header in reader.fieldnames or []}
+        for raw in reader:
+            row = {column: (raw[header] or "").strip() for header, column in mapping.items() if column}
+            name = OFFICE_SUFFIX.sub("", row.get("name", "")).strip()
+            pincode = re.sub(r"\D", "", row.get("pincode", ""))
+            if not name or len(pincode) != 6:
+                continue
+            yield {
+                "name": name.title(), "pincode": pincode,
+                "taluk": DIVISION_SUFFIX.sub("", row.get("taluk") or row.get("division") or "").title(),
+                "district": row.get("district", "").title(), "state": row.get("state", "").title(),
+                "latitude": _parse_coordinate(row.get("latitude")),
+                "longitude": _parse_coordinate(row.get("longitude")),
+            }
+
+
+def load_gazetteer(db_path: str, paths: list, alias_paths: list = ()) -> int:
+    """
+    Rebuilds the gazetteer at `db_path` from pincode directory CSVs; returns the offices read.
+    Alias CSVs have `name,pincode` rows (any script) that add names to every office of that pincode.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db = sqlite3.connect(db_path)
+    try:
+        db.executescript(SCHEMA)
+        areas = defaultdict(list)
+        count = 0
+        for path in paths:
+            for office in read_directory_csv(path):
+                cursor = db.execute(
+                    "INSERT INTO places (kind, name, pincode, taluk, district, state, latitude, longitude) "
+                    "VALUES ('office', :name, :pincode, :taluk, :district, :state, :latitude, :longitude)", office,
+                )
+                db.execute("INSERT OR IGNORE INTO place_names VALUES (?, ?)", (cursor.lastrowid, office["name"]))
+                if office["latitude"] is not None:
+                    areas[("district", office["district"], office["state"])].append(office)
+                    areas[("state", "", office["state"])].append(office)
+                count += 1
+
+        # District and state rows sit at the mean of their offices' coordinates.
+        for (kind, district, state), offices in areas.items():
+            cursor = db.execute(
+                "INSERT INTO places (kind, name, district, state, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, district or state, district, state,
+                 sum(office["latitude"] for office in offices) / len(offices),
+                 sum(office["longitude"] for office in offices) / len(offices)),
+            )
+            db.execute("INSERT OR IGNORE INTO place_names VALUES (?, ?)", (cursor.lastrowid, district or state))
+        # Offices listed without coordinates take their district's.
+        db.execute(
+            """UPDATE places SET (latitude, longitude) = (
+                   SELECT area.latitude, area.longitude FROM places AS area
+                   WHERE area.kind = 'district' AND area.district = places.district AND area.state = places.state)
+               WHERE kind = 'office' AND latitude IS NULL"""
+        )
+
+        for path in alias_paths:
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    db.execute(
+                        "INSERT OR IGNORE INTO place_names SELECT id, ? FROM places WHERE kind = 'office' AND pincode = ?",
+                        (row["name"].strip(), re.sub(r"\D", "", row["pincode"])),
+                    )
+
+        for place_id, name in db.execute("SELECT place_id, name FROM place_names").fetchall():
+            db.executemany("INSERT OR IGNORE INTO name_grams VALUES (?, ?)",
+                           [(gram, place_id) for gram in trigrams(normalize(name))])
+        db.commit()
+        db.execute("ANALYZE")
+        return count
+    finally:
+        db.close()
+
+
+class Location(BaseModel):
+    kind: str
+    name: str
+    pincode: str = ""
+    taluk: str = ""
+    district: str = ""
+    state: str = ""
+    latitude: float
+    longitude: float
+    score: float = 1.0
+
+    def address(self) -> dict:
+        """The address dict stored in the WhatsApp session."""
+        return {
+            "state": self.state, "district": self.district, "city": self.taluk,
+            "village": self.name if self.kind == "office" else "",
+        }
+
+
+class Gazetteer:
+    """
+    Read-only lookups; one connection shared by the threads of a worker. `min_score`
+    is the Dice similarity (plus district/state bonus) a fuzzy match needs.
+    """
+    PLACE_COLUMNS = "id, kind, name, pincode, taluk, district, state, latitude, longitude"
+
+    def __init__(self, db_path: str, min_score: float = 0.75, candidates: int = 200):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Gazetteer not found at '{db_path}'.")
+        self._db = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.min_score = min_score
+        self.candidates = candidates
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _location(row, score: float = 1.0) -> Location:
+        _, kind, name, pincode, taluk, district, state, latitude, longitude = row
+        return Location(kind=kind, name=name, pincode=pincode, taluk=taluk, district=district, state=state,
+                        latitude=latitude, longitude=longitude, score=round(score, 4))
+
+    def by_pincode(self, pincode: str):
+        """The pincode's first office with coordinates, or None."""
+        pincode = re.sub(r"\D", "", pincode or "")
+        rows = self._query(
+            f"SELECT {self.PLACE_COLUMNS} FROM places WHERE pincode = ? AND latitude IS NOT NULL LIMIT 1", (pincode,)
+        )
+        return self._location(rows[0]) if rows else None
+
+    def search(self, text: str, limit: int = 5, pincode: str = None) -> list:
+        """
+        Ranks places whose names best match some 1-3 word span of `text`. The office's
+        district or state named in another span, or the user's known pincode, adds to the score.
+        """
+        words = [word for word in normalize(text).split() if word not in ADDRESS_WORDS and not word.isdigit()]
+        if not words:
+            return []
+        # (first word, last word + 1, trigrams) of every 1-3 word span
+        spans = [(i, i + n, trigrams(" ".join(words[i:i + n])))
+                 for n in (1, 2, 3) for i in range(len(words) - n + 1)]
+        grams = sorted(set().union(*(span[2] for span in spans)))
+
+        placeholders = ",".join("?" * len(grams))
+        candidate_ids = [place_id for place_id, _ in self._query(
+            f"SELECT place_id, COUNT(*) AS hits FROM name_grams WHERE gram IN ({placeholders}) "
+            f"GROUP BY place_id ORDER BY hits DESC LIMIT ?", (*grams, self.candidates),
+        )]
+        if not candidate_ids:
+            return []
+        placeholders = ",".join("?" * len(candidate_ids))
+        rows = self._query(
+            f"SELECT places.*, place_names.name FROM places JOIN place_names ON place_names.place_id = places.id "
+            f"WHERE places.id IN ({placeholders}) AND places.latitude IS NOT NULL", candidate_ids,
+        )
+
+        def best_span(name: str):
+            """(similarity, span) of the span that best matches `name`."""
+            name_grams = trigrams(normalize(name))
+            return max(((dice(name_grams, span[2]), span) for span in spans), key=lambda item: item[0])
+
+        def named_elsewhere(name: str, used: tuple) -> bool:
+            # "Ludhiana" in "khanna ludhiana" supports Khanna (district Ludhiana), not Ludhiana itself.
+            if not name:
+                return False
+            score, span = best_span(name)
+            return score >= 0.8 and (span[1] <= used[0] or span[0] >= used[1])
+
+        scored = {}
+        for row in rows:
+            place, alias = row[:9], row[9]
+            score, span = best_span(alias)
+            _, kind, _, place_pincode, _, district, state, _, _ = place
+            if kind == "office":
+                score += 0.3 * named_elsewhere(district, span) + 0.1 * named_elsewhere(state, span)
+                score += 0.2 * bool(pincode and place_pincode == pincode)
+            elif kind == "district":
+                score += 0.1 * named_elsewhere(state, span)
+            best = scored.get(place[0])
+            if best is None or score > best[1]:
+                scored[place[0]] = (place, score)
+
+        ranked = sorted(scored.values(), key=lambda item: (-item[1], KIND_ORDER.get(item[0][1], 3)))
+        return [self._location(place, score) for place, score in ranked[:limit]]
+
+    def resolve(self, text: str, pincode: str = None):
+        """
+        Best location for a free-text address: a pincode in the text wins, then the
+        best fuzzy name match above `min_score`. None when nothing is close enough.
+        """
+        match = PINCODE.search(text or "")
+        if match:
+            location = self.by_pincode(match.group(0).replace(" ", ""))
+            if location is not None:
+                return location
+        matches = self.search(text, limit=1, pincode=pincode)
+        if matches and matches[0].score >= self.min_score:
+            return matches[0]
+        return None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Opens the gazetteer at settings.GAZETTEER_DB_PATH once per process; None when it hasn't been loaded."""
+    global _gazetteer
+    if _gazetteer is None:
+        from django.conf import settings
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                try:
+                    _gazetteer = Gazetteer(settings.GAZETTEER_DB_PATH)
+                except FileNotFoundError:
+                    return None
+    return _gazetteer
@@ -0,0 +1,147 @@
+# File: history_store.py
+"""
+Conversation-history backends for the RAG engines.
+
+`RunnableWithMessageHistory` asks the engine for a history object per
+session. Before, each engine kept a plain dict of `ChatMessageHistory` that
+was never evicted, was duplicated per engine and per worker, and was lost
+on restart. A backend hands out `BaseChatMessageHistory` objects that keep
+at most `max_turns` question/answer pairs per session:
+
+    InMemoryHistoryBackend   bounded LRU of sessions with an idle TTL, per process
+    RedisHistoryBackend      one capped Redis list per session, shared by all workers
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+
+class HistoryBackend:
+    """Interface: `get_history(session_id)` returns the history object for that session."""
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+# --- In memory ---
+class BoundedChatMessageHistory(BaseChatMessageHistory):
+    """Keeps only the newest `max_messages` messages."""
+    def __init__(self, max_messages: int):
+        self._messages = deque(maxlen=max_messages)
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self) -> list:
+        with self._lock:
+            return list(self._messages)
+
+    def add_messages(self, messages) -> None:
+        with self._lock:
+            self._messages.extend(messages)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages.clear()
+
+
+class InMemoryHistoryBackend(HistoryBackend):
+    """
+    Holds at most `max_sessions` sessions; the least recently used one is dropped
+    first, and sessions idle for longer than `ttl_seconds` start over.
+    """
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: int = 24 * 60 * 60, max_turns: int = 10):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = 2 * max_turns
+        self._sessions = OrderedDict()  # session_id -> (history, last_used)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del self._sessions[session_id]
+                self._counters["expirations"] += 1
+                entry = None
+
+            if entry is None:
+                self._counters["misses"] += 1
+                history = BoundedChatMessageHistory(self.max_messages)
+            else:
+                self._counters["hits"] += 1
+                history = entry[0]
+            self._sessions[session_id] = (history, now)
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._counters["evictions"] += 1
+        return history
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._sessions), **self._counters}
+
+
+# --- Redis ---
+class RedisChatMessageHistory(BaseChatMessageHistory):
+    """
+    Messages of one session in a Redis list, trimmed to the newest `max_messages`
+    and expiring `ttl_seconds` after the last write. Redis errors are logged and
+    treated as an empty history, so an outage degrades answers instead of failing them.
+    """
+    def __init__(self, client, key: str, max_messages: int, ttl_seconds: int):
+        self.client = client
+        self.key = key
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def messages(self) -> list:
+        try:
+            raw = self.client.lrange(self.key, -self.max_messages, -1)
+        except Exception as e:
+            print(f"⚠️ Could not read chat history from Redis: {e}")
+            return []
+        return messages_from_dict([json.loads(item) for item in raw])
+
+    def add_messages(self, messages) -> None:
+        if not messages:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.rpush(self.key, *[json.dumps(item) for item in messages_to_dict(messages)])
+            pipe.ltrim(self.key, -self.max_messages, -1)
+            pipe.expire(self.key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            print(f"⚠️ Could not write chat history to Redis: {e}")
+
+    def clear(self) -> None:
+        try:
+            self.client.delete(self.key)
+        except Exception as e:
+            print(f"⚠️ Could not clear chat history in Redis: {e}")
+
+
+class RedisHistoryBackend(HistoryBackend):
+    def __init__(self, client, ttl_seconds: int = 24 * 60 * 60, max_turns: int = 10,
+                 key_prefix: str = "rag_history:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = 2 * max_turns
+        self.key_prefix = key_prefix
+
+    def get_history(self, session_id: str) -> BaseChatMessageHistory:
+        return RedisChatMessageHistory(self.client, self.key_prefix + session_id, self.max_messages, self.ttl_seconds)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "max_messages": self.max_messages, "ttl_seconds": self.ttl_seconds}
@@ -0,0 +1,278 @@
+# File: index_builder.py
+"""
+Builds and extends the RAG indexes from source documents (PDF, CSV, text).
+
+Source files are loaded and chunked in a process pool; chunks are
+deduplicated by content hash and embedded in batches on the same pool. A
+build starts from the current version of the index root, so only chunks
+that aren't already in the index are embedded. Files whose hash matches the
+manifest are skipped without being read. Adding a season of price data
+re-embeds that season only.
+
+Every build writes a new, complete version directory in the memory-mapped
+format (see index_store.py) and then swaps the `current` symlink to it:
+    <root>/v0001/        meta.json, vectors.f32, ..., manifest.json
+    <root>/v0002/
+    <root>/current -> v0002
+Workers that already mapped an older version keep reading it until they
+restart, so old versions are never modified. Builds are append-only: chunks
+from edited or removed files stay until the index is rebuilt with --rebuild.
+
+Run with `python manage.py build_rag_index <root> <sources...>`.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .embedding_cache import normalize_text
+from .index_store import MmapVectorStore, index_params, is_mmap_index, read_faiss_index, write_mmap_index
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_LINK = "current"
+SOURCE_SUFFIXES = (".pdf", ".csv", ".txt", ".md")
+VERSION_PATTERN = re.compile(r"^v(\d{4,})$")
+# Endpoint the bundled indexes were embedded with (OllamaEmbeddings, unnormalised vectors).
+LEGACY_ENDPOINT = "api/embeddings"
+BATCH_ENDPOINT = "api/embed"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_source_files(paths):
+    """Yields supported files from the given files and directories (recursively), sorted."""
+    for path in paths:
+        if os.path.isdir(path):
+            for parent, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    if name.lower().endswith(SOURCE_SUFFIXES):
+                        yield os.path.abspath(os.path.join(parent, name))
+        elif os.path.isfile(path):
+            yield os.path.abspath(path)
+        else:
+            raise FileNotFoundError(f"Source '{path}' does not exist.")
+
+
+# --- Loading and chunking (runs in the worker processes) ---
+def load_source(path: str) -> list:
+    """Returns [(text, metadata)]: one entry per PDF page, CSV row or text file."""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".pdf":
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        return [(page.extract_text() or "", {"source": path, "page": number})
+                for number, page in enumerate(reader.pages)]
+    if suffix == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return [
+                ("; ".join(f"{key}: {value}" for key, value in row.items() if key and value), {"source": path, "row": number})
+                for number, row in enumerate(csv.DictReader(f))
+            ]
+    if suffix in (".txt", ".md"):
+        with open(path, encoding="utf-8") as f:
+            return [(f.read(), {"source": path})]
+    raise ValueError(f"Unsupported source type '{suffix}' for '{path}'.")
+
+
+def chunk_source(path: str, chunk_size: int, chunk_overlap: int) -> list:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    for text, metadata in load_source(path):
+        for chunk in splitter.split_text(text):
+            if chunk.strip():
+                chunks.append((chunk, metadata))
+    return chunks
+
+
+_worker_embeddings = None
+
+
+def _init_worker(model: str, base_url: str, endpoint: str):
+    global _worker_embeddings
+    if endpoint == BATCH_ENDPOINT:
+        from .embedding_batcher import OllamaBatchEmbeddings
+        _worker_embeddings = OllamaBatchEmbeddings(model=model, base_url=base_url, timeout=120)
+    else:
+        from langchain_community.embeddings import OllamaEmbeddings
+        _worker_embeddings = OllamaEmbeddings(model=model, base_url=base_url)
+
+
+def _embed_batch(texts: list):
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+# --- Versions ---
+def version_names(root: str) -> list:
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if VERSION_PATTERN.match(name))
+
+
+def current_version(root: str):
+    """Path of the version `current` points to (or the newest one), None for an empty root."""
+    link = os.path.join(root, CURRENT_LINK)
+    if os.path.exists(link):
+        return os.path.realpath(link)
+    names = version_names(root)
+    return os.path.join(root, names[-1]) if names else None
+
+
+def read_manifest(path: str) -> dict:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _publish(root: str, version: str):
+    """Points `current` at `version` atomically."""
+    tmp_link = os.path.join(root, CURRENT_LINK + ".tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, os.path.join(root, CURRENT_LINK))
+
+
+def load_base(path: str):
+    """Returns (vectors, documents, ids, meta, manifest) of an existing index directory."""
+    if is_mmap_index(path):
+        store = MmapVectorStore(path, embeddings=None)
+        ids, documents = [], []
+        for doc_id, doc in store.iter_documents():
+            ids.append(doc_id)
+            documents.append(doc)
+        return np.array(store.vectors), documents, ids, store.meta, read_manifest(path)
+    vectors, documents, ids = read_faiss_index(path)
+    return vectors, documents, ids, {}, {}
+
+
+def build_index(root: str, sources: list, base: str = None, rebuild: bool = False,
+                model: str = "nomic-embed-text", base_url: str = "http://localhost:11434",
+                endpoint: str = None, workers: int = None, chunk_size: int = 1000, chunk_overlap: int = 150,
+                batch_size: int = 32, index_type: str = None, params: dict = None, log=print) -> dict:
+    """
+    Adds the chunks of `sources` that the base index doesn't have yet and publishes the
+    result as a new version under `root`. The base is `base` (an index directory in
+    either format), else the current version of `root`; `rebuild` starts empty.
+    Returns the new manifest, or the base's manifest when nothing was added.
+    """
+    started = time.perf_counter()
+    base = None if rebuild else (base or current_version(root))
+
+    vectors, documents, ids, base_meta, base_manifest = (
+        load_base(base) if base else (np.empty((0, 0), dtype=np.float32), [], [], {}, {})
+    )
+    if base:
+        log(f"✅ Base index {base}: {len(documents)} chunks")
+
+    base_endpoint = base_manifest.get("embedding", {}).get("endpoint", LEGACY_ENDPOINT if base else None)
+    endpoint = endpoint or base_endpoint or LEGACY_ENDPOINT
+    base_model = base_manifest.get("embedding", {}).get("model")
+    if base and (endpoint != base_endpoint or (base_model and base_model != model)):
+        raise ValueError(
+            f"The base index was embedded with {base_model or model} via /{base_endpoint}; "
+            f"appending with {model} via /{endpoint} would mix vector spaces. Use --rebuild."
+        )
+
+    index_type = index_type or base_meta.get("index_type", "flat")
+    if params is None and index_type == base_meta.get("index_type"):
+        params = base_meta.get("index_params")
+    params = index_params(index_type, params)
+
+    known_sources = dict(base_manifest.get("sources", {}))
+    seen = {content_hash(doc.page_content) for doc in documents}
+    files = list(iter_source_files(sources))
+    hashes = {path: file_hash(path) for path in files}
+    changed = [path for path in files if known_sources.get(path, {}).get("sha256") != hashes[path]]
+    log(f"📄 {len(files)} source files, {len(files) - len(changed)} unchanged since the base index")
+
+    new_documents, batches, duplicates = [], [], 0
+    source_stats = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model, base_url, endpoint)) as pool:
+        chunk_futures = [pool.submit(chunk_source, path, chunk_size, chunk_overlap) for path in changed]
+        pending = []
+
+        def flush():
+            if pending:
+                batches.append(pool.submit(_embed_batch, [doc.page_content for doc in pending]))
+                new_documents.extend(pending)
+                pending.clear()
+
+        # Chunks stream into embedding batches as soon as each file is chunked.
+        for path, future in zip(changed, chunk_futures):
+            added = skipped = 0
+            for text, metadata in future.result():
+                digest = content_hash(text)
+                if digest in seen:
+                    skipped += 1
+                    continue
+                seen.add(digest)
+                pending.append(Document(id=digest, page_content=text, metadata=metadata))
+                added += 1
+                if len(pending) >= batch_size:
+                    flush()
+            duplicates += skipped
+            source_stats[path] = {"sha256": hashes[path], "chunks": added, "duplicates": skipped}
+            log(f"  {os.path.relpath(path)}: {added} new chunks, {skipped} duplicates")
+        flush()
+        new_vectors = [future.result() for future in batches]
+
+    if not new_documents and base:
+        log("✅ Nothing new to add; the current version is up to date.")
+        return base_manifest
+
+    if new_vectors:
+        new_vectors = np.concatenate(new_vectors)
+        if len(documents) and new_vectors.shape[1] != vectors.shape[1]:
+            raise ValueError(f"New vectors have {new_vectors.shape[1]} dims, the base index has {vectors.shape[1]}.")
+        vectors = np.concatenate([vectors, new_vectors]) if len(documents) else new_vectors
+    if not len(vectors):
+        raise ValueError("No chunks were produced from the given sources.")
+
+    names = version_names(root)
+    number = int(VERSION_PATTERN.match(names[-1]).group(1)) + 1 if names else 1
+    version = f"v{number:04d}"
+    manifest = {
+        "version": version,
+        "parent": os.path.abspath(base) if base else None,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedding": {"model": model, "endpoint": endpoint},
+        "chunking": {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap},
+        "count": int(len(vectors)),
+        "added": len(new_documents),
+        "duplicates_skipped": duplicates,
+        "sources": {**known_sources, **{path: dict(stats, version=version) for path, stats in source_stats.items()}},
+    }
+
+    # Write into a temporary directory and rename, so a version directory is always complete.
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, f".{version}.tmp")
+    write_mmap_index(tmp_path, vectors, documents + new_documents, ids + [doc.id for doc in new_documents],
+                     extra_meta={"version": version}, index_type=index_type, params=params)
+    manifest["build_seconds"] = round(time.perf_counter() - started, 1)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp_path, os.path.join(root, version))
+    _publish(root, version)
+    return manifest
@@ -0,0 +1,351 @@
+# File: index_store.py
+"""
+Memory-mapped storage for the RAG vector indexes.
+
+`FAISS.load_local` unpickles the whole index and docstore into every worker
+process, so N workers hold N copies. The format written here keeps the
+vectors in a raw float32 file that is opened with `np.memmap` and the chunk
+texts in a read-only SQLite file. Both are read through the OS page cache,
+so every worker on a host shares a single copy, and a worker only
+materialises the k documents it actually returns.
+
+Directory layout:
+    meta.json          format, count, dimension, metric, index type and parameters
+    vectors.f32        row-major float32 matrix (count x dim)
+    norms.f32          squared L2 norm of every row
+    docstore.sqlite3   row -> (doc id, page_content, metadata JSON)
+    ann.faiss          approximate index, only for index types other than "flat"
+    lexical.npz        BM25 postings over the same rows (see lexical_index.py)
+
+Index types:
+    flat    exact search straight over the memmap (the default)
+    hnsw    faiss IndexHNSWFlat, opened with IO_FLAG_MMAP_IFC so its vectors
+            and graph are shared through the page cache too; params M,
+            ef_construction, ef_search. ann.faiss holds a second copy of the
+            vectors, so the directory takes about twice the disk of "flat".
+    ivfpq   faiss IVF + product quantiser, opened with IO_FLAG_MMAP;
+            params nlist, m, nbits, nprobe, and rerank (candidates per result
+            that are re-scored exactly against the memmap, 0 to disable)
+
+With a faiss build older than 1.10 (no IO_FLAG_MMAP_IFC), hnsw falls back to
+a private copy per process: roughly count x (4 x dim + 8 x M) bytes each.
+
+Existing LangChain FAISS directories are converted with
+`python manage.py convert_rag_index <faiss_dir> <output_dir> [--index-type hnsw]`.
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+FORMAT_NAME = "mmap-flat"
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+NORMS_FILE = "norms.f32"
+DOCSTORE_FILE = "docstore.sqlite3"
+ANN_FILE = "ann.faiss"
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+DEFAULT_INDEX_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    "ivfpq": {"nlist": None, "m": 48, "nbits": 8, "nprobe": 16, "rerank": 4},
+}
+# Search-time parameters; everything else only matters when the index is built.
+SEARCH_PARAMS = {"ef_search", "nprobe", "rerank"}
+
+
+def is_mmap_index(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_FILE))
+
+
+def index_params(index_type: str, params: dict = None) -> dict:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'; expected one of {', '.join(INDEX_TYPES)}.")
+    merged = dict(DEFAULT_INDEX_PARAMS[index_type])
+    unknown = set(params or {}) - set(merged)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {index_type}: {', '.join(sorted(unknown))}.")
+    merged.update(params or {})
+    return merged
+
+
+def build_ann_index(vectors, index_type: str, params: dict = None):
+    """Builds (and trains, for IVF-PQ) a faiss index of the given type over `vectors`."""
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    params = index_params(index_type, params)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["M"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+    else:
+        if dim % params["m"]:
+            raise ValueError(f"PQ m={params['m']} must divide the vector dimension {dim}.")
+        # faiss wants ~39 training points per list; small corpora get fewer lists.
+        nlist = params["nlist"] or max(1, min(int(4 * np.sqrt(count)), count // 39))
+        if count < max(39 * nlist, 2 ** params["nbits"]):
+            raise ValueError(f"{count} vectors are too few to train IVF{nlist},PQ; use 'flat' or 'hnsw'.")
+        index = faiss.index_factory(dim, f"IVF{nlist},PQ{params['m']}x{params['nbits']}")
+        index.train(vectors)
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    index.add(vectors)
+    return index
+
+
+def write_mmap_index(path: str, vectors, documents: list, ids: list = None, extra_meta: dict = None,
+                     index_type: str = "flat", params: dict = None):
+    """
+    Writes `vectors` (count x dim) and their `documents` in the memory-mapped format,
+    plus an approximate faiss index when `index_type` is not "flat".
+    """
+    params = index_params(index_type, params)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) != len(documents):
+        raise ValueError(f"Got {len(vectors)} vectors for {len(documents)} documents.")
+    ids = ids or [getattr(doc, "id", None) or str(row) for row, doc in enumerate(documents)]
+
+    os.makedirs(path, exist_ok=True)
+    vectors.tofile(os.path.join(path, VECTORS_FILE))
+    np.einsum("ij,ij->i", vectors, vectors).astype(np.float32).tofile(os.path.join(path, NORMS_FILE))
+
+    db_path = os.path.join(path, DOCSTORE_FILE)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE documents (row INTEGER PRIMARY KEY, doc_id TEXT, page_content TEXT, metadata TEXT)")
+    db.executemany(
+        "INSERT INTO documents VALUES (?, ?, ?, ?)",
+        ((row, ids[row], doc.page_content, json.dumps(doc.metadata or {})) for row, doc in enumerate(documents)),
+    )
+    db.commit()
+    db.close()
+
+    from .lexical_index import LEXICAL_FILE, BM25Index
+    BM25Index.build(doc.page_content for doc in documents).save(os.path.join(path, LEXICAL_FILE))
+
+    ann_path = os.path.join(path, ANN_FILE)
+    if index_type == "flat":
+        if os.path.exists(ann_path):
+            os.remove(ann_path)
+    else:
+        import faiss
+        faiss.write_index(build_ann_index(vectors, index_type, params), ann_path)
+
+    meta = {
+        "format": FORMAT_NAME, "count": int(vectors.shape[0]), "dim": int(vectors.shape[1]), "metric": "l2",
+        "index_type": index_type, "index_params": params,
+    }
+    meta.update(extra_meta or {})
+    # meta.json is written last: its presence marks the directory as complete.
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_faiss_index(path: str):
+    """Reads a LangChain FAISS directory; returns (vectors, documents, ids)."""
+    import faiss
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    ids = [index_to_docstore_id[row] for row in range(index.ntotal)]
+    documents = [docstore.search(doc_id) for doc_id in ids]
+    return vectors, documents, ids
+
+
+def convert_faiss_index(src: str, dst: str, index_type: str = "flat", params: dict = None) -> dict:
+    vectors, documents, ids = read_faiss_index(src)
+    write_mmap_index(dst, vectors, documents, ids, extra_meta={"source": os.path.abspath(src)},
+                     index_type=index_type, params=params)
+    with open(os.path.join(dst, META_FILE)) as f:
+        return json.load(f)
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Read-only vector store over a memory-mapped index directory. Flat directories
+    are searched exactly; hnsw/ivfpq directories go through their faiss index.
+    Scores are squared L2 distances, the same as LangChain's default FAISS index.
+    `search_params` overrides the stored ef_search / nprobe / rerank values.
+    """
+    def __init__(self, path: str, embeddings, search_params: dict = None):
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_NAME:
+            raise ValueError(f"Unsupported index format '{self.meta.get('format')}' in '{path}'.")
+
+        self.path = path
+        self._embeddings = embeddings
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+        self.norms = np.memmap(os.path.join(path, NORMS_FILE), dtype=np.float32, mode="r", shape=(count,))
+
+        db_uri = "file:" + os.path.abspath(os.path.join(path, DOCSTORE_FILE)) + "?mode=ro"
+        self._db = sqlite3.connect(db_uri, uri=True, check_same_thread=False)
+        self._db_lock = threading.Lock()
+
+        self.index_type = self.meta.get("index_type", "flat")
+        self.search_params = {
+            key: value for key, value in self.meta.get("index_params", {}).items() if key in SEARCH_PARAMS
+        }
+        self.search_params.update(search_params or {})
+        self.ann_index = self._load_ann_index() if self.index_type != "flat" else None
+
+    def _load_ann_index(self):
+        import faiss
+
+        ann_path = os.path.join(self.path, ANN_FILE)
+        if self.index_type == "ivfpq":
+            # IVF inverted lists can be memory-mapped and shared like the raw vectors.
+            try:
+                index = faiss.read_index(ann_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = faiss.read_index(ann_path)
+            faiss.extract_index_ivf(index).nprobe = int(self.search_params.get("nprobe", 16))
+        else:
+            # Flat codes (the vectors) and the graph are mapped from the file instead of copied.
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+            try:
+                if mmap_flag is None:
+                    raise RuntimeError("faiss build cannot memory-map HNSW indexes")
+                index = faiss.read_index(ann_path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                print(f"⚠️ Loading {ann_path} into private memory: {e}")
+                index = faiss.read_index(ann_path)
+            index.hnsw.efSearch = int(self.search_params.get("ef_search", 64))
+        return index
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def __len__(self):
+        return self.meta["count"]
+
+    # --- Search ---
+    def search_rows(self, embedding, k: int = 4):
+        """Returns (rows, squared L2 distances) of the k nearest vectors."""
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.ann_index is not None:
+            return self._search_ann(query, k)
+        distances = self.norms - 2.0 * (self.vectors @ query) + float(query @ query)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(distances, k - 1)[:k]
+        rows = rows[np.argsort(distances[rows])]
+        return rows, distances[rows]
+
+    def _search_ann(self, query: np.ndarray, k: int):
+        rerank = int(self.search_params.get("rerank", 0)) if self.index_type == "ivfpq" else 0
+        candidates = k * rerank if rerank > 1 else k
+        distances, rows = self.ann_index.search(query[None, :], candidates)
+        rows, distances = rows[0], distances[0]
+        keep = rows >= 0
+        rows, distances = rows[keep], distances[keep]
+
+        if rerank > 1 and len(rows):
+            # PQ distances are approximate; re-score the candidates exactly from the memmap.
+            exact = self.norms[rows] - 2.0 * (self.vectors[rows] @ query) + float(query @ query)
+            order = np.argsort(exact)[:k]
+            return rows[order], exact[order]
+        return rows[:k], distances[:k]
+
+    def get_documents(self, rows) -> list:
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        with self._db_lock:
+            found = self._db.execute(
+                f"SELECT row, doc_id, page_content, metadata FROM documents WHERE row IN ({placeholders})", rows
+            ).fetchall()
+        by_row = {
+            row: Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata))
+            for row, doc_id, page_content, metadata in found
+        }
+        return [by_row[row] for row in rows]
+
+    def iter_texts(self):
+        with self._db_lock:
+            found = self._db.execute("SELECT page_content FROM documents ORDER BY row").fetchall()
+        for (page_content,) in found:
+            yield page_content
+
+    def iter_documents(self):
+        """Yields (doc id, Document) for every row in row order."""
+        with self._db_lock:
+            found = self._db.execute("SELECT doc_id, page_content, metadata FROM documents ORDER BY row").fetchall()
+        for doc_id, page_content, metadata in found:
+            yield doc_id, Document(id=doc_id, page_content=page_content, metadata=json.loads(metadata))
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, **kwargs):
+        rows, distances = self.search_rows(embedding, k)
+        return list(zip(self.get_documents(rows), distances.tolist()))
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    # --- Read-only ---
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("MmapVectorStore is read-only; add documents with build_rag_index instead.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build index directories with the build_rag_index command.")
+
+
+# --- Row-level access shared by MmapVectorStore and LangChain FAISS ---
+def search_rows(vectorstore, embedding, k: int):
+    """Returns (rows, squared L2 distances) for either store type."""
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.search_rows(embedding, k)
+    distances, rows = vectorstore.index.search(np.asarray([embedding], dtype=np.float32), k)
+    keep = rows[0] >= 0
+    return rows[0][keep], distances[0][keep]
+
+
+def documents_for_rows(vectorstore, rows) -> list:
+    if isinstance(vectorstore, MmapVectorStore):
+        return vectorstore.get_documents(rows)
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(row)]) for row in rows]
+
+
+def iter_texts(vectorstore):
+    """Yields every chunk's text in row order."""
+    if isinstance(vectorstore, MmapVectorStore):
+        yield from vectorstore.iter_texts()
+        return
+    for row in range(vectorstore.index.ntotal):
+        yield vectorstore.docstore.search(vectorstore.index_to_docstore_id[row]).page_content
+
+
+def load_vector_store(path: str, embeddings, search_params: dict = None):
+    """Loads an index directory in whichever format it was written."""
+    if is_mmap_index(path):
+        return MmapVectorStore(path, embeddings, search_params)
+
+    from langchain_community.vectorstores import FAISS
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
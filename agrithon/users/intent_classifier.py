@@ -0,0 +1,190 @@
+# File: intent_classifier.py
+"""
+Local fast path for labelling WhatsApp messages before the Gemini classifiers.
+
+`check_greeting` and `analyze_farmer_query` each spend a Gemini round trip on
+messages like "hi", "namaste", "help" or a bare menu digit. This classifier
+answers the clear cases on the CPU:
+
+    1. a multilingual lexicon of greetings, help requests and acknowledgements
+       (whole message only, so "hello, my wheat has rust" is not a greeting);
+    2. nearest centroid over hashed character n-grams (TF-IDF weighted) of the
+       labelled examples in intent_examples.json, which copes with romanised
+       Hindi and spelling variants.
+
+A prediction is used only when the best centroid is similar enough and clearly
+ahead of the runner-up; everything else still goes to Gemini. Centroids only
+ever label queries: saying a message is *not* a query (greeting, help, ack,
+unrelated) is left to the whole-message lexicon, because a near miss there
+drops the farmer's question ("can you help me with my cotton crop" sits
+close to the "help" centroid).
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+from pydantic import BaseModel
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.json")
+
+GREETING_LABELS = {"greeting", "help"}
+NON_QUERY_LABELS = GREETING_LABELS | {"ack", "unrelated"}
+
+LEXICON = {
+    "greeting": [
+        "hi", "hello", "hey", "hola", "good morning", "good afternoon", "good evening", "namaste", "namaskar",
+        "namaskaram", "namaskara", "pranam", "ram ram", "jai kisan", "sat sri akal", "vanakkam", "kem cho",
+        "salaam", "assalamualaikum", "नमस्ते", "नमस्कार", "प्रणाम", "राम राम", "सुप्रभात", "ਸਤ ਸ੍ਰੀ ਅਕਾਲ",
+        "வணக்கம்", "నమస్కారం", "ನಮಸ್ಕಾರ", "নমস্কার", "નમસ્તે", "നമസ്കാരം",
+    ],
+    "help": [
+        "help", "help me", "i need help", "i want help", "need help", "madad", "madad karo", "madad chahiye",
+        "sahayata", "madat", "मदद", "मदद करो", "मदद चाहिए", "सहायता", "मदत", "ਮਦਦ", "உதவி", "సహాయం", "ಸಹಾಯ",
+        "সাহায্য", "મદદ",
+    ],
+    "ack": [
+        "ok", "okay", "k", "thanks", "thank you", "thankyou", "dhanyavad", "dhanyawad", "shukriya", "yes", "no",
+        "haan", "han", "nahi", "theek hai", "thik hai", "got it", "धन्यवाद", "शुक्रिया", "हाँ", "हां", "नहीं",
+        "ठीक है",
+    ],
+}
+# Words that may surround a lexicon phrase without changing the intent ("namaste ji", "hello sir").
+FILLER_WORDS = {
+    "ji", "sir", "madam", "mam", "bhai", "bhaiya", "didi", "please", "plz", "pls", "there", "all", "everyone",
+    "friend", "dost", "so", "much", "very", "mujhe", "me", "जी", "भाई", "मुझे", "आपका", "बहुत",
+}
+DIGITS_ONLY = re.compile(r"^\d{1,2}$")
+REPEATED_LETTERS = re.compile(r"(\w)\1{2,}")
+
+
+def normalize(text: str) -> str:
+    """Casefolds, drops punctuation and emoji, and squeezes stretched letters ("hiii" -> "hi")."""
+    text = unicodedata.normalize("NFC", (text or "").casefold())
+    # Keep letters, digits and combining marks (Indic vowel signs); everything else becomes a space.
+    text = "".join(ch if unicodedata.category(ch)[0] in "LNM" else " " for ch in text)
+    return " ".join(REPEATED_LETTERS.sub(r"\1", text).split())
+
+
+class IntentPrediction(BaseModel):
+    label: str
+    confidence: float
+    source: str  # "lexicon" or "centroid"
+
+
+class IntentClassifier:
+    """
+    `min_similarity` is the cosine similarity the best centroid needs and `min_margin`
+    its lead over the second best; below either, `classify` returns None.
+    """
+    def __init__(self, examples: dict, min_similarity: float = 0.3, min_margin: float = 0.06,
+                 dim: int = 1 << 14, ngram_range: tuple = (2, 4)):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._phrases = self._compile_lexicon()
+
+        texts = [normalize(text) for texts in examples.values() for text in texts]
+        labels = [label for label, texts in examples.items() for _ in texts]
+        counts = np.stack([self._counts(text) for text in texts])
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1.0
+
+        vectors = self._weigh(counts)
+        self.labels = sorted(set(labels))
+        centroids = np.stack([
+            vectors[[i for i, label in enumerate(labels) if label == name]].mean(axis=0) for name in self.labels
+        ])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._lock = threading.Lock()
+        self._counters = {"lexicon": 0, "centroid": 0, "low_confidence": 0, "non_query_deferred": 0}
+
+    # --- Features ---
+    def _compile_lexicon(self):
+        phrases = sorted(((normalize(phrase), label) for label, items in LEXICON.items() for phrase in items),
+                         key=lambda item: -len(item[0]))
+        return [(re.compile(rf"(?<!\w){re.escape(phrase)}(?!\w)"), label) for phrase, label in phrases]
+
+    def _counts(self, text: str) -> np.ndarray:
+        counts = np.zeros(self.dim, dtype=np.float32)
+        for word in text.split():
+            padded = f" {word} "
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                for i in range(max(1, len(padded) - n + 1)):
+                    counts[zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dim] += 1.0
+        return counts
+
+    def _weigh(self, counts: np.ndarray) -> np.ndarray:
+        vectors = np.log1p(counts) * self.idf
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    # --- Classification ---
+    def match_lexicon(self, text: str):
+        """Returns the label when the whole message is lexicon phrases plus filler words, else None."""
+        if DIGITS_ONLY.match(text):
+            return "ack"
+        found, rest = set(), text
+        for pattern, label in self._phrases:
+            if pattern.search(rest):
+                found.add(label)
+                rest = pattern.sub(" ", rest)
+        if not found or any(word not in FILLER_WORDS for word in rest.split()):
+            return None
+        # "hello, help me" is a help request; greeting + thanks is still a greeting.
+        for label in ("help", "greeting", "ack"):
+            if label in found:
+                return label
+
+    def classify(self, message: str):
+        """Returns an IntentPrediction, or None when the message should go to the LLM."""
+        text = normalize(message)
+        if not text:
+            return None
+
+        label = self.match_lexicon(text)
+        if label is not None:
+            self._count("lexicon")
+            return IntentPrediction(label=label, confidence=1.0, source="lexicon")
+
+        similarities = self.centroids @ self._weigh(self._counts(text))
+        best, second = np.argsort(similarities)[::-1][:2]
+        confidence = float(similarities[best])
+        if confidence < self.min_similarity or confidence - float(similarities[second]) < self.min_margin:
+            self._count("low_confidence")
+            return None
+        if self.labels[best] in NON_QUERY_LABELS:
+            self._count("non_query_deferred")
+            return None
+        self._count("centroid")
+        return IntentPrediction(label=self.labels[best], confidence=round(confidence, 4), source="centroid")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        total = sum(stats.values())
+        stats["local_ratio"] = round((stats["lexicon"] + stats["centroid"]) / total, 4) if total else 0.0
+        return stats
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Process-wide classifier built from intent_examples.json on first use."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                with open(EXAMPLES_PATH, encoding="utf-8") as f:
+                    _classifier = IntentClassifier(json.load(f))
+    return _classifier
@@ -0,0 +1,154 @@
+# File: lexical_index.py
+"""
+BM25 inverted index built alongside each vector index, and a retriever that
+fuses lexical and vector hits with reciprocal-rank fusion (RRF).
+
+Pesticide questions hinge on exact tokens ("Confidor", "Amistar",
+"Colonel-S") that dense nomic-embed-text retrieval often ranks too low. The
+lexical side catches them, so the first RAG pass finds the right chunk more
+often and the SEARCH_NEEDED fallback runs less.
+
+The index is stored as `lexical.npz` (CSR postings, no pickle) inside the
+index directory; rows are the same rows as the vector index.
+"""
+import os
+import re
+import unicodedata
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from .index_store import documents_for_rows, iter_texts, search_rows
+
+LEXICAL_FILE = "lexical.npz"
+
+# Words joined by hyphens stay together ("colonel-s") and are also split into parts.
+TOKEN_PATTERN = re.compile(r"\w+(?:-\w+)*")
+
+
+def tokenize(text: str) -> list:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text):
+        tokens.append(match)
+        if "-" in match:
+            tokens.extend(part for part in match.split("-") if part)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over CSR postings: term -> (rows, term frequencies)."""
+    def __init__(self, terms, indptr, rows, tfs, doc_lengths, k1: float = 1.5, b: float = 0.75):
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+        count = len(doc_lengths)
+        self.avg_length = float(doc_lengths.mean()) if count else 0.0
+        doc_freq = np.diff(indptr).astype(np.float32)
+        self.idf = np.log(1.0 + (count - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts) -> "BM25Index":
+        postings = {}
+        doc_lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((row, tf))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(postings[term])
+        rows = np.fromiter((row for term in terms for row, _ in postings[term]), dtype=np.int32, count=indptr[-1])
+        tfs = np.fromiter((tf for term in terms for _, tf in postings[term]), dtype=np.float32, count=indptr[-1])
+        return cls(terms, indptr, rows, tfs, np.asarray(doc_lengths, dtype=np.float32))
+
+    def save(self, path: str):
+        terms = sorted(self.term_ids, key=self.term_ids.get)
+        np.savez(path, terms=np.asarray(terms, dtype=str), indptr=self.indptr, rows=self.rows,
+                 tfs=self.tfs, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["terms"].tolist(), data["indptr"], data["rows"], data["tfs"], data["doc_lengths"])
+
+    def search(self, query: str, k: int = 10):
+        """Returns (rows, scores) of the k best BM25 matches; rows with no matching term are skipped."""
+        term_ids = {self.term_ids[token] for token in tokenize(query) if token in self.term_ids}
+        if not term_ids or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            rows, tfs = self.rows[start:end], self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / (self.avg_length or 1.0))
+            scores[rows] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+
+def load_lexical_index(index_path: str, vectorstore) -> BM25Index:
+    """Loads the prebuilt lexical index, or builds it in memory for directories without one."""
+    lexical_path = os.path.join(index_path, LEXICAL_FILE)
+    if os.path.exists(lexical_path):
+        return BM25Index.load(lexical_path)
+    print(f"⚠️ No {LEXICAL_FILE} in '{index_path}', building the lexical index in memory.")
+    return BM25Index.build(iter_texts(vectorstore))
+
+
+def reciprocal_rank_fusion(ranked_lists, rrf_k: int = 60):
+    """Fuses ranked row lists; returns rows ordered by sum(1 / (rrf_k + rank))."""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves `candidates` rows from the vector index and from BM25, fuses the
+    two rankings with RRF and returns the top `k` documents.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: object
+    lexical_index: BM25Index
+    k: int = 4
+    candidates: int = 10
+    rrf_k: int = 60
+
+    def search(self, query: str):
+        """Returns (fused rows, squared L2 distance of the best vector hit or None)."""
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        vector_rows, distances = search_rows(self.vectorstore, embedding, self.candidates)
+        lexical_rows, _ = self.lexical_index.search(query, self.candidates)
+        rows = reciprocal_rank_fusion([vector_rows.tolist(), lexical_rows.tolist()], self.rrf_k)[:self.k]
+        return rows, float(distances[0]) if len(distances) else None
+
+    def fused_rows(self, query: str) -> list:
+        return self.search(query)[0]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        return documents_for_rows(self.vectorstore, self.fused_rows(query))
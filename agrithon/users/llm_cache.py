@@ -0,0 +1,156 @@
+# File: llm_cache.py
+"""
+Exact-prompt cache for deterministic structured-output LLM calls.
+
+The WhatsApp message classifier (classify_message) is a pure function of the
+message text at temperature 0, and many inbound messages are byte-identical
+("1", "hi", "help", a pincode). Its parsed result is cached under a hash of
+model, temperature, output schema and prompt:
+
+    - hits are deserialized straight into the schema (pydantic), so callers
+      get the same object type as from the LLM;
+    - two tiers: a bounded in-process LRU and Redis, shared by all workers;
+    - the cache sits in front of the pooled client, so hits never take an
+      LLM slot or count towards its circuit breaker.
+
+LLMPool.structured() wraps a profile in CachedStructuredOutput only when the
+profile is a temperature-0 classification profile; anything sampled at a
+higher temperature is never cached.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def schema_fingerprint(schema) -> str:
+    """Short hash of a pydantic schema, so results cached for an older shape are not reused."""
+    return hashlib.sha1(json.dumps(schema.model_json_schema(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def prompt_text(prompt) -> str:
+    """A stable string for a str, PromptValue or list of messages."""
+    if isinstance(prompt, str):
+        return prompt
+    if hasattr(prompt, "to_messages"):
+        prompt = prompt.to_messages()
+    return json.dumps([[message.type, message.content] for message in prompt], ensure_ascii=False)
+
+
+class LLMResponseCache:
+    def __init__(self, redis_client=None, ttl_seconds: int = 7 * 24 * 60 * 60, local_max_entries: int = 4096,
+                 key_prefix: str = "llm_response:"):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.local_max_entries = local_max_entries
+        self.key_prefix = key_prefix
+        self._local = OrderedDict()  # key -> (serialized result, expires_at)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "stores": 0, "shared_errors": 0}
+
+    def key(self, model: str, temperature: float, schema_hash: str, prompt) -> str:
+        prompt_hash = hashlib.sha256(prompt_text(prompt).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}{model}:{float(temperature)}:{schema_hash}:{prompt_hash}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str, schema):
+        """Returns the cached result as a `schema` instance, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(key)
+                self._counters["hits"] += 1
+            elif entry is not None:
+                del self._local[key]
+                entry = None
+        if entry is not None:
+            return schema.model_validate_json(entry[0])
+
+        value = self._get_shared(key)
+        if value is None:
+            self._count("misses")
+            return None
+        try:
+            result = schema.model_validate_json(value)
+        except ValueError:
+            # Unreadable entry (e.g. written by another schema version); treat it as a miss.
+            self._count("misses")
+            return None
+        self._count("shared_hits")
+        self._set_local(key, value)
+        return result
+
+    def set(self, key: str, result):
+        value = result.model_dump_json()
+        self._count("stores")
+        self._set_local(key, value)
+        self._set_shared(key, value)
+
+    def _set_local(self, key: str, value: str):
+        with self._lock:
+            self._local[key] = (value, time.time() + self.ttl_seconds)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    # --- Shared tier ---
+    def _get_shared(self, key: str):
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.get(key)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Shared LLM response cache unavailable: {e}")
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def _set_shared(self, key: str, value: str):
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(key, value, ex=self.ttl_seconds)
+        except Exception as e:
+            self._count("shared_errors")
+            print(f"⚠️ Could not write to shared LLM response cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, local_entries=len(self._local))
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class CachedStructuredOutput:
+    """`llm.with_structured_output(schema)` with an exact-prompt cache in front of `invoke`."""
+    def __init__(self, runnable, cache: LLMResponseCache, model: str, temperature: float, schema):
+        self.runnable = runnable
+        self.cache = cache
+        self.model = model
+        self.temperature = temperature
+        self.schema = schema
+        self.schema_hash = schema_fingerprint(schema)
+
+    def invoke(self, prompt, config=None, **kwargs):
+        key = self.cache.key(self.model, self.temperature, self.schema_hash, prompt)
+        result = self.cache.get(key, self.schema)
+        if result is None:
+            result = self.runnable.invoke(prompt, config, **kwargs)
+            if isinstance(result, self.schema):
+                self.cache.set(key, result)
+        return result
+
+    async def ainvoke(self, prompt, config=None, **kwargs):
+        key = self.cache.key(self.model, self.temperature, self.schema_hash, prompt)
+        result = self.cache.get(key, self.schema)
+        if result is None:
+            result = await self.runnable.ainvoke(prompt, config, **kwargs)
+            if isinstance(result, self.schema):
+                self.cache.set(key, result)
+        return result
@@ -0,0 +1,235 @@
+# File: llm_pool.py
+"""
+Central pool of Gemini clients, one per named profile (settings.LLM_PROFILES).
+
+Clients used to be created in many places, several of them on every request,
+and none had a timeout: when Gemini slowed down, every worker thread ended up
+waiting on it. Each profile here gets:
+
+    - one shared client (model, temperature, request timeout, retries), so HTTP
+      connections are reused;
+    - a semaphore capping its calls in flight; a call that can't get a slot within
+      `queue_timeout` seconds fails at once instead of queueing;
+    - a circuit breaker: after `failure_threshold` consecutive failures the profile
+      rejects calls for `reset_seconds`, then lets one trial call through.
+
+Limits are enforced by a callback on the client, so they also apply to the
+runnables derived from it (bind_tools, with_structured_output, agents).
+Rejected calls raise LLMUnavailableError; callers answer with DEGRADED_REPLY.
+
+`structured(profile, schema)` returns the profile's structured-output runnable;
+for temperature-0 profiles marked `classification` it is wrapped in the
+exact-prompt response cache (llm_cache.py).
+"""
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .llm_cache import CachedStructuredOutput, LLMResponseCache
+
+DEGRADED_REPLY = ("Our farming assistant is very busy right now. Please try again in a few minutes. 🌱")
+
+DEFAULT_PROFILE = {
+    "model": "gemini-2.0-flash-exp", "temperature": 0.2, "timeout": 30, "max_retries": 1,
+    "max_concurrency": 16, "queue_timeout": 2.0, "classification": False,
+}
+
+
+class LLMUnavailableError(RuntimeError):
+    """The profile's circuit is open or all its slots stayed busy."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `reset_seconds`."""
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            # While half-open, the trial call is already in flight.
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures = "closed", 0
+
+    def abandon_trial(self):
+        """The half-open trial call never ran; let the next call try instead."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state, self.opened_at = "open", time.monotonic() - self.reset_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = "open", time.monotonic()
+
+
+class ProfileGuard(BaseCallbackHandler):
+    """Callback that takes a slot when a call starts and returns it, with the outcome, when it ends."""
+    raise_error = True
+
+    def __init__(self, name: str, max_concurrency: int, queue_timeout: float, breaker: CircuitBreaker):
+        self.name = name
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._started = {}  # run_id -> start time
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "failures": 0, "rejected_open": 0, "rejected_busy": 0, "llm_seconds": 0.0}
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _acquire(self, run_id):
+        if not self.breaker.allow():
+            self._count("rejected_open")
+            raise LLMUnavailableError(f"LLM profile '{self.name}' is failing; circuit open.")
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("rejected_busy")
+            self.breaker.abandon_trial()
+            raise LLMUnavailableError(f"LLM profile '{self.name}' has no free slot.")
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+            self._counters["calls"] += 1
+
+    def _release(self, run_id, failed: bool):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        self._slots.release()
+        self._count("llm_seconds", time.perf_counter() - started)
+        if failed:
+            self._count("failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._acquire(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._acquire(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._release(run_id, failed=False)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._release(run_id, failed=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, in_flight=len(self._started))
+        stats["llm_seconds"] = round(stats["llm_seconds"], 3)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+class LLMPool:
+    def __init__(self, profiles: dict = None, breaker: dict = None, factory=None,
+                 response_cache: LLMResponseCache = None):
+        """`factory(**client_kwargs)` builds a client; defaults to ChatGoogleGenerativeAI."""
+        self.profiles = dict(profiles or {})
+        self.breaker = dict(breaker or {})
+        self._factory = factory
+        self.response_cache = response_cache
+        self._clients = {}
+        self._guards = {}
+        self._options = {}
+        self._structured = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: str):
+        """Returns the shared client for `profile`, creating it on first use."""
+        client = self._clients.get(profile)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(profile)
+                if client is None:
+                    client = self._build(profile)
+                    self._clients[profile] = client
+        return client
+
+    def structured(self, profile: str, schema):
+        """`get(profile).with_structured_output(schema)`, cached for temperature-0 classification profiles."""
+        runnable = self._structured.get((profile, schema))
+        if runnable is None:
+            client = self.get(profile)
+            runnable = client.with_structured_output(schema)
+            options = self._options[profile]
+            if self.response_cache is not None and options["classification"] and options["temperature"] == 0:
+                runnable = CachedStructuredOutput(
+                    runnable, self.response_cache, options["model"], options["temperature"], schema
+                )
+            with self._lock:
+                runnable = self._structured.setdefault((profile, schema), runnable)
+        return runnable
+
+    def _build(self, profile: str):
+        if profile not in self.profiles:
+            raise KeyError(f"Unknown LLM profile '{profile}'.")
+        options = {**DEFAULT_PROFILE, **self.profiles[profile]}
+        self._options[profile] = dict(options)
+        options.pop("classification")
+        guard = ProfileGuard(
+            profile, options.pop("max_concurrency"), options.pop("queue_timeout"),
+            CircuitBreaker(**self.breaker),
+        )
+        self._guards[profile] = guard
+        factory = self._factory
+        if factory is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            factory = ChatGoogleGenerativeAI
+        return factory(callbacks=[guard], **options)
+
+    def stats(self) -> dict:
+        stats = {name: guard.stats() for name, guard in list(self._guards.items())}
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.stats()
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMPool:
+    """Process-wide pool configured from settings.LLM_PROFILES and LLM_CIRCUIT_BREAKER."""
+    global _pool
+    if _pool is None:
+        from django.conf import settings
+        with _pool_lock:
+            if _pool is None:
+                response_cache = None
+                if getattr(settings, "LLM_RESPONSE_CACHE_ENABLED", False):
+                    from django_redis import get_redis_connection
+                    response_cache = LLMResponseCache(
+                        get_redis_connection("default"), ttl_seconds=settings.LLM_RESPONSE_CACHE_TTL
+                    )
+                _pool = LLMPool(
+                    getattr(settings, "LLM_PROFILES", {}), getattr(settings, "LLM_CIRCUIT_BREAKER", {}),
+                    response_cache=response_cache,
+                )
+    return _pool
+
+
+def get_llm(profile: str):
+    """Shortcut for get_llm_pool().get(profile)."""
+    return get_llm_pool().get(profile)
+
+
+def get_structured_llm(profile: str, schema):
+    """Shortcut for get_llm_pool().structured(profile, schema)."""
+    return get_llm_pool().structured(profile, schema)
@@ -0,0 +1,56 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.index_builder import BATCH_ENDPOINT, LEGACY_ENDPOINT, build_index
+from users.index_store import INDEX_TYPES
+
+
+class Command(BaseCommand):
+    help = ("Chunks and embeds PDF/CSV/text sources into a new version of a RAG index, "
+            "embedding only chunks the current version doesn't have yet.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("root", help="Index root; versions are written as <root>/vNNNN and <root>/current")
+        parser.add_argument("sources", nargs="+", help="Source files or directories (.pdf, .csv, .txt, .md)")
+        parser.add_argument("--base", help="Index directory to extend (default: <root>/current), "
+                                           "e.g. an existing LangChain FAISS directory")
+        parser.add_argument("--rebuild", action="store_true", help="Start from an empty index")
+        parser.add_argument("--model", default="nomic-embed-text")
+        parser.add_argument("--endpoint", choices=(LEGACY_ENDPOINT, BATCH_ENDPOINT),
+                            help="Ollama embedding endpoint (default: the one the base index was built with)")
+        parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--chunk-overlap", type=int, default=150)
+        parser.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding task")
+        parser.add_argument("--index-type", choices=INDEX_TYPES, default=None,
+                            help="Default: the base index's type, or flat")
+        parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="Index parameter, e.g. --param M=32 or --param nprobe=16")
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options["param"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Expected KEY=VALUE, got '{item}'.")
+            params[key.strip()] = json.loads(value)
+
+        try:
+            manifest = build_index(
+                options["root"], options["sources"], base=options["base"], rebuild=options["rebuild"],
+                model=options["model"], base_url=getattr(settings, "OLLAMA_BASE_URL", "http://localhost:11434"),
+                endpoint=options["endpoint"], workers=options["workers"], chunk_size=options["chunk_size"],
+                chunk_overlap=options["chunk_overlap"], batch_size=options["batch_size"],
+                index_type=options["index_type"], params=params or None, log=self.stdout.write,
+            )
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if manifest.get("version"):
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {manifest['version']}: {manifest['count']} chunks ({manifest.get('added', 0)} new, "
+                f"{manifest.get('duplicates_skipped', 0)} duplicates skipped) in {manifest.get('build_seconds')}s"
+            ))
+        self.stdout.write("Point RAG_INDEX_PATH_PESTICIDE / RAG_INDEX_PATH_PRICE at <root>/current to serve it.")
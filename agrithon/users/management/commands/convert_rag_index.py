@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.index_store import INDEX_TYPES, convert_faiss_index
+
+
+class Command(BaseCommand):
+    help = "Converts a LangChain FAISS index directory into the memory-mapped format shared by all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="LangChain FAISS directory (index.faiss + index.pkl)")
+        parser.add_argument("destination", help="Output directory for the memory-mapped index")
+        parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                            help="flat (exact), hnsw or ivfpq (approximate). hnsw and ivfpq are memory-mapped and "
+                                 "shared between workers; hnsw stores a second copy of the vectors on disk")
+        parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                            help="Index parameter, e.g. --param M=32 --param ef_search=64 or --param nprobe=16")
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options["param"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Expected KEY=VALUE, got '{item}'.")
+            params[key.strip()] = json.loads(value)
+
+        try:
+            meta = convert_faiss_index(options["source"], options["destination"], options["index_type"], params)
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {meta['count']} vectors ({meta['dim']} dims, {meta['index_type']}) to {options['destination']}"
+        ))
+        self.stdout.write("Point RAG_INDEX_PATH_PESTICIDE / RAG_INDEX_PATH_PRICE at it to serve it.")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.gazetteer import load_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Builds the offline gazetteer from the India Post pincode directory CSV (data.gov.in)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_files", nargs="+", help="Pincode directory CSV exports")
+        parser.add_argument("--aliases", action="append", default=[],
+                            help="CSV of name,pincode rows adding local or Indic-script names (repeatable)")
+        parser.add_argument("--db", default=None, help="Gazetteer path (default: settings.GAZETTEER_DB_PATH)")
+
+    def handle(self, *args, **options):
+        db_path = options["db"] or settings.GAZETTEER_DB_PATH
+        try:
+            count = load_gazetteer(db_path, options["csv_files"], options["aliases"])
+        except (FileNotFoundError, KeyError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Loaded {count} post offices into {db_path}"))
+        self.stdout.write("Restart the workers to pick up the new gazetteer.")
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.price_store import load_price_csvs
+
+
+class Command(BaseCommand):
+    help = "Loads Agmarknet / data.gov.in daily mandi price CSVs into the structured price store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_files", nargs="+", help="Mandi price CSV exports")
+        parser.add_argument("--db", default=None, help="Store path (default: settings.MANDI_PRICE_DB_PATH)")
+
+    def handle(self, *args, **options):
+        db_path = options["db"] or settings.MANDI_PRICE_DB_PATH
+        try:
+            count = load_price_csvs(db_path, options["csv_files"])
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Loaded {count} price rows into {db_path}"))
+        self.stdout.write("Running workers see new rows at once; restart them to recognise new commodity or market names.")
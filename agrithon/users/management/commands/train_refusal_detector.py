@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.refusal_detector import train_detector
+
+
+class Command(BaseCommand):
+    help = "Trains the refusal detector on refusal_examples.json and the newest logged guardrail outcomes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=None, help="Guardrail outcome log (default: settings.REFUSAL_LOG_PATH)")
+        parser.add_argument("--max-records", type=int, default=None,
+                            help="Newest log records to train on (default: settings.REFUSAL_LOG_MAX_RECORDS)")
+        parser.add_argument("--output", default=None, help="Model path (default: settings.REFUSAL_MODEL_PATH)")
+
+    def handle(self, *args, **options):
+        log_path = options["log"] or settings.REFUSAL_LOG_PATH or None
+        max_records = options["max_records"]
+        if max_records is None:
+            max_records = settings.REFUSAL_LOG_MAX_RECORDS
+        output = options["output"] or settings.REFUSAL_MODEL_PATH
+        try:
+            detector = train_detector(log_path, max_records)
+            detector.save(output)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Trained the refusal detector and saved it to {output}"))
+        self.stdout.write("Restart the workers to pick up the new model.")
@@ -1,4 +1,6 @@
 # File: enhanced_hybrid_rag.py
+# Run the CLI from the agrithon/ directory with: python -m users.price_bot
+import asyncio
 import os
 import sys
 from dotenv import load_dotenv
@@ -6,15 +8,19 @@ import requests
 import json
 
 # --- RAG Imports ---
-from langchain.memory import ChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema.output_parser import StrOutputParser
 
+from .answer_cache import is_follow_up
+from .history_store import InMemoryHistoryBackend
+from .index_store import documents_for_rows, load_vector_store as load_index_directory
+from .lexical_index import HybridRetriever, load_lexical_index
+from .relevance_gate import keyword_overlap
+
 # --- Configuration ---
 FAISS_INDEX_PATH = "faiss_index_agri_pesticide"
 
@@ -22,20 +28,48 @@ class RAGQueryEngineWithMemory:
     """
     Enhanced hybrid RAG that automatically redirects to Gemini when local data is insufficient.
     """
-    def __init__(self, index_path: str):
+    def __init__(self, index_path: str, embeddings=None, llm=None, web_search_llm=None,
+                 name: str = "rag", answer_cache=None, search_params: dict = None,
+                 hybrid_retrieval: bool = True, relevance_gate=None, history_backend=None,
+                 context_compressor=None, fallback_cache=None, speculator=None):
+        """
+        `embeddings`, `llm` and `web_search_llm` let several engines share one set of
+        clients (see rag_registry.py); each one is created here when not given.
+        `answer_cache` is an optional SemanticAnswerCache, scoped by `name`.
+        `search_params` tunes approximate indexes (ef_search, nprobe, rerank).
+        `hybrid_retrieval` fuses BM25 hits with vector hits (see lexical_index.py).
+        `relevance_gate` is an optional RelevanceGate that sends clearly off-corpus
+        questions straight to web search without the RAG call.
+        `history_backend` stores conversation history (see history_store.py); sessions
+        are scoped by `name`. Defaults to a bounded in-memory backend.
+        `context_compressor` is an optional ContextCompressor that deduplicates and trims
+        the retrieved chunks to a token budget before they go into the prompt.
+        `fallback_cache` is an optional FallbackAnswerCache for web-search answers,
+        scoped by `name`, region and month.
+        `speculator` is an optional FallbackSpeculator that starts the web search alongside
+        the RAG call for questions likely to need it (see speculation.py).
+        """
         print("--- Initializing Enhanced Hybrid RAG ---")
+        self.name = name
+        self.answer_cache = answer_cache
+        self.relevance_gate = relevance_gate
+        self.context_compressor = context_compressor
+        self.fallback_cache = fallback_cache
+        self.speculator = speculator
         self.load_api_key()
-        self.vectorstore = self.load_vector_store(index_path)
-        self.llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.5)
+        self.vectorstore = self.load_vector_store(index_path, embeddings, search_params)
+        self.lexical_index = load_lexical_index(index_path, self.vectorstore) if hybrid_retrieval else None
+        self.llm = llm or ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.5)
         
         # Store conversation history
-        self.chat_history_store = {} 
+        self.history_backend = history_backend or InMemoryHistoryBackend()
         
         self.rag_chain = self.create_rag_chain()
-        self.web_search_llm = ChatGoogleGenerativeAI(
+        self.web_search_llm = web_search_llm or ChatGoogleGenerativeAI(
             model="gemini-2.0-flash-exp", 
             temperature=0.3
         )
+        self.search_chain = self.create_search_chain()
         
         print("✅ Enhanced Hybrid RAG System ready.")
 
@@ -43,32 +77,42 @@ class RAGQueryEngineWithMemory:
         os.environ["GOOGLE_API_KEY"] = ""
         load_dotenv()
 
-    def load_vector_store(self, index_path: str):
+    def load_vector_store(self, index_path: str, embeddings=None, search_params: dict = None):
+        """
+        Loads the index directory, raising instead of exiting so a web worker survives a
+        missing index. Memory-mapped directories (see index_store.py) are shared between
+        worker processes and may hold a flat, HNSW or IVF-PQ index; plain LangChain FAISS
+        directories are unpickled per process.
+        """
         if not os.path.exists(index_path):
-            print(f"❌ Vector store not found at '{index_path}'.")
-            sys.exit(1)
+            raise FileNotFoundError(f"Vector store not found at '{index_path}'.")
         
-        try:
+        if embeddings is None:
             embeddings = OllamaEmbeddings(model="nomic-embed-text")
-            vectorstore = FAISS.load_local(
-                index_path, 
-                embeddings,
-                allow_dangerous_deserialization=True 
-            )
-            print("✅ Vector store loaded.")
-            return vectorstore
-        except Exception as e:
-            print(f"❌ Error loading vector store: {e}")
-            sys.exit(1)
+        vectorstore = load_index_directory(index_path, embeddings, search_params)
+        print(f"✅ Vector store loaded ({type(vectorstore).__name__}).")
+        return vectorstore
+
+    def get_session_history(self, session_id: str):
+        return self.history_backend.get_history(f"{self.name}:{session_id}")
 
-    def get_session_history(self, session_id: str) -> ChatMessageHistory:
-        if session_id not in self.chat_history_store:
-            self.chat_history_store[session_id] = ChatMessageHistory()
-        return self.chat_history_store[session_id]
+    def create_retriever(self, k: int = 4):
+        """Vector-only retriever, or BM25 + vector with reciprocal-rank fusion when a lexical index is loaded."""
+        if self.lexical_index is None:
+            return self.vectorstore.as_retriever(search_kwargs={"k": k})
+        return HybridRetriever(vectorstore=self.vectorstore, lexical_index=self.lexical_index, k=k)
+
+    def retrieve(self, query: str):
+        """Returns (docs, squared L2 distance of the best vector hit or None)."""
+        if isinstance(self.retriever, HybridRetriever):
+            rows, best_distance = self.retriever.search(query)
+            return documents_for_rows(self.vectorstore, rows), best_distance
+        hits = self.vectorstore.similarity_search_with_score(query, k=4)
+        return [doc for doc, _ in hits], float(hits[0][1]) if hits else None
 
     def create_rag_chain(self):
         """Creates RAG chain that detects when information is insufficient."""
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k": 4})
+        self.retriever = retriever = self.create_retriever(k=4)
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an agricultural assistant with access to a database containing information from 2022-2023. 
@@ -94,7 +138,10 @@ Retrieved context from database: {context}"""),
         
         base_chain = (
             RunnablePassthrough.assign(
-                context=lambda x: self.format_context(retriever.invoke(x["question"]))
+                # _answer_question passes the docs it already retrieved for the relevance gate.
+                context=lambda x: self.format_context(
+                    x["docs"] if "docs" in x else retriever.invoke(x["question"]), x["question"]
+                )
             )
             | prompt
             | self.llm
@@ -108,19 +155,23 @@ Retrieved context from database: {context}"""),
             history_messages_key="chat_history",
         )
 
-    def format_context(self, docs):
+    def format_context(self, docs, query: str = None):
         """Format retrieved documents for better context evaluation."""
         if not docs:
             return "No relevant documents found in the database."
         
+        texts = [doc.page_content for doc in docs]
+        if self.context_compressor is not None and query:
+            texts = self.context_compressor.compress(query, texts)
+        
         formatted_context = []
-        for i, doc in enumerate(docs):
-            formatted_context.append(f"Document {i+1}: {doc.page_content}")
+        for i, text in enumerate(texts):
+            formatted_context.append(f"Document {i+1}: {text}")
         
         return "\n\n".join(formatted_context)
 
-    def search_with_gemini(self, query: str) -> str:
-        """Use Gemini to search for current agricultural information."""
+    def create_search_chain(self):
+        """Creates the web-search fallback chain used when local data is insufficient."""
         search_prompt = ChatPromptTemplate.from_template("""
         The user is asking about agricultural information: "{query}"
         
@@ -141,39 +192,179 @@ Retrieved context from database: {context}"""),
         Be specific and actionable in your response.
         """)
         
-        chain = search_prompt | self.web_search_llm | StrOutputParser()
-        return chain.invoke({"query": query})
+        return search_prompt | self.web_search_llm | StrOutputParser()
+
+    def search_with_gemini(self, query: str, region: str = None) -> str:
+        """Use Gemini to search for current agricultural information."""
+        if self.fallback_cache is not None:
+            cached = self.fallback_cache.get(self.name, query, region)
+            if cached is not None:
+                print("⚡ Served web-search answer from fallback cache")
+                return cached
+        
+        response = self.search_chain.invoke({"query": query})
+        if self.fallback_cache is not None:
+            self.fallback_cache.set(self.name, query, region, response)
+        return response
+
+    async def search_with_gemini_async(self, query: str, region: str = None) -> str:
+        if self.fallback_cache is not None:
+            cached = await asyncio.to_thread(self.fallback_cache.get, self.name, query, region)
+            if cached is not None:
+                print("⚡ Served web-search answer from fallback cache")
+                return cached
+        
+        response = await self.search_chain.ainvoke({"query": query})
+        if self.fallback_cache is not None:
+            await asyncio.to_thread(self.fallback_cache.set, self.name, query, region, response)
+        return response
 
-    def ask_question(self, query: str, session_id: str = "default_session"):
-        """Main method that tries RAG first, then web search if needed."""
+    def ask_question(self, query: str, session_id: str = "default_session", region: str = None):
+        """
+        Main method: serves a cached answer to a similar question when there is one,
+        otherwise tries RAG first, then web search if needed. `region` ("state/district")
+        scopes the cache for engines whose answers depend on location.
+        """
         if not query:
             return "Please ask a question."
         
-        print("🔍 Checking local database...")
+        cached_answer, query_vector = self._lookup_cached_answer(query, session_id, region)
+        if cached_answer is not None:
+            return cached_answer
         
-        # Step 1: Try RAG
-        config = {"configurable": {"session_id": session_id}}
-        rag_response = self.rag_chain.invoke({"question": query}, config=config)
+        answer = self._answer_question(query, session_id, region)
+        self._store_answer(query_vector, answer, region)
+        return answer
+
+    async def ask_question_async(self, query: str, session_id: str = "default_session", region: str = None):
+        """
+        Async counterpart of ask_question: the Gemini calls go through `ainvoke`, and the
+        blocking steps (Ollama embedding, index search, Redis) run in worker threads, so
+        one event loop can hold many questions in flight.
+        """
+        if not query:
+            return "Please ask a question."
         
-        # Step 2: Check if search is needed
-        if "SEARCH_NEEDED:" in rag_response:
-            print("🌐 Local data insufficient, searching for current information...")
-            
-            # Search with Gemini
-            web_response = self.search_with_gemini(query)
-            
-            # Return web search response directly since local data was insufficient
-            final_response = f"""**Current Agricultural Information:**
+        cached_answer, query_vector = await asyncio.to_thread(self._lookup_cached_answer, query, session_id, region)
+        if cached_answer is not None:
+            return cached_answer
+        
+        answer = await self._answer_question_async(query, session_id, region)
+        await asyncio.to_thread(self._store_answer, query_vector, answer, region)
+        return answer
+
+    def _lookup_cached_answer(self, query: str, session_id: str, region: str):
+        """
+        Returns (cached answer or None, query vector to store the new answer under).
+        Follow-ups ("what about for wheat?") depend on the conversation so far, so
+        they neither read nor fill the cache when the session has history; other
+        questions use it whatever came before.
+        """
+        if self.answer_cache is None:
+            return None, None
+        if is_follow_up(query):
+            try:
+                if self.get_session_history(session_id).messages:
+                    return None, None
+            except Exception as e:
+                print(f"⚠️ Could not read session history, skipping answer cache: {e}")
+                return None, None
+        try:
+            cached_answer, query_vector = self.answer_cache.lookup(self.name, query, region)
+        except Exception as e:
+            print(f"⚠️ Answer cache lookup failed: {e}")
+            return None, None
+        if cached_answer is not None:
+            print("⚡ Served answer from semantic cache")
+            # Keep the conversation history consistent with what the user saw.
+            history = self.get_session_history(session_id)
+            history.add_user_message(query)
+            history.add_ai_message(cached_answer)
+        return cached_answer, query_vector
+
+    def _store_answer(self, query_vector, answer: str, region: str):
+        if self.answer_cache is not None and query_vector is not None:
+            self.answer_cache.store(self.name, query_vector, answer, region)
+
+    def _retrieve_for_rag(self, query: str):
+        """Returns the retrieved docs, or None when the relevance gate rules out the RAG call."""
+        print("🔍 Checking local database...")
+        docs, best_distance = self.retrieve(query)
+        if self.relevance_gate is not None and not self.relevance_gate.evaluate(query, docs, best_distance).relevant:
+            print("⚡ Retrieved context is irrelevant, skipping RAG")
+            return None
+        return docs
+
+    def _web_search_answer(self, query: str, web_response: str, session_id: str, record_history: bool) -> str:
+        # Return web search response directly since local data was insufficient
+        final_response = f"""**Current Agricultural Information:**
 {web_response}
 
 *Note: This information was obtained through web search as the specific data wasn't available in the local database.*"""
-            
-            print("✅ Retrieved current information from web search")
-            return final_response
         
-        else:
-            print("✅ Found complete information in local database")
-            return rag_response
+        if record_history:
+            # The chain did not run, so record the turn here.
+            history = self.get_session_history(session_id)
+            history.add_user_message(query)
+            history.add_ai_message(final_response)
+        
+        print("✅ Retrieved current information from web search")
+        return final_response
+
+    def _answer_question(self, query: str, session_id: str, region: str = None):
+        """Tries RAG first, then web search if needed."""
+        # Step 1: Retrieve, skipping the RAG call when retrieval clearly found nothing useful
+        docs = self._retrieve_for_rag(query)
+        rag_response, web_response = None, None
+        if docs is not None:
+            config = {"configurable": {"session_id": session_id}}
+            rag_call = lambda: self.rag_chain.invoke({"question": query, "docs": docs}, config=config)
+            if self.speculator is not None and self.speculator.predict(query, docs):
+                print("⚡ Likely fallback, running web search alongside RAG")
+                rag_response, web_response = self.speculator.run(
+                    query, rag_call, lambda: self.search_with_gemini(query, region)
+                )
+            else:
+                rag_response = rag_call()
+                if self.speculator is not None:
+                    self.speculator.record(query, "SEARCH_NEEDED:" in rag_response)
+        
+        # Step 2: Check if search is needed
+        if rag_response is None or "SEARCH_NEEDED:" in rag_response:
+            if web_response is None:
+                print("🌐 Local data insufficient, searching for current information...")
+                web_response = self.search_with_gemini(query, region)
+            return self._web_search_answer(query, web_response, session_id, record_history=rag_response is None)
+        
+        print("✅ Found complete information in local database")
+        return rag_response
+
+    async def _answer_question_async(self, query: str, session_id: str, region: str = None):
+        docs = await asyncio.to_thread(self._retrieve_for_rag, query)
+        rag_response, web_response = None, None
+        if docs is not None:
+            config = {"configurable": {"session_id": session_id}}
+            rag_call = lambda: self.rag_chain.ainvoke({"question": query, "docs": docs}, config=config)
+            if self.speculator is not None and self.speculator.predict(query, docs):
+                print("⚡ Likely fallback, running web search alongside RAG")
+                rag_response, web_response = await self.speculator.arun(
+                    query, rag_call, lambda: self.search_with_gemini_async(query, region)
+                )
+            else:
+                rag_response = await rag_call()
+                if self.speculator is not None:
+                    self.speculator.record(query, "SEARCH_NEEDED:" in rag_response)
+        
+        if rag_response is None or "SEARCH_NEEDED:" in rag_response:
+            if web_response is None:
+                print("🌐 Local data insufficient, searching for current information...")
+                web_response = await self.search_with_gemini_async(query, region)
+            return await asyncio.to_thread(
+                self._web_search_answer, query, web_response, session_id, rag_response is None
+            )
+        
+        print("✅ Found complete information in local database")
+        return rag_response
 
     def is_context_relevant(self, context: str, query: str) -> bool:
         """Additional method to check if context is truly relevant (optional enhancement)."""
@@ -181,17 +372,16 @@ Retrieved context from database: {context}"""),
         if not context or context.strip() == "No relevant documents found in the database.":
             return False
         
-        # Simple keyword matching as fallback
-        query_words = query.lower().split()
-        context_lower = context.lower()
-        
-        # Check if at least some query terms appear in context
-        matches = sum(1 for word in query_words if word in context_lower)
-        return matches > len(query_words) * 0.3  # At least 30% of query words should match
+        # At least 30% of the query's content words should appear in the context
+        return keyword_overlap(query, context) > 0.3
 
 
 def main():
-    engine = RAGQueryEngineWithMemory(index_path=FAISS_INDEX_PATH)
+    try:
+        engine = RAGQueryEngineWithMemory(index_path=FAISS_INDEX_PATH)
+    except Exception as e:
+        print(f"❌ Error loading vector store: {e}")
+        sys.exit(1)
     
     session_id = "user123"
     print(f"\n--- Enhanced Hybrid RAG System ---")
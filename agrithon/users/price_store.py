@@ -0,0 +1,261 @@
+# File: price_store.py
+"""
+Structured mandi price store.
+
+Price questions ("wheat price in Himachal in March") used to go through the
+price RAG engine: free-text PDF chunks in FAISS and up to two Gemini calls.
+Here the arrival-level prices are kept in a read-only SQLite table keyed by
+commodity, state, district, market and date. Covering indexes hold every
+price column, so min/max/modal prices and month-over-month trends come
+straight from an index scan in a few milliseconds.
+
+The table is loaded from the Agmarknet / data.gov.in daily mandi price CSVs
+(State, District, Market, Commodity, Variety, Arrival_Date, Min_x0020_Price,
+Max_x0020_Price, Modal_x0020_Price) with
+`python manage.py load_mandi_prices <csv...>`. Prices are Rs/quintal.
+"""
+import calendar
+import csv
+import difflib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    commodity TEXT NOT NULL COLLATE NOCASE,
+    state TEXT NOT NULL COLLATE NOCASE,
+    district TEXT NOT NULL COLLATE NOCASE,
+    market TEXT NOT NULL COLLATE NOCASE,
+    variety TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    date TEXT NOT NULL,
+    min_price REAL,
+    max_price REAL,
+    modal_price REAL,
+    UNIQUE (commodity, state, district, market, variety, date)
+);
+CREATE INDEX IF NOT EXISTS prices_by_region
+    ON prices (commodity, state, district, date, min_price, max_price, modal_price, market);
+CREATE INDEX IF NOT EXISTS prices_by_market
+    ON prices (commodity, market, date, min_price, max_price, modal_price);
+"""
+
+# CSV header (normalised) -> column. Covers the data.gov.in and Agmarknet export headers.
+CSV_COLUMNS = {
+    "state": "state", "district": "district", "district name": "district", "market": "market",
+    "market name": "market", "commodity": "commodity", "variety": "variety", "arrival_date": "date",
+    "arrival date": "date", "price date": "date", "date": "date",
+    "min_x0020_price": "min_price", "min price": "min_price", "min_price": "min_price",
+    "min price (rs./quintal)": "min_price", "max_x0020_price": "max_price", "max price": "max_price",
+    "max_price": "max_price", "max price (rs./quintal)": "max_price", "modal_x0020_price": "modal_price",
+    "modal price": "modal_price", "modal_price": "modal_price", "modal price (rs./quintal)": "modal_price",
+}
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d %b %Y", "%d-%b-%Y")
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+
+def _parse_date(value: str):
+    value = (value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_price(value):
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def read_price_csv(path: str):
+    """Yields row tuples in table column order; rows without a commodity, market or date are skipped."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        mapping = {header: CSV_COLUMNS.get(header.strip().lower()) for header in reader.fieldnames or []}
+        for raw in reader:
+            row = {column: (raw[header] or "").strip() for header, column in mapping.items() if column}
+            date = _parse_date(row.get("date"))
+            if not (row.get("commodity") and row.get("market") and date):
+                continue
+            yield (
+                row["commodity"], row.get("state", ""), row.get("district", ""), row["market"],
+                row.get("variety", ""), date, _parse_price(row.get("min_price")),
+                _parse_price(row.get("max_price")), _parse_price(row.get("modal_price")),
+            )
+
+
+def load_price_csvs(db_path: str, paths: list) -> int:
+    """Upserts the rows of the given CSVs into the store at `db_path`; returns the rows read."""
+    db = sqlite3.connect(db_path)
+    try:
+        db.executescript(SCHEMA)
+        total = 0
+        for path in paths:
+            rows = list(read_price_csv(path))
+            db.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            total += len(rows)
+        db.commit()
+        db.execute("ANALYZE")
+        return total
+    finally:
+        db.close()
+
+
+class MandiPriceStore:
+    """Read-only queries over the price table; one connection shared by the threads of a worker."""
+    def __init__(self, db_path: str):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Mandi price store not found at '{db_path}'.")
+        self._db = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._names = {}
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _distinct(self, column: str) -> list:
+        if column not in self._names:
+            self._names[column] = [name for (name,) in self._query(f"SELECT DISTINCT {column} FROM prices") if name]
+        return self._names[column]
+
+    def match(self, column: str, name: str):
+        """Resolves a free-text name ("paddy", "himachal") to the stored value, or None."""
+        name = (name or "").strip().lower()
+        if not name:
+            return None
+        names = self._distinct(column)
+        lowered = {value.lower(): value for value in names}
+        if name in lowered:
+            return lowered[name]
+        starts = [value for value in names if value.lower().startswith(name)]
+        if starts:
+            return min(starts, key=len)
+        contains = [value for value in names if name in value.lower()]
+        if contains:
+            return min(contains, key=len)
+        close = difflib.get_close_matches(name, list(lowered), n=1, cutoff=0.8)
+        return lowered[close[0]] if close else None
+
+    def resolve_month(self, month: str, commodity: str):
+        """Accepts "2023-03", "March 2023" or "March" (latest year with data); None = latest month."""
+        month = (month or "").strip().lower()
+        if not month:
+            return None
+        try:
+            return datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+        except ValueError:
+            pass
+        parts = month.replace(",", " ").split()
+        number = next((MONTHS[part] for part in parts if part in MONTHS), None)
+        year = next((part for part in parts if part.isdigit() and len(part) == 4), None)
+        if number is None:
+            return None
+        if year:
+            return f"{year}-{number:02d}"
+        found = self._query(
+            "SELECT MAX(substr(date, 1, 7)) FROM prices WHERE commodity = ? AND substr(date, 6, 2) = ?",
+            (commodity, f"{number:02d}"),
+        )
+        return found[0][0] if found and found[0][0] else None
+
+    def monthly_prices(self, commodity: str, state: str = None, district: str = None, market: str = None,
+                       until_month: str = None, months: int = 4) -> list:
+        """Returns up to `months` monthly rows (oldest first) ending at `until_month` (or the latest)."""
+        where, params = ["commodity = ?"], [commodity]
+        for column, value in (("state", state), ("district", district), ("market", market)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if until_month:
+            where.append("date < ?")
+            params.append(f"{until_month}-32")
+        rows = self._query(
+            f"""SELECT substr(date, 1, 7) AS month, MIN(min_price), MAX(max_price), AVG(modal_price),
+                       COUNT(DISTINCT market), COUNT(*)
+                FROM prices WHERE {' AND '.join(where)}
+                GROUP BY month ORDER BY month DESC LIMIT ?""",
+            (*params, months),
+        )
+        return [
+            {"month": month, "min_price": low, "max_price": high, "modal_price": round(modal, 2) if modal else None,
+             "markets": markets, "reports": reports}
+            for month, low, high, modal, markets, reports in reversed(rows)
+        ]
+
+    def price_summary(self, commodity: str, state: str = "", district: str = "", market: str = "",
+                      month: str = "", months: int = 4):
+        """
+        Resolves the names, then returns min/max/modal prices for the requested (or latest)
+        month with the preceding months and month-over-month change. None when nothing matches.
+        """
+        commodity = self.match("commodity", commodity)
+        if not commodity:
+            return None
+        filters = {
+            "state": self.match("state", state), "district": self.match("district", district),
+            "market": self.match("market", market),
+        }
+        until_month = self.resolve_month(month, commodity)
+        series = self.monthly_prices(commodity, until_month=until_month, months=months, **filters)
+        # Widen to the state, then all of India, when the user's district has no reports.
+        while not series and (filters["market"] or filters["district"] or filters["state"]):
+            for column in ("market", "district", "state"):
+                if filters[column]:
+                    filters[column] = None
+                    break
+            series = self.monthly_prices(commodity, until_month=until_month, months=months, **filters)
+        if not series:
+            return None
+
+        for previous, current in zip(series, series[1:]):
+            if previous["modal_price"] and current["modal_price"]:
+                current["change_pct"] = round(100.0 * (current["modal_price"] / previous["modal_price"] - 1), 1)
+        return {"commodity": commodity, **filters, "months": series}
+
+
+def _rupees(value) -> str:
+    return "N/A" if value is None else f"{value:.0f}"
+
+
+def format_price_summary(summary: dict) -> str:
+    """Months without a modal price (reports with empty or zero modal) show N/A, or are left out of the trend."""
+    place = ", ".join(value for value in (summary["market"], summary["district"], summary["state"]) if value) or "India"
+    latest = summary["months"][-1]
+    lines = [
+        f"{summary['commodity']} mandi prices in {place} for {latest['month']} (Rs/quintal, "
+        f"{latest['reports']} reports from {latest['markets']} markets):",
+        f"Min {_rupees(latest['min_price'])}, Max {_rupees(latest['max_price'])}, "
+        f"average modal {_rupees(latest['modal_price'])}",
+    ]
+    trend = [month for month in summary["months"] if month["modal_price"] is not None]
+    if len(trend) > 1:
+        lines.append("Monthly average modal price:")
+        for month in trend:
+            change = f" ({month['change_pct']:+.1f}% vs previous month)" if "change_pct" in month else ""
+            lines.append(f"- {month['month']}: {month['modal_price']:.0f}{change}")
+    return "\n".join(lines)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_price_store():
+    """Opens the store at settings.MANDI_PRICE_DB_PATH once per process; None when it hasn't been loaded."""
+    global _store
+    if _store is None:
+        from django.conf import settings
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = MandiPriceStore(settings.MANDI_PRICE_DB_PATH)
+                except FileNotFoundError:
+                    return None
+    return _store
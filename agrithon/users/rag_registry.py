@@ -0,0 +1,278 @@
+# File: rag_registry.py
+"""
+Process-wide registry for the RAG engines used by the chat views.
+
+Nothing is loaded at import time: each FAISS index is read the first time its
+engine is asked for (or during an optional warm-up), and the Ollama embedding
+client is created once and shared by every engine in the process; Gemini
+clients come from the shared LLM pool (llm_pool.py). Endpoints that never
+touch RAG (OTP, crops, chat history) therefore don't pay for index loading
+when a worker boots.
+"""
+import asyncio
+import os
+import threading
+import time
+
+from langchain_community.embeddings import OllamaEmbeddings
+
+from .answer_cache import SemanticAnswerCache
+from .context_compressor import ContextCompressor
+from .embedding_batcher import BatchingEmbeddings, OllamaBatchEmbeddings
+from .embedding_cache import CachedEmbeddings
+from .fallback_cache import FallbackAnswerCache
+from .history_store import InMemoryHistoryBackend, RedisHistoryBackend
+from .llm_pool import get_llm_pool
+from .price_bot import RAGQueryEngineWithMemory
+from .relevance_gate import RelevanceGate
+from .speculation import FallbackSpeculator
+
+# --- Configuration ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENGINE_INDEX_PATHS = {
+    "pesticide": os.getenv("RAG_INDEX_PATH_PESTICIDE", os.path.join(BASE_DIR, "faiss_index_agri_pesticide")),
+    "price": os.getenv("RAG_INDEX_PATH_PRICE", os.path.join(BASE_DIR, "faiss_index_agri")),
+}
+
+EMBEDDING_MODEL = "nomic-embed-text"
+# LLM profiles (settings.LLM_PROFILES)
+RAG_LLM = "rag"
+WEB_SEARCH_LLM = "web_search"
+
+
+class RAGEngineRegistry:
+    """
+    Lazily builds one RAGQueryEngineWithMemory per configured index and hands
+    out the same instance to every caller in the process.
+    """
+    def __init__(self, index_paths: dict):
+        self.index_paths = dict(index_paths)
+        self._engines = {}
+        self._status = {
+            name: {"warm": False, "index_path": path, "load_seconds": None, "error": None}
+            for name, path in self.index_paths.items()
+        }
+        self._engine_locks = {name: threading.Lock() for name in self.index_paths}
+        self._clients_lock = threading.Lock()
+        self._embeddings = None
+        self._embedding_batcher = None
+        self._answer_cache = None
+        self._history_backend = None
+        self._fallback_cache = None
+
+    # --- Shared clients ---
+    def get_embeddings(self):
+        """
+        Returns the single embedding client shared by all engines, wrapped in the
+        persistent content-hashed cache (RAG_EMBEDDING_CACHE_*). Cache misses go
+        through the micro-batching dispatcher when RAG_EMBEDDING_BATCH_WINDOW_MS > 0.
+        """
+        if self._embeddings is None:
+            with self._clients_lock:
+                if self._embeddings is None:
+                    from django.conf import settings
+                    client = OllamaEmbeddings(model=EMBEDDING_MODEL)
+                    # The endpoints return differently scaled vectors; keep their cache entries apart.
+                    namespace = "ollama/api/embeddings"
+                    if getattr(settings, "RAG_EMBEDDING_BATCH_WINDOW_MS", 0) > 0:
+                        self._embedding_batcher = BatchingEmbeddings(
+                            OllamaBatchEmbeddings(EMBEDDING_MODEL, base_url=settings.OLLAMA_BASE_URL),
+                            max_wait_ms=settings.RAG_EMBEDDING_BATCH_WINDOW_MS,
+                            max_batch_size=settings.RAG_EMBEDDING_BATCH_SIZE,
+                        )
+                        client = self._embedding_batcher
+                        namespace = "ollama/api/embed"
+                    self._embeddings = CachedEmbeddings(
+                        client,
+                        model_name=EMBEDDING_MODEL,
+                        db_path=getattr(settings, "RAG_EMBEDDING_CACHE_PATH", None),
+                        max_memory_entries=getattr(settings, "RAG_EMBEDDING_CACHE_MAX_ENTRIES", 10000),
+                        namespace=namespace,
+                    )
+        return self._embeddings
+
+    def get_llm(self, profile: str):
+        """Returns the shared Gemini client for an LLM profile (see llm_pool.py)."""
+        return get_llm_pool().get(profile)
+
+    def get_answer_cache(self):
+        """
+        Returns the semantic answer cache shared by all engines, or None when it is
+        disabled with RAG_ANSWER_CACHE_ENABLED.
+        """
+        from django.conf import settings
+        if not getattr(settings, "RAG_ANSWER_CACHE_ENABLED", False):
+            return None
+        if self._answer_cache is None:
+            with self._clients_lock:
+                if self._answer_cache is None:
+                    from django.core.cache import cache
+                    self._answer_cache = SemanticAnswerCache(
+                        self.get_embeddings(),
+                        similarity_threshold=settings.RAG_ANSWER_CACHE_SIMILARITY,
+                        ttl_seconds=settings.RAG_ANSWER_CACHE_TTL,
+                        max_entries=settings.RAG_ANSWER_CACHE_MAX_ENTRIES,
+                        shared_cache=cache,
+                        regional_namespaces=settings.RAG_ANSWER_CACHE_REGIONAL,
+                    )
+        return self._answer_cache
+
+    def get_history_backend(self):
+        """Returns the conversation-history backend shared by all engines (RAG_HISTORY_*)."""
+        if self._history_backend is None:
+            with self._clients_lock:
+                if self._history_backend is None:
+                    from django.conf import settings
+                    max_turns = getattr(settings, "RAG_HISTORY_MAX_TURNS", 10)
+                    ttl_seconds = getattr(settings, "RAG_HISTORY_TTL", 24 * 60 * 60)
+                    if getattr(settings, "RAG_HISTORY_BACKEND", "redis") == "redis":
+                        from django_redis import get_redis_connection
+                        self._history_backend = RedisHistoryBackend(
+                            get_redis_connection("default"), ttl_seconds=ttl_seconds, max_turns=max_turns
+                        )
+                    else:
+                        self._history_backend = InMemoryHistoryBackend(
+                            max_sessions=getattr(settings, "RAG_HISTORY_MAX_SESSIONS", 10000),
+                            ttl_seconds=ttl_seconds, max_turns=max_turns,
+                        )
+        return self._history_backend
+
+    def get_fallback_cache(self):
+        """Returns the web-search answer cache shared by all engines, or None when disabled."""
+        from django.conf import settings
+        if not getattr(settings, "RAG_FALLBACK_CACHE_ENABLED", False):
+            return None
+        if self._fallback_cache is None:
+            with self._clients_lock:
+                if self._fallback_cache is None:
+                    from django_redis import get_redis_connection
+                    self._fallback_cache = FallbackAnswerCache(
+                        get_redis_connection("default"),
+                        ttl_seconds=settings.RAG_FALLBACK_CACHE_TTL,
+                        max_entries=settings.RAG_FALLBACK_CACHE_MAX_ENTRIES,
+                    )
+        return self._fallback_cache
+
+    # --- Engines ---
+    def get(self, name: str) -> RAGQueryEngineWithMemory:
+        """Returns the engine for `name`, loading its index on first use."""
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        if name not in self.index_paths:
+            raise KeyError(f"Unknown RAG engine '{name}'.")
+
+        with self._engine_locks[name]:
+            # Another thread may have finished loading while we waited.
+            engine = self._engines.get(name)
+            if engine is None:
+                engine = self._build(name)
+                self._engines[name] = engine
+        return engine
+
+    async def aget(self, name: str) -> RAGQueryEngineWithMemory:
+        """Async get(); a cold engine is loaded in a worker thread so the event loop isn't blocked."""
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        return await asyncio.to_thread(self.get, name)
+
+    def _build(self, name: str) -> RAGQueryEngineWithMemory:
+        from django.conf import settings
+        status = self._status[name]
+        started = time.perf_counter()
+        try:
+            engine = RAGQueryEngineWithMemory(
+                index_path=self.index_paths[name],
+                embeddings=self.get_embeddings(),
+                llm=self.get_llm(RAG_LLM),
+                web_search_llm=self.get_llm(WEB_SEARCH_LLM),
+                name=name,
+                answer_cache=self.get_answer_cache(),
+                search_params=getattr(settings, "RAG_INDEX_SEARCH_PARAMS", {}).get(name),
+                hybrid_retrieval=getattr(settings, "RAG_HYBRID_RETRIEVAL", True),
+                relevance_gate=self._build_relevance_gate(name, settings),
+                history_backend=self.get_history_backend(),
+                context_compressor=self._build_context_compressor(name, settings),
+                fallback_cache=self.get_fallback_cache(),
+                speculator=self._build_speculator(name, settings),
+            )
+        except Exception as e:
+            status["error"] = str(e)
+            print(f"❌ Could not load RAG engine '{name}': {e}")
+            raise RuntimeError(f"RAG engine '{name}' is unavailable: {e}") from e
+
+        status.update(warm=True, error=None, load_seconds=round(time.perf_counter() - started, 3))
+        print(f"✅ RAG engine '{name}' loaded in {status['load_seconds']}s")
+        return engine
+
+    def _build_relevance_gate(self, name: str, settings):
+        if not getattr(settings, "RAG_RELEVANCE_GATE_ENABLED", True):
+            return None
+        return RelevanceGate(name, **getattr(settings, "RAG_RELEVANCE_GATE", {}).get(name, {}))
+
+    def _build_context_compressor(self, name: str, settings):
+        if not getattr(settings, "RAG_CONTEXT_COMPRESSION", True):
+            return None
+        budget = getattr(settings, "RAG_CONTEXT_TOKEN_BUDGET", {}).get(name)
+        return ContextCompressor(name, token_budget=budget) if budget else ContextCompressor(name)
+
+    def _build_speculator(self, name: str, settings):
+        if not getattr(settings, "RAG_SPECULATIVE_FALLBACK", False):
+            return None
+        return FallbackSpeculator(name, **getattr(settings, "RAG_SPECULATION", {}).get(name, {}))
+
+    def is_warm(self, name: str) -> bool:
+        return name in self._engines
+
+    def warm_up(self, names=None, background: bool = False):
+        """
+        Loads the given engines (all of them by default) ahead of the first question.
+        With `background=True` loading happens in a daemon thread so startup isn't blocked.
+        """
+        names = list(names or self.index_paths)
+
+        def _load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # The failure is recorded in status(); the next get() retries.
+                    pass
+
+        if background:
+            thread = threading.Thread(target=_load_all, name="rag-warmup", daemon=True)
+            thread.start()
+            return thread
+        _load_all()
+        return None
+
+    def status(self) -> dict:
+        """Reports, per engine, whether it is warm, how long it took to load and the last error."""
+        return {name: dict(info) for name, info in self._status.items()}
+
+    def cache_stats(self) -> dict:
+        """Counters of the shared caches and history backend created so far, plus per-engine gate, compression and speculation counters."""
+        stats = {}
+        if self._embeddings is not None:
+            stats["embedding_cache"] = self._embeddings.stats()
+        if self._embedding_batcher is not None:
+            stats["embedding_batcher"] = self._embedding_batcher.stats()
+        if self._answer_cache is not None:
+            stats["answer_cache"] = self._answer_cache.stats()
+        if self._fallback_cache is not None:
+            stats["fallback_cache"] = self._fallback_cache.stats()
+        if self._history_backend is not None:
+            stats["history"] = self._history_backend.stats()
+        for name, engine in list(self._engines.items()):
+            if engine.relevance_gate is not None:
+                stats.setdefault("relevance_gate", {})[name] = engine.relevance_gate.stats()
+            if engine.context_compressor is not None:
+                stats.setdefault("context_compression", {})[name] = engine.context_compressor.stats()
+            if engine.speculator is not None:
+                stats.setdefault("speculation", {})[name] = engine.speculator.stats()
+        return stats
+
+
+rag_registry = RAGEngineRegistry(ENGINE_INDEX_PATHS)
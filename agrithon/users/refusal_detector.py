@@ -0,0 +1,310 @@
+# File: refusal_detector.py
+"""
+Local check that decides whether an agent answer needs the confidence guardrail.
+
+`get_confident_answer_string` (WhatsApp) and `AppChatManager._get_confident_answer_string`
+send every answer through a second Gemini call that rewrites "low-confidence
+refusals" and otherwise echoes the answer back. Most answers are plainly
+confident, so that call is usually wasted. An answer is flagged when:
+
+    1. it matches a refusal phrase ("I don't have information", "please try
+       again later", "the context does not mention" ...);
+    2. it is shorter than `min_chars`;
+    3. a small logistic regression over hashed word n-grams and the two
+       signals above scores it at or above `threshold`.
+
+Only flagged answers go to the guardrail. A random `audit_rate` share of the
+unflagged ones go too, which measures false negatives (audited answers the
+guardrail rewrote). When `log_path` is set, every guardrail outcome is appended
+there as a labelled example ("rewritten" = the guardrail's answer differs
+substantially from the original).
+
+The classifier is trained on refusal_examples.json plus the newest
+`max_records` logged outcomes (the log itself is never truncated). Features
+are sparse (hashed n-gram indices), so training time grows with the number
+of words in the examples rather than examples x `dim`. Training runs in
+`python manage.py train_refusal_detector`, which saves the weights to
+settings.REFUSAL_MODEL_PATH; workers load that file, or train once when it
+is missing, in a background thread at startup (see apps.py).
+"""
+import difflib
+import json
+import os
+import random
+import re
+import threading
+import zlib
+
+import numpy as np
+from pydantic import BaseModel
+
+from .intent_classifier import normalize
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "refusal_examples.json")
+MAX_LOG_RECORDS = 5000
+
+REFUSAL_PATTERNS = [re.compile(pattern) for pattern in (
+    r"\b(i|we) (do not|don't|dont|cannot|can't|cant|am unable to|am not able to|could not|couldn't) "
+    r"(help|answer|provide|assist|find|say|identify|give|access|have (any |enough )?(information|data|details|access))",
+    r"\b(i'm|i am) (not able|unable|not sure|sorry,? but i)",
+    r"\b(i|we) (do not|don't) know\b",
+    r"\b(information|data) (is )?not available\b",
+    r"\bno information (about|on|for)\b",
+    r"\bno (mandi price )?data\b",
+    r"\b(context|documents?|knowledge base)( provided)? (does|do) not (contain|mention|include)\b",
+    r"\bnot (in|mentioned in) the (provided )?(context|documents?)\b",
+    r"\boutside (of )?my (knowledge|scope)\b",
+    r"\bas an ai\b",
+    r"\b(please )?try again (later|in a few minutes)\b",
+    r"\b(please )?rephrase\b",
+    r"\b(please )?(consult|ask|contact) (an? |your )?(local |nearest )?(expert|agronomist|agriculture officer|"
+    r"krishi vigyan kendra|kvk|dealer|someone else)\b",
+    r"\bsearch_needed\b",
+)]
+
+
+def _plain(answer: str) -> str:
+    return (answer or "").casefold().replace("\u2019", "'")
+
+
+class RefusalCheck(BaseModel):
+    flagged: bool
+    reason: str  # "pattern", "short", "classifier" or "" when not flagged
+    score: float
+
+
+class RefusalDetector:
+    def __init__(self, examples: list, threshold: float = 0.5, min_chars: int = 40, audit_rate: float = 0.05,
+                 log_path: str = None, dim: int = 1 << 12):
+        """
+        `examples` are {"answer": str, "refusal": bool} dicts the classifier is trained on;
+        None leaves it untrained, for `load`.
+        """
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.audit_rate = audit_rate
+        self.log_path = log_path
+        self.dim = dim
+        if examples:
+            self.weights, self.bias = self._train(examples)
+        else:
+            self.weights, self.bias = np.zeros(dim + 3, dtype=np.float32), 0.0
+        self._lock = threading.Lock()
+        self._counters = {
+            "checked": 0, "skipped": 0, "flagged_pattern": 0, "flagged_short": 0, "flagged_classifier": 0,
+            "audited": 0, "false_negatives": 0, "true_positives": 0, "false_positives": 0, "guardrail_errors": 0,
+        }
+
+    # --- Features ---
+    def _features(self, answer: str) -> tuple:
+        """Sparse feature vector as (indices, values): hashed word uni/bigrams, then the three signals."""
+        words = normalize(answer).split()
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        hashed = sorted({zlib.crc32(gram.encode("utf-8")) % self.dim for gram in grams})
+        text = _plain(answer)
+        signals = (
+            float(any(pattern.search(text) for pattern in REFUSAL_PATTERNS)),
+            float(len(text.strip()) < self.min_chars),
+            min(len(text), 1000) / 1000,
+        )
+        indices = np.array(hashed + [self.dim + i for i in range(3)], dtype=np.int64)
+        values = np.array([1.0 / np.sqrt(max(1, len(hashed)))] * len(hashed) + list(signals), dtype=np.float32)
+        return indices, values
+
+    def _train(self, examples: list, epochs: int = 300, learning_rate: float = 0.5, l2: float = 1e-3):
+        """Logistic regression by full-batch gradient descent over the sparse rows of `examples`."""
+        rows = [self._features(example["answer"]) for example in examples]
+        indices = np.concatenate([row[0] for row in rows])
+        values = np.concatenate([row[1] for row in rows])
+        row_ids = np.repeat(np.arange(len(rows)), [len(row[0]) for row in rows])
+        y = np.array([float(example["refusal"]) for example in examples], dtype=np.float32)
+        weights, bias = np.zeros(self.dim + 3, dtype=np.float32), 0.0
+        for _ in range(epochs):
+            logits = np.bincount(row_ids, weights=values * weights[indices], minlength=len(rows)) + bias
+            error = (1 / (1 + np.exp(-logits)) - y).astype(np.float32)
+            gradient = np.bincount(indices, weights=values * error[row_ids], minlength=len(weights)) / len(y)
+            weights -= (learning_rate * (gradient + l2 * weights)).astype(np.float32)
+            bias -= learning_rate * float(error.mean())
+        return weights, bias
+
+    # --- Persistence ---
+    def signature(self) -> str:
+        """Identifies the feature layout; a saved model is only valid for the same one."""
+        layout = json.dumps([self.dim, self.min_chars, [pattern.pattern for pattern in REFUSAL_PATTERNS]])
+        return f"{zlib.crc32(layout.encode('utf-8')):08x}"
+
+    def save(self, path: str):
+        with open(path, "wb") as f:  # a file object, so numpy doesn't append ".npz" to the path
+            np.savez(f, weights=self.weights, bias=np.float32(self.bias), dim=self.dim, min_chars=self.min_chars,
+                     signature=self.signature())
+
+    @classmethod
+    def load(cls, path: str, **options) -> "RefusalDetector":
+        """A detector with the weights saved at `path`; ValueError when they don't fit the current features."""
+        with np.load(path, allow_pickle=False) as data:
+            detector = cls(None, dim=int(data["dim"]), min_chars=int(data["min_chars"]), **options)
+            if str(data["signature"]) != detector.signature():
+                raise ValueError(f"Refusal model at '{path}' was trained on different features; retrain it.")
+            detector.weights, detector.bias = data["weights"].astype(np.float32), float(data["bias"])
+        return detector
+
+    # --- Detection ---
+    def score(self, answer: str) -> float:
+        """Classifier probability that `answer` is a refusal or low-confidence answer."""
+        indices, values = self._features(answer)
+        return float(1 / (1 + np.exp(-(values @ self.weights[indices] + self.bias))))
+
+    def check(self, answer: str) -> RefusalCheck:
+        text = _plain(answer)
+        score = round(self.score(answer), 4)
+        if any(pattern.search(text) for pattern in REFUSAL_PATTERNS):
+            return RefusalCheck(flagged=True, reason="pattern", score=score)
+        if len(text.strip()) < self.min_chars:
+            return RefusalCheck(flagged=True, reason="short", score=score)
+        if score >= self.threshold:
+            return RefusalCheck(flagged=True, reason="classifier", score=score)
+        return RefusalCheck(flagged=False, reason="", score=score)
+
+    def review(self, answer: str, question: str, regenerate) -> str:
+        """
+        Returns `answer` when it is confidently unflagged, else the text returned by
+        `regenerate()` (the guardrail LLM call). Guardrail errors propagate to the caller.
+        """
+        result = self.check(answer)
+        audit = not result.flagged and random.random() < self.audit_rate
+        self._count("checked")
+        if not result.flagged and not audit:
+            self._count("skipped")
+            return answer
+        self._count("audited" if audit else f"flagged_{result.reason}")
+
+        try:
+            reviewed = regenerate()
+        except Exception:
+            self._count("guardrail_errors")
+            raise
+        rewritten = self.is_rewrite(answer, reviewed)
+        if audit:
+            if rewritten:
+                self._count("false_negatives")
+        else:
+            self._count("true_positives" if rewritten else "false_positives")
+        self._log(answer, question, rewritten, result, audit)
+        return reviewed
+
+    @staticmethod
+    def is_rewrite(original: str, reviewed: str) -> bool:
+        """True when the guardrail replaced the answer rather than echoing it (give or take formatting)."""
+        a, b = " ".join(normalize(original).split()), " ".join(normalize(reviewed).split())
+        return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() < 0.6
+
+    def _log(self, answer: str, question: str, rewritten: bool, result: RefusalCheck, audit: bool):
+        if not self.log_path:
+            return
+        record = {
+            "answer": answer, "question": question, "refusal": rewritten,
+            "flagged": result.flagged, "reason": result.reason, "score": result.score, "audit": audit,
+        }
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not log guardrail outcome: {e}")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["skip_rate"] = round(stats["skipped"] / stats["checked"], 4) if stats["checked"] else 0.0
+        # Share of unflagged answers the guardrail would have rewritten, estimated from the audits.
+        stats["false_negative_rate"] = (
+            round(stats["false_negatives"] / stats["audited"], 4) if stats["audited"] else None
+        )
+        return stats
+
+
+def _tail_lines(path: str, count: int, block_size: int = 1 << 16) -> list:
+    """The last `count` lines of a file, read backwards in blocks so a long log isn't scanned."""
+    if count <= 0:
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position, data = f.tell(), b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return [line.decode("utf-8", errors="replace") for line in data.splitlines()[-count:]]
+
+
+def load_examples(log_path: str = None, max_records: int = MAX_LOG_RECORDS) -> list:
+    """refusal_examples.json plus the newest `max_records` labelled guardrail outcomes logged at `log_path`."""
+    with open(EXAMPLES_PATH, encoding="utf-8") as f:
+        examples = json.load(f)
+    if log_path and os.path.exists(log_path):
+        for line in _tail_lines(log_path, max_records):
+            try:
+                record = json.loads(line)
+                examples.append({"answer": record["answer"], "refusal": bool(record["refusal"])})
+            except (ValueError, KeyError, TypeError):
+                continue
+    return examples
+
+
+def train_detector(log_path: str = None, max_records: int = MAX_LOG_RECORDS, **options) -> RefusalDetector:
+    return RefusalDetector(load_examples(log_path, max_records), log_path=log_path, **options)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_refusal_detector():
+    """
+    Process-wide detector configured from settings.REFUSAL_*; None when disabled. Loads
+    the weights saved at REFUSAL_MODEL_PATH, or trains them when that file is missing or stale.
+    """
+    global _detector
+    from django.conf import settings
+    if not getattr(settings, "REFUSAL_DETECTOR_ENABLED", False):
+        return None
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                log_path = getattr(settings, "REFUSAL_LOG_PATH", "") or None
+                model_path = getattr(settings, "REFUSAL_MODEL_PATH", "") or None
+                options = {"threshold": settings.REFUSAL_THRESHOLD, "audit_rate": settings.REFUSAL_AUDIT_RATE}
+                detector = None
+                if model_path and os.path.exists(model_path):
+                    try:
+                        detector = RefusalDetector.load(model_path, log_path=log_path, **options)
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"⚠️ Could not load the refusal model, training instead: {e}")
+                if detector is None:
+                    detector = train_detector(
+                        log_path, getattr(settings, "REFUSAL_LOG_MAX_RECORDS", MAX_LOG_RECORDS), **options
+                    )
+                _detector = detector
+    return _detector
+
+
+def warm_up(background: bool = False):
+    """Builds the detector ahead of the first answer; with `background=True` in a daemon thread."""
+    if background:
+        thread = threading.Thread(target=get_refusal_detector, name="refusal-detector-warmup", daemon=True)
+        thread.start()
+        return thread
+    get_refusal_detector()
+    return None
+
+
+def review_answer(answer: str, question: str, regenerate) -> str:
+    """Runs `regenerate` (the guardrail call) unless the refusal detector clears the answer."""
+    detector = get_refusal_detector()
+    if detector is None:
+        return regenerate()
+    return detector.review(answer, question, regenerate)
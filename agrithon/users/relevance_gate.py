@@ -0,0 +1,98 @@
+# File: relevance_gate.py
+"""
+Retrieval-side relevance gate for the RAG engines.
+
+Before the RAG prompt is sent to Gemini, the gate looks at what retrieval
+found: the distance of the closest vector hit and how many of the question's
+content words appear in the retrieved chunks. When the context is clearly
+irrelevant the engine skips the RAG call (which would only answer
+SEARCH_NEEDED) and goes straight to the fallback. Every decision is logged
+with its signals (and a hash of the question, not its text) so the
+per-engine thresholds can be tuned from the logs;
+`python -m benchmarks.relevance_calibration` derives them from the labelled
+retrieval questions.
+"""
+import hashlib
+import logging
+import re
+import threading
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for", "and", "or",
+    "what", "which", "who", "how", "when", "where", "why", "do", "does", "did", "can", "could",
+    "should", "would", "will", "i", "my", "me", "we", "our", "you", "your", "it", "its", "this",
+    "that", "these", "those", "with", "about", "from", "at", "by", "as", "tell", "please", "give",
+    "get", "any", "some", "there", "have", "has", "had", "use", "used", "best", "good",
+}
+WORD_PATTERN = re.compile(r"\w+(?:-\w+)*")
+
+
+def content_words(text: str) -> set:
+    return {word for word in WORD_PATTERN.findall((text or "").casefold())
+            if word not in STOPWORDS and not word.isdigit() and len(word) > 1}
+
+
+def keyword_overlap(query: str, context: str) -> float:
+    """Fraction of the query's content words that appear in the context."""
+    words = content_words(query)
+    if not words:
+        return 0.0
+    context_words = content_words(context)
+    return sum(1 for word in words if word in context_words) / len(words)
+
+
+class RelevanceDecision(BaseModel):
+    relevant: bool
+    reason: str
+    best_distance: float | None = None
+    keyword_overlap: float = 0.0
+
+
+class RelevanceGate:
+    """
+    The context counts as irrelevant when nothing was retrieved, or when the
+    best vector hit is farther than `max_distance` (squared L2; None = not
+    checked) and fewer than `min_keyword_overlap` of the content words match.
+    Both conditions must hold, so a strong signal on either side keeps the RAG path.
+    """
+    def __init__(self, name: str, max_distance: float = None, min_keyword_overlap: float = 0.3):
+        self.name = name
+        self.max_distance = max_distance
+        self.min_keyword_overlap = min_keyword_overlap
+        self._lock = threading.Lock()
+        self._counters = {"passed": 0, "gated": 0}
+
+    def evaluate(self, query: str, docs: list, best_distance: float = None) -> RelevanceDecision:
+        if not docs:
+            decision = RelevanceDecision(relevant=False, reason="no_documents", best_distance=best_distance)
+        else:
+            overlap = keyword_overlap(query, " ".join(doc.page_content for doc in docs))
+            too_far = self.max_distance is None or (best_distance is not None and best_distance > self.max_distance)
+            if too_far and overlap < self.min_keyword_overlap:
+                reason = "far_and_no_keywords" if self.max_distance is not None else "no_keywords"
+                decision = RelevanceDecision(relevant=False, reason=reason, best_distance=best_distance,
+                                             keyword_overlap=overlap)
+            else:
+                decision = RelevanceDecision(relevant=True, reason="ok", best_distance=best_distance,
+                                             keyword_overlap=overlap)
+
+        with self._lock:
+            self._counters["passed" if decision.relevant else "gated"] += 1
+        logger.info(
+            "rag_relevance_gate engine=%s relevant=%s reason=%s best_distance=%s keyword_overlap=%.2f "
+            "query_sha1=%s query_chars=%d",
+            self.name, decision.relevant, decision.reason, decision.best_distance, decision.keyword_overlap,
+            hashlib.sha1(query.encode("utf-8")).hexdigest()[:12], len(query),
+        )
+        return decision
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        total = stats["passed"] + stats["gated"]
+        stats["gated_ratio"] = round(stats["gated"] / total, 4) if total else 0.0
+        return stats
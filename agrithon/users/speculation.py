@@ -0,0 +1,178 @@
+# File: speculation.py
+"""
+Speculative web-search fallback for the RAG engines.
+
+`ask_question` normally runs the RAG call and only starts the web-search
+call when the answer says SEARCH_NEEDED, so a fallback question pays for two
+Gemini calls back to back. For questions predicted to fall back, the
+speculator starts the web search alongside the RAG call: when RAG does say
+SEARCH_NEEDED the web answer is already (partly) done, otherwise the web
+call is cancelled.
+
+The prediction is cheap: the fallback rate of earlier questions on the same
+topic (see fallback_cache.topic_key) once a topic has been seen often enough,
+else whether the question asks for live data ("current price", "today") or
+shares few words with the retrieved chunks. Counters report LLM seconds saved
+by overlapping the calls and seconds wasted on cancelled ones, so the
+threshold can be tuned against the Gemini quota.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .fallback_cache import topic_key
+from .relevance_gate import keyword_overlap
+
+FALLBACK_MARKER = "SEARCH_NEEDED:"
+LIVE_DATA_WORDS = {"price", "rate", "bhav", "today", "current", "latest", "now", "week", "forecast", "news", "trend"}
+
+
+def _timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+
+async def _atimed(call):
+    started = time.perf_counter()
+    result = await call()
+    return result, time.perf_counter() - started
+
+
+class FallbackSpeculator:
+    """
+    `threshold` is the topic fallback rate above which a question is speculated,
+    once the topic has `min_observations` outcomes; `max_overlap` is the keyword
+    overlap with the retrieved chunks below which an unseen topic is speculated.
+    """
+    def __init__(self, name: str, threshold: float = 0.5, min_observations: int = 3, max_overlap: float = 0.34,
+                 max_topics: int = 10000, max_workers: int = 8):
+        self.name = name
+        self.threshold = threshold
+        self.min_observations = min_observations
+        self.max_overlap = max_overlap
+        self.max_topics = max_topics
+        self._topics = OrderedDict()  # topic -> [fallbacks, answers]
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"speculate-{name}")
+        self._lock = threading.Lock()
+        self._counters = {
+            "predicted": 0, "not_predicted": 0, "missed_fallbacks": 0,
+            "rag_won": 0, "fallback_won": 0, "cancelled_before_start": 0,
+            "saved_llm_seconds": 0.0, "wasted_llm_seconds": 0.0,
+        }
+
+    # --- Prediction ---
+    def predict(self, query: str, docs: list) -> bool:
+        """True when the RAG answer for `query` is likely to be SEARCH_NEEDED."""
+        topic = topic_key(query)
+        with self._lock:
+            fallbacks, answers = self._topics.get(topic, (0, 0))
+        if answers >= self.min_observations:
+            predicted = fallbacks / answers >= self.threshold
+        else:
+            asks_live_data = bool(LIVE_DATA_WORDS & set(topic.split()))
+            overlap = keyword_overlap(query, " ".join(doc.page_content for doc in docs))
+            predicted = asks_live_data or overlap < self.max_overlap
+        self._count("predicted" if predicted else "not_predicted")
+        return predicted
+
+    def record(self, query: str, fell_back: bool, predicted: bool = False):
+        """Adds the outcome of one RAG answer to its topic's history."""
+        topic = topic_key(query)
+        with self._lock:
+            entry = self._topics.setdefault(topic, [0, 0])
+            entry[0] += fell_back
+            entry[1] += 1
+            self._topics.move_to_end(topic)
+            while len(self._topics) > self.max_topics:
+                self._topics.popitem(last=False)
+            if fell_back and not predicted:
+                self._counters["missed_fallbacks"] += 1
+
+    # --- Execution ---
+    def run(self, query: str, rag_call, web_call):
+        """
+        Runs `rag_call` here and `web_call` in a worker thread. Returns (rag response,
+        web response), where the web response is None when RAG answered on its own.
+        A web call that has already started cannot be interrupted; it finishes in the
+        background and its time counts as wasted.
+        """
+        started = time.perf_counter()
+        web_future = self._executor.submit(_timed, web_call)
+        try:
+            rag_response = rag_call()
+        except BaseException:
+            web_future.cancel()
+            raise
+        rag_seconds = time.perf_counter() - started
+        fell_back = FALLBACK_MARKER in rag_response
+        self.record(query, fell_back, predicted=True)
+
+        if not fell_back:
+            self._count("rag_won")
+            if web_future.cancel():
+                self._count("cancelled_before_start")
+            else:
+                web_future.add_done_callback(self._record_background_waste)
+            return rag_response, None
+
+        web_response, web_seconds = web_future.result()
+        self._fallback_won(rag_seconds, web_seconds, time.perf_counter() - started)
+        return rag_response, web_response
+
+    async def arun(self, query: str, rag_call, web_call):
+        """Async run(): `rag_call` and `web_call` return coroutines; a losing web call is cancelled outright."""
+        started = time.perf_counter()
+        web_task = asyncio.create_task(_atimed(web_call))
+        try:
+            rag_response = await rag_call()
+        except BaseException:
+            web_task.cancel()
+            raise
+        rag_seconds = time.perf_counter() - started
+        fell_back = FALLBACK_MARKER in rag_response
+        self.record(query, fell_back, predicted=True)
+
+        if not fell_back:
+            self._count("rag_won")
+            if web_task.done() and not web_task.cancelled() and web_task.exception() is None:
+                wasted = web_task.result()[1]
+            else:
+                web_task.cancel()
+                wasted = rag_seconds
+            self._add("wasted_llm_seconds", wasted)
+            return rag_response, None
+
+        web_response, web_seconds = await web_task
+        self._fallback_won(rag_seconds, web_seconds, time.perf_counter() - started)
+        return rag_response, web_response
+
+    def _fallback_won(self, rag_seconds: float, web_seconds: float, elapsed: float):
+        # Run one after the other, the two calls would have taken rag_seconds + web_seconds.
+        self._count("fallback_won")
+        self._add("saved_llm_seconds", max(0.0, rag_seconds + web_seconds - elapsed))
+
+    def _record_background_waste(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._add("wasted_llm_seconds", future.result()[1])
+
+    # --- Stats ---
+    def _count(self, name: str):
+        self._add(name, 1)
+
+    def _add(self, name: str, amount):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters, topics=len(self._topics))
+        speculated = stats["rag_won"] + stats["fallback_won"]
+        stats["precision"] = round(stats["fallback_won"] / speculated, 4) if speculated else 0.0
+        stats["saved_llm_seconds"] = round(stats["saved_llm_seconds"], 3)
+        stats["wasted_llm_seconds"] = round(stats["wasted_llm_seconds"], 3)
+        stats["net_saved_llm_seconds"] = round(stats["saved_llm_seconds"] - stats["wasted_llm_seconds"], 3)
+        return stats
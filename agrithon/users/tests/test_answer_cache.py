@@ -0,0 +1,202 @@
+import threading
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from users.answer_cache import SemanticAnswerCache, is_follow_up
+from users.history_store import InMemoryHistoryBackend
+from users.price_bot import RAGQueryEngineWithMemory
+
+
+class FakeEmbeddings:
+    VECTORS = {
+        "wheat price": [1.0, 0.0, 0.0],
+        "price of wheat": [0.99, 0.05, 0.0],
+        "rice price": [0.0, 1.0, 0.0],
+        "onion price": [0.0, 0.0, 1.0],
+        "and for wheat": [0.98, 0.1, 0.0],
+    }
+
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+
+class DictCache:
+    """The slice of Django's cache API the shared tier uses."""
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if key in self.data:
+                return False
+            self.data[key] = value
+            return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = DictCache()
+        self.cache = SemanticAnswerCache(
+            FakeEmbeddings(), similarity_threshold=0.95, shared_cache=self.shared,
+            regional_namespaces=("price",),
+        )
+
+    def test_similar_question_hits_and_different_one_misses(self):
+        answer, vector = self.cache.lookup("price", "wheat price")
+        self.assertIsNone(answer)
+        self.cache.store("price", vector, "₹2,425/quintal")
+
+        self.assertEqual(self.cache.lookup("price", "price of wheat")[0], "₹2,425/quintal")
+        self.assertIsNone(self.cache.lookup("price", "rice price")[0])
+        self.assertEqual(self.cache.stats()["local_hits"], 1)
+
+    def test_regional_namespaces_are_scoped_by_region(self):
+        _, vector = self.cache.lookup("price", "wheat price", region="Punjab/Ludhiana")
+        self.cache.store("price", vector, "Ludhiana answer", region="Punjab/Ludhiana")
+
+        self.assertIsNone(self.cache.lookup("price", "wheat price", region="Bihar/Patna")[0])
+        self.assertEqual(self.cache.lookup("price", "wheat price", region="punjab/ludhiana")[0], "Ludhiana answer")
+
+    def test_shared_tier_serves_other_workers(self):
+        _, vector = self.cache.lookup("price", "wheat price")
+        self.cache.store("price", vector, "shared answer")
+
+        other = SemanticAnswerCache(FakeEmbeddings(), similarity_threshold=0.95, shared_cache=self.shared)
+        self.assertEqual(other.lookup("price", "price of wheat")[0], "shared answer")
+        self.assertEqual(other.stats()["shared_hits"], 1)
+
+    def test_concurrent_stores_keep_every_answer(self):
+        questions = ["wheat price", "rice price", "onion price"]
+        workers = [
+            SemanticAnswerCache(FakeEmbeddings(), shared_cache=self.shared, shared_lock_seconds=5)
+            for _ in questions
+        ]
+        barrier = threading.Barrier(len(questions))
+
+        def store(cache, question):
+            barrier.wait()
+            cache.store("price", cache.embed(question), f"answer for {question}")
+
+        threads = [threading.Thread(target=store, args=pair) for pair in zip(workers, questions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        bucket = self.shared.get(self.cache._shared_key("price"))
+        self.assertEqual(sorted(item["answer"] for item in bucket), sorted(f"answer for {q}" for q in questions))
+        self.assertNotIn(self.cache._shared_key("price") + ":lock", self.shared.data)
+
+    def test_store_is_dropped_while_another_worker_holds_the_bucket_lock(self):
+        self.cache.shared_lock_seconds = 0
+        self.shared.add(self.cache._shared_key("price") + ":lock", 1)
+
+        self.cache.store("price", np.array([1.0, 0.0, 0.0], dtype=np.float32), "answer")
+
+        self.assertIsNone(self.shared.get(self.cache._shared_key("price")))
+        self.assertEqual(self.cache.stats()["shared_lock_timeouts"], 1)
+
+
+    def test_expired_lock_retaken_by_another_worker_is_left_alone(self):
+        lock_key = self.cache._shared_key("price") + ":lock"
+        real_set = self.shared.set
+
+        def set_after_lock_expired(key, value, timeout=None):
+            # Our lock expired mid-write and another worker took it.
+            self.shared.data[lock_key] = "other worker"
+            real_set(key, value, timeout)
+
+        self.shared.set = set_after_lock_expired
+        self.cache.store("price", np.array([1.0, 0.0, 0.0], dtype=np.float32), "answer")
+
+        self.assertEqual(self.shared.data[lock_key], "other worker")
+
+    def test_django_redis_releases_the_lock_with_compare_and_delete(self):
+        class FakeRedis:
+            def __init__(self):
+                self.calls = []
+
+            def eval(self, script, numkeys, *args):
+                self.calls.append(args)
+                return 1
+
+        class DjangoRedisCache(DictCache):
+            def __init__(self):
+                super().__init__()
+                redis = self.redis = FakeRedis()
+                self.client = type("Client", (), {"get_client": lambda _, write=True: redis})()
+
+            def make_key(self, key):
+                return f":1:{key}"
+
+        shared = DjangoRedisCache()
+        cache = SemanticAnswerCache(FakeEmbeddings(), shared_cache=shared)
+        cache.store("price", np.array([1.0, 0.0, 0.0], dtype=np.float32), "answer")
+
+        lock_key = cache._shared_key("price") + ":lock"
+        [(key, token)] = shared.redis.calls
+        self.assertEqual(key, f":1:{lock_key}")
+        self.assertEqual(token, shared.data[lock_key])
+
+
+class EngineAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SemanticAnswerCache(FakeEmbeddings(), similarity_threshold=0.95)
+        _, vector = self.cache.lookup("price", "wheat price")
+        self.cache.store("price", vector, "cached wheat answer")
+        # Only the attributes the cache path touches; no index or LLM is loaded.
+        self.engine = RAGQueryEngineWithMemory.__new__(RAGQueryEngineWithMemory)
+        self.engine.name = "price"
+        self.engine.answer_cache = self.cache
+        self.engine.history_backend = InMemoryHistoryBackend()
+
+    def test_first_question_of_a_session_uses_the_cache(self):
+        answer, _ = self.engine._lookup_cached_answer("price of wheat", "s1", None)
+        self.assertEqual(answer, "cached wheat answer")
+
+    def test_follow_up_skips_the_cache(self):
+        history = self.engine.get_session_history("s2")
+        history.add_user_message("rice price")
+        history.add_ai_message("₹3,100/quintal")
+
+        answer, vector = self.engine._lookup_cached_answer("and for wheat", "s2", None)
+
+        self.assertIsNone(answer)
+        self.assertIsNone(vector)  # nothing to store the follow-up's answer under either
+
+    def test_unrelated_question_later_in_the_session_uses_the_cache(self):
+        history = self.engine.get_session_history("s3")
+        history.add_user_message("rice price")
+        history.add_ai_message("₹3,100/quintal")
+
+        answer, _ = self.engine._lookup_cached_answer("price of wheat", "s3", None)
+
+        self.assertEqual(answer, "cached wheat answer")
+
+    def test_follow_up_without_history_uses_the_cache(self):
+        self.assertEqual(self.engine._lookup_cached_answer("and for wheat", "s4", None)[0], "cached wheat answer")
+
+
+class FollowUpTests(SimpleTestCase):
+    def test_follow_ups(self):
+        for query in ("And for wheat?", "what about onion", "How much of it per acre?", "is that safe for bees",
+                      "uska dose kitna hai", "इसका दाम क्या है", "same for rice", "aur gehu ka?"):
+            with self.subTest(query=query):
+                self.assertTrue(is_follow_up(query))
+
+    def test_standalone_questions(self):
+        for query in ("What is the MSP of wheat this year?", "price of onion in Nashik", "gehu ka bhav kya hai",
+                      "How to control whitefly in cotton", "is saal kapas ka rate", "rain forecast for this week"):
+            with self.subTest(query=query):
+                self.assertFalse(is_follow_up(query))
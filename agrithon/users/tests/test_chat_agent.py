@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from users.chat_agent import PrebuiltAgent, current_agent_user
+
+seen_users = []
+
+
+@tool
+def whose_farm() -> str:
+    """Returns the name of the farmer being answered."""
+    user = current_agent_user()
+    seen_users.append(user)
+    return user
+
+
+class ToolThenAnswerModel(GenericFakeChatModel):
+    """Calls whose_farm once, then answers with the tool's result."""
+    messages: object = iter(())
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        results = [message.content for message in messages if isinstance(message, ToolMessage)]
+        if results:
+            message = AIMessage(content=f"Answer for {results[-1]}")
+        else:
+            call = {"id": "call-1", "type": "function", "function": {"name": "whose_farm", "arguments": "{}"}}
+            message = AIMessage(content="", additional_kwargs={"tool_calls": [call]},
+                                tool_calls=[{"id": "call-1", "name": "whose_farm", "args": {}}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class PrebuiltAgentTests(SimpleTestCase):
+    def setUp(self):
+        seen_users.clear()
+        self.builds = []
+
+        def llm():
+            self.builds.append(1)
+            return ToolThenAnswerModel()
+
+        self.agent = PrebuiltAgent(llm, [whose_farm], "You are a farming assistant.")
+
+    def test_tools_outside_a_run_raise(self):
+        with self.assertRaises(RuntimeError):
+            current_agent_user()
+
+    def test_executor_is_built_once_on_first_use(self):
+        self.assertEqual(self.builds, [])
+        self.agent.invoke("hi", [], "asha")
+        self.agent.invoke("hi", [], "ravi")
+        self.assertEqual(self.builds, [1])
+
+    def test_concurrent_runs_each_see_their_own_user(self):
+        users = [f"farmer-{i}" for i in range(8)]
+        replies = {}
+        barrier = threading.Barrier(len(users))
+
+        def worker(user):
+            barrier.wait()
+            replies[user] = self.agent.invoke("whose farm is this?", [], user)["output"]
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(replies, {user: f"Answer for {user}" for user in users})
+        with self.assertRaises(RuntimeError):
+            current_agent_user()
+
+    def test_async_runs_each_see_their_own_user(self):
+        async def run_all():
+            return await asyncio.gather(*(self.agent.ainvoke("whose farm?", [], user) for user in ("asha", "ravi")))
+
+        outputs = [result["output"] for result in asyncio.run(run_all())]
+
+        self.assertEqual(outputs, ["Answer for asha", "Answer for ravi"])
+        self.assertEqual(sorted(seen_users), ["asha", "ravi"])
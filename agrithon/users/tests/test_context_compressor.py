@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase
+
+from users.context_compressor import ContextCompressor, MinHasher, estimate_tokens, split_sentences
+
+DOSAGE = (
+    "Spray Confidor 200 SL at 0.5 ml per litre for aphids on cotton. "
+    "Repeat after 15 days if the aphid count stays high. "
+    "Avoid spraying during flowering to protect bees."
+)
+
+
+class HelperTests(SimpleTestCase):
+    def test_token_estimate_rounds_up(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+    def test_continuation_lines_join_the_previous_sentence(self):
+        self.assertEqual(
+            split_sentences("Crop: Wheat\nvariety HD 3086\nYield: 55 q/ha. Sow early."),
+            ["Crop: Wheat variety HD 3086", "Yield: 55 q/ha.", "Sow early."],
+        )
+
+    def test_minhash_similarity_tracks_overlap(self):
+        hasher = MinHasher()
+        base = hasher.signature(DOSAGE)
+        self.assertEqual(hasher.similarity(base, hasher.signature(DOSAGE + " ")), 1.0)
+        self.assertLess(hasher.similarity(base, hasher.signature("Irrigate wheat at crown root initiation.")), 0.2)
+
+
+class ContextCompressorTests(SimpleTestCase):
+    def test_near_duplicates_are_dropped(self):
+        compressor = ContextCompressor("pesticide", token_budget=1000)
+        overlapping = DOSAGE.replace("high.", "high!")
+
+        compressed = compressor.compress("aphids on cotton", [DOSAGE, overlapping, "Irrigate wheat on time."])
+
+        self.assertEqual(compressed, [DOSAGE, "Irrigate wheat on time."])
+        self.assertEqual(compressor.stats()["duplicates_dropped"], 1)
+
+    def test_long_chunks_keep_the_most_relevant_sentences_in_order(self):
+        compressor = ContextCompressor("pesticide", token_budget=20)
+
+        compressed = compressor.compress("how often to repeat the aphid spray", [DOSAGE])
+
+        self.assertEqual(compressed, ["Repeat after 15 days if the aphid count stays high."])
+        self.assertGreater(compressor.stats()["tokens_saved"], 0)
+
+    def test_output_stays_within_the_budget(self):
+        compressor = ContextCompressor("price", token_budget=60)
+        texts = [f"Market {i}: Onion modal price {1000 + i} Rs/quintal. Arrivals were steady." * 3 for i in range(5)]
+
+        compressed = compressor.compress("onion modal price", texts)
+
+        self.assertLessEqual(sum(estimate_tokens(text) for text in compressed), 60)
@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from users.embedding_batcher import BatchingEmbeddings, OllamaBatchEmbeddings
+
+
+class RecordingEmbeddings:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ConnectionError("ollama is down")
+        return [[float(len(text))] for text in texts]
+
+
+class BatchingEmbeddingsTests(SimpleTestCase):
+    def test_concurrent_queries_share_one_batch(self):
+        client = RecordingEmbeddings()
+        batcher = BatchingEmbeddings(client, max_wait_ms=200, max_batch_size=4)
+        texts = ["a", "bb", "ccc", "dddd"]
+        results = {}
+        barrier = threading.Barrier(len(texts))
+
+        def worker(text):
+            barrier.wait()
+            results[text] = batcher.embed_query(text)
+
+        threads = [threading.Thread(target=worker, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {text: [float(len(text))] for text in texts})
+        self.assertEqual(len(client.batches), 1)
+        self.assertEqual(batcher.stats()["largest_batch"], 4)
+
+    def test_large_document_lists_bypass_the_queue(self):
+        client = RecordingEmbeddings()
+        batcher = BatchingEmbeddings(client, max_batch_size=2)
+
+        self.assertEqual(batcher.embed_documents(["a", "bb", "ccc"]), [[1.0], [2.0], [3.0]])
+        self.assertEqual(batcher.stats()["batches"], 0)
+
+    def test_client_errors_reach_every_caller(self):
+        batcher = BatchingEmbeddings(RecordingEmbeddings(fail=True), max_wait_ms=1)
+
+        with self.assertRaises(ConnectionError):
+            batcher.embed_query("wheat")
+
+    def test_missing_vectors_fail_the_batch_instead_of_hanging(self):
+        client = mock.Mock()
+        client.embed_documents.return_value = [[1.0]]
+        batcher = BatchingEmbeddings(client, max_wait_ms=50, max_batch_size=4, timeout_seconds=5)
+
+        with self.assertRaises(ValueError):
+            batcher.embed_documents(["a", "bb"])
+        self.assertEqual(batcher.stats()["errors"], 1)
+
+    def test_dispatcher_survives_unexpected_errors(self):
+        batcher = BatchingEmbeddings(RecordingEmbeddings(), max_wait_ms=1, timeout_seconds=5)
+        with mock.patch.object(batcher, "_flush", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                batcher.embed_query("wheat")
+
+        self.assertEqual(batcher.embed_query("rice"), [4.0])
+
+    def test_callers_time_out(self):
+        client = mock.Mock()
+        release = threading.Event()
+        client.embed_documents.side_effect = lambda texts: release.wait() and [[1.0]]
+        batcher = BatchingEmbeddings(client, max_wait_ms=1, timeout_seconds=0.05)
+
+        with self.assertRaises(FutureTimeoutError):
+            batcher.embed_query("wheat")
+        release.set()
+
+
+class OllamaBatchEmbeddingsTests(SimpleTestCase):
+    def test_posts_the_whole_list_to_api_embed(self):
+        client = OllamaBatchEmbeddings("nomic-embed-text", base_url="http://ollama:11434/")
+        response = mock.Mock()
+        response.json.return_value = {"embeddings": [[0.6, 0.8], [1.0, 0.0]]}
+
+        with mock.patch.object(client.session, "post", return_value=response) as post:
+            vectors = client.embed_documents(["wheat", "rice"])
+
+        self.assertEqual(vectors, [[0.6, 0.8], [1.0, 0.0]])
+        post.assert_called_once_with(
+            "http://ollama:11434/api/embed", json={"model": "nomic-embed-text", "input": ["wheat", "rice"]},
+            timeout=30,
+        )
+        self.assertEqual(client.embed_documents([]), [])
@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from users.embedding_cache import CachedEmbeddings, normalize_text
+
+
+class CountingEmbeddings:
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[self.scale * len(text), self.scale] for text in texts]
+
+
+class CachedEmbeddingsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "embeddings.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize_text_folds_case_width_and_whitespace(self):
+        self.assertEqual(normalize_text("  Wheat\tPRICE\n in  Ｐｕｎｊａｂ "), "wheat price in punjab")
+
+    def test_only_unseen_texts_reach_the_client(self):
+        client = CountingEmbeddings()
+        cache = CachedEmbeddings(client, model_name="nomic-embed-text")
+
+        first = cache.embed_documents(["wheat price", "Wheat  Price", "rice"])
+        second = cache.embed_query("WHEAT PRICE")
+
+        self.assertEqual(client.calls, [["wheat price", "rice"]])
+        self.assertEqual(first[0], first[1])
+        self.assertEqual(second, first[0])
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+
+    def test_disk_tier_survives_a_new_instance(self):
+        CachedEmbeddings(CountingEmbeddings(), model_name="m", db_path=self.db_path).embed_query("onion")
+
+        client = CountingEmbeddings()
+        cache = CachedEmbeddings(client, model_name="m", db_path=self.db_path)
+
+        self.assertEqual(cache.embed_query("onion"), [5.0, 1.0])
+        self.assertEqual(client.calls, [])
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+
+    def test_namespaces_do_not_share_vectors(self):
+        raw = CachedEmbeddings(
+            CountingEmbeddings(), model_name="m", db_path=self.db_path, namespace="ollama/api/embeddings"
+        )
+        raw.embed_query("onion")
+
+        unit_client = CountingEmbeddings(scale=0.1)
+        unit = CachedEmbeddings(unit_client, model_name="m", db_path=self.db_path, namespace="ollama/api/embed")
+
+        self.assertNotEqual(raw.cache_key("onion"), unit.cache_key("onion"))
+        self.assertAlmostEqual(unit.embed_query("onion")[1], 0.1, places=6)
+        self.assertEqual(unit_client.calls, [["onion"]])
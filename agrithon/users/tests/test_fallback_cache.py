@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from users.fallback_cache import FallbackAnswerCache, topic_key
+
+
+class FakeRedis:
+    """Strings plus the sorted-set commands the shared tier uses."""
+    def __init__(self):
+        self.values = {}
+        self.scores = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode("utf-8")
+
+    def zadd(self, key, mapping):
+        self.scores.update(mapping)
+
+    def zcard(self, key):
+        return len(self.scores)
+
+    def zpopmin(self, key, count):
+        oldest = sorted(self.scores.items(), key=lambda item: item[1])[:count]
+        for member, _ in oldest:
+            del self.scores[member]
+        return oldest
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class TopicKeyTests(SimpleTestCase):
+    def test_wording_and_plurals_do_not_matter(self):
+        self.assertEqual(topic_key("Best time to sell apples in Himachal?"), "apple best himachal sell time")
+        self.assertEqual(topic_key("best time for selling apple, Himachal"), topic_key("Himachal apple selling time best"))
+
+    def test_question_words_keep_questions_apart(self):
+        self.assertNotEqual(topic_key("When to sell apples in Himachal?"), topic_key("How to sell apples in Himachal?"))
+
+    def test_numbers_keep_questions_apart(self):
+        self.assertNotEqual(topic_key("wheat price in 2022"), topic_key("wheat price in 2024"))
+        self.assertEqual(topic_key("urea 46.5 kg bags"), "46.5 bag kg urea")
+
+
+class FallbackAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = FallbackAnswerCache(self.redis, max_entries=2)
+
+    def test_key_is_scoped_by_region_and_month(self):
+        march, april = datetime(2025, 3, 10), datetime(2025, 4, 10)
+        key = self.cache.key("price", "apple price", "Himachal Pradesh/Shimla", when=march)
+        self.assertEqual(key, self.cache.key("price", "Apple prices", "himachal pradesh/shimla", when=march))
+        self.assertNotEqual(key, self.cache.key("price", "apple price", "Punjab/Ludhiana", when=march))
+        self.assertNotEqual(key, self.cache.key("price", "apple price", "Himachal Pradesh/Shimla", when=april))
+
+    def test_answers_are_shared_between_workers(self):
+        self.cache.set("price", "best time to sell apples", "HP", "Late November.")
+
+        other = FallbackAnswerCache(self.redis)
+        self.assertEqual(other.get("price", "Best time to sell apples?", "HP"), "Late November.")
+        self.assertIsNone(other.get("price", "how to store apples", "HP"))
+        self.assertEqual(other.stats()["shared_hits"], 1)
+
+    def test_oldest_shared_answers_are_evicted_beyond_the_cap(self):
+        for crop in ("apple", "onion", "wheat"):
+            self.cache.set("price", f"{crop} price", "HP", f"{crop} answer")
+
+        self.assertEqual(len(self.redis.scores), 2)
+        self.assertIsNone(self.redis.get(self.cache.key("price", "apple price", "HP")))
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from users.forecast_cache import (
+    LOCK_ACQUIRED, LOCK_HELD, LOCK_UNAVAILABLE, ForecastCache, geohash_center, geohash_encode,
+)
+
+DAYS = [{"day": 1}, {"day": 2}]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.get_calls = 0
+        self.fail_get = False
+        self.fail_set = False
+
+    def get(self, key):
+        self.get_calls += 1
+        if self.fail_get:
+            raise ConnectionError("redis is down")
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if self.fail_set:
+            raise ConnectionError("redis is down")
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class GeohashTests(SimpleTestCase):
+    def test_known_cell_and_its_centre(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, precision=6), "u4pruy")
+        latitude, longitude = geohash_center("u4pruy")
+        self.assertEqual(geohash_encode(latitude, longitude, precision=6), "u4pruy")
+
+    def test_neighbouring_farms_share_a_cell(self):
+        self.assertEqual(geohash_encode(31.1048, 77.1734), geohash_encode(31.1052, 77.1741))
+
+
+class ForecastCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = ForecastCache(self.redis, lock_seconds=2)
+        self.fetches = []
+
+    def fetch(self, latitude, longitude):
+        self.fetches.append((latitude, longitude))
+        return DAYS
+
+    def test_expiry_follows_the_refresh_boundary(self):
+        self.assertEqual(ForecastCache(refresh_seconds=3600).ttl(now=7200 + 600), 3000)
+
+    def test_second_question_in_the_cell_is_served_locally(self):
+        self.assertEqual(self.cache.get_or_fetch(31.1048, 77.1734, self.fetch), DAYS)
+        self.assertEqual(self.cache.get_or_fetch(31.1052, 77.1741, self.fetch), DAYS)
+
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(self.fetches[0], geohash_center(geohash_encode(31.1048, 77.1734)))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertNotIn(self.cache.key(geohash_encode(31.1048, 77.1734)) + ":lock", self.redis.values)
+
+    def test_other_workers_read_the_shared_tier(self):
+        self.cache.get_or_fetch(31.1048, 77.1734, self.fetch)
+
+        other = ForecastCache(self.redis)
+        self.assertEqual(other.get_or_fetch(31.1048, 77.1734, self.fetch), DAYS)
+        self.assertEqual((len(self.fetches), other.stats()["shared_hits"]), (1, 1))
+
+    def test_concurrent_misses_in_one_process_fetch_once(self):
+        started = threading.Event()
+
+        def slow_fetch(latitude, longitude):
+            started.set()
+            time.sleep(0.1)
+            return self.fetch(latitude, longitude)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_fetch(31.1, 77.17, slow_fetch)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((len(self.fetches), results), (1, [DAYS] * 5))
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        key = self.cache.key(geohash_encode(31.1, 77.17))
+        self.redis.values[key + ":lock"] = "1"
+        threading.Timer(0.15, lambda: self.redis.values.__setitem__(key, json.dumps(DAYS))).start()
+
+        self.assertEqual(self.cache.get_or_fetch(31.1, 77.17, self.fetch), DAYS)
+        self.assertEqual((self.fetches, self.cache.stats()["shared_waits"]), ([], 1))
+
+    def test_lock_states(self):
+        self.assertEqual(self.cache._acquire_shared_lock("k"), LOCK_ACQUIRED)
+        self.assertEqual(self.cache._acquire_shared_lock("k"), LOCK_HELD)
+        self.redis.fail_set = True
+        self.assertEqual(self.cache._acquire_shared_lock("other"), LOCK_UNAVAILABLE)
+        self.assertEqual(ForecastCache(None)._acquire_shared_lock("k"), LOCK_UNAVAILABLE)
+
+    def test_redis_outage_fetches_immediately(self):
+        self.redis.fail_get = self.redis.fail_set = True
+        started = time.monotonic()
+
+        self.assertEqual(self.cache.get_or_fetch(31.1, 77.17, self.fetch), DAYS)
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(self.cache.stats()["shared_waits"], 0)
+
+    def test_waiting_stops_at_the_first_redis_error(self):
+        key = self.cache.key(geohash_encode(31.1, 77.17))
+        self.redis.values[key + ":lock"] = "1"
+        get = self.redis.get
+
+        def get_then_fail(name):
+            if self.redis.get_calls >= 1:
+                self.redis.fail_get = True
+            return get(name)
+
+        self.redis.get = get_then_fail
+        started = time.monotonic()
+
+        self.assertEqual(self.cache.get_or_fetch(31.1, 77.17, self.fetch), DAYS)
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(self.redis.get_calls, 2)
+        self.assertEqual(self.cache.stats()["shared_errors"], 1)
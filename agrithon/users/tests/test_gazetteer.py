@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from users.gazetteer import Gazetteer, load_gazetteer
+
+DIRECTORY = """officename,pincode,Taluk,Districtname,statename,Latitude,Longitude
+Rampur Bushahr S.O,172001,Rampur,SHIMLA,HIMACHAL PRADESH,31.45,77.63
+Jhakri B.O,172201,Rampur,SHIMLA,HIMACHAL PRADESH,31.48,77.70
+Shimla G.P.O.,171001,Shimla (U),SHIMLA,HIMACHAL PRADESH,31.10,77.17
+Khanna S.O,141401,Khanna,LUDHIANA,PUNJAB,30.70,76.22
+Ludhiana H.O,141001,Ludhiana,LUDHIANA,PUNJAB,30.90,75.85
+Samrala S.O,141114,Samrala,LUDHIANA,PUNJAB,NA,NA
+,141002,Ludhiana,LUDHIANA,PUNJAB,30.9,75.8
+"""
+ALIASES = """name,pincode
+रामपुर,172001
+"""
+
+
+class GazetteerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        directory = os.path.join(cls.tmp.name, "directory.csv")
+        aliases = os.path.join(cls.tmp.name, "aliases.csv")
+        with open(directory, "w", encoding="utf-8") as f:
+            f.write(DIRECTORY)
+        with open(aliases, "w", encoding="utf-8") as f:
+            f.write(ALIASES)
+        db_path = os.path.join(cls.tmp.name, "gazetteer.sqlite3")
+        cls.loaded = load_gazetteer(db_path, [directory], [aliases])
+        cls.gazetteer = Gazetteer(db_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def test_offices_without_a_name_are_skipped(self):
+        self.assertEqual(self.loaded, 6)
+
+    def test_pincode_in_the_text_wins(self):
+        location = self.gazetteer.resolve("my pin is 172 001")
+        self.assertEqual((location.name, location.district), ("Rampur Bushahr", "Shimla"))
+        self.assertEqual(location.address()["village"], "Rampur Bushahr")
+
+    def test_misspelt_office_name_with_district(self):
+        location = self.gazetteer.resolve("vill. Rampur Bushair, distt Shimla")
+        self.assertEqual(location.name, "Rampur Bushahr")
+
+    def test_district_named_elsewhere_supports_the_office(self):
+        self.assertEqual(self.gazetteer.resolve("Khanna Ludhiana").name, "Khanna")
+        self.assertEqual(self.gazetteer.resolve("Jhakri, Shimla").name, "Jhakri")
+
+    def test_aliases_in_indic_scripts(self):
+        self.assertEqual(self.gazetteer.resolve("गांव रामपुर").pincode, "172001")
+
+    def test_offices_without_coordinates_take_their_district(self):
+        samrala = self.gazetteer.by_pincode("141114")
+        # Mean of Khanna and Ludhiana, the district's offices with coordinates.
+        self.assertAlmostEqual(samrala.latitude, 30.80)
+        self.assertAlmostEqual(samrala.longitude, 76.035)
+
+    def test_text_that_is_not_a_place_does_not_resolve(self):
+        self.assertIsNone(self.gazetteer.resolve("what is the best fertilizer for wheat"))
+        self.assertIsNone(self.gazetteer.resolve("what is the best fertilizer for wheat", pincode="141401"))
+        self.assertIsNone(self.gazetteer.by_pincode("999999"))
@@ -0,0 +1,115 @@
+import sys
+import types
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from users.history_store import InMemoryHistoryBackend, RedisHistoryBackend
+from users.rag_registry import RAGEngineRegistry
+
+
+class FakeRedis:
+    """Lists with the commands RedisChatMessageHistory uses."""
+    def __init__(self, fail: bool = False):
+        self.lists = {}
+        self.expiry = {}
+        self.fail = fail
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis is down")
+
+    def lrange(self, key, start, end):
+        self._check()
+        items = self.lists.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:] if end == -1 else self.lists[key][start:end + 1]
+
+    def expire(self, key, seconds):
+        self.expiry[key] = seconds
+
+    def delete(self, key):
+        self._check()
+        self.lists.pop(key, None)
+
+    def pipeline(self):
+        self._check()
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        for name, args in self.calls:
+            getattr(self.client, name)(*args)
+
+
+def add_turns(history, turns):
+    for turn in range(turns):
+        history.add_user_message(f"question {turn}")
+        history.add_ai_message(f"answer {turn}")
+
+
+class InMemoryHistoryBackendTests(SimpleTestCase):
+    def test_keeps_only_the_newest_turns(self):
+        history = InMemoryHistoryBackend(max_turns=2).get_history("s1")
+        add_turns(history, 3)
+        self.assertEqual([m.content for m in history.messages], ["question 1", "answer 1", "question 2", "answer 2"])
+
+    def test_least_recently_used_session_is_evicted(self):
+        backend = InMemoryHistoryBackend(max_sessions=2)
+        add_turns(backend.get_history("a"), 1)
+        backend.get_history("b")
+        backend.get_history("a")
+        backend.get_history("c")
+
+        self.assertEqual(len(backend.get_history("a").messages), 2)
+        self.assertEqual(backend.get_history("b").messages, [])
+        self.assertGreaterEqual(backend.stats()["evictions"], 1)
+
+    def test_idle_sessions_start_over(self):
+        backend = InMemoryHistoryBackend(ttl_seconds=60)
+        with mock.patch("users.history_store.time.monotonic", return_value=1000.0):
+            add_turns(backend.get_history("s1"), 1)
+        with mock.patch("users.history_store.time.monotonic", return_value=1061.0):
+            self.assertEqual(backend.get_history("s1").messages, [])
+        self.assertEqual(backend.stats()["expirations"], 1)
+
+
+class RedisHistoryBackendTests(SimpleTestCase):
+    def test_history_is_shared_trimmed_and_expiring(self):
+        client = FakeRedis()
+        add_turns(RedisHistoryBackend(client, ttl_seconds=300, max_turns=2).get_history("s1"), 3)
+
+        history = RedisHistoryBackend(client, max_turns=2).get_history("s1")
+
+        self.assertEqual([m.content for m in history.messages], ["question 1", "answer 1", "question 2", "answer 2"])
+        self.assertEqual(client.expiry["rag_history:s1"], 300)
+
+    def test_outage_reads_as_empty_history(self):
+        history = RedisHistoryBackend(FakeRedis(fail=True)).get_history("s1")
+        add_turns(history, 1)
+        self.assertEqual(history.messages, [])
+
+
+class HistoryBackendSettingTests(SimpleTestCase):
+    def test_registry_defaults_to_redis_like_settings(self):
+        client = FakeRedis()
+        django_redis = types.SimpleNamespace(get_redis_connection=lambda alias: client)
+        with mock.patch.dict(sys.modules, {"django_redis": django_redis}), \
+                mock.patch("django.conf.settings", types.SimpleNamespace()):
+            backend = RAGEngineRegistry({}).get_history_backend()
+
+        self.assertIsInstance(backend, RedisHistoryBackend)
+        self.assertIs(backend.client, client)
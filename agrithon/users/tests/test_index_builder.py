@@ -0,0 +1,94 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from users import index_builder
+from users.index_builder import CURRENT_LINK, build_index, current_version, load_source, read_manifest
+from users.index_store import MmapVectorStore
+
+
+class LengthEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class BuildIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "index")
+        self.sources = os.path.join(self.tmp.name, "sources")
+        os.makedirs(self.sources)
+        self.write("wheat.txt", "Sow wheat between 25 October and 15 November.")
+        self.write("prices.csv", "crop,modal\nonion,1850\ngarlic,\n")
+
+        self.embeddings = LengthEmbeddings()
+
+        def init_worker(model, base_url, endpoint):
+            index_builder._worker_embeddings = self.embeddings
+
+        # Threads instead of processes, with the Ollama client swapped for a fake.
+        patches = [
+            mock.patch.object(index_builder, "ProcessPoolExecutor", ThreadPoolExecutor),
+            mock.patch.object(index_builder, "_init_worker", init_worker),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.sources, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def build(self, **kwargs):
+        return build_index(self.root, [self.sources], log=lambda message: None, **kwargs)
+
+    def test_load_source_reads_csv_rows_without_empty_cells(self):
+        rows = load_source(os.path.join(self.sources, "prices.csv"))
+        self.assertEqual([text for text, _ in rows], ["crop: onion; modal: 1850", "crop: garlic"])
+
+    def test_first_build_publishes_v0001(self):
+        manifest = self.build()
+
+        self.assertEqual(manifest["version"], "v0001")
+        self.assertEqual(manifest["count"], 3)
+        self.assertEqual(os.readlink(os.path.join(self.root, CURRENT_LINK)), "v0001")
+        self.assertEqual(len(MmapVectorStore(current_version(self.root), embeddings=None)), 3)
+
+    def test_unchanged_sources_are_not_embedded_again(self):
+        self.build()
+        embedded = len(self.embeddings.texts)
+
+        manifest = self.build()
+
+        self.assertEqual(manifest["version"], "v0001")
+        self.assertEqual(len(self.embeddings.texts), embedded)
+
+    def test_new_files_create_a_new_version_with_only_new_chunks(self):
+        self.build()
+        self.write("rice.txt", "Transplant rice seedlings at 20 x 15 cm.")
+        self.write("copy.txt", "Sow wheat between 25 October and 15 November.")
+
+        manifest = self.build()
+
+        self.assertEqual(manifest["version"], "v0002")
+        self.assertEqual((manifest["added"], manifest["duplicates_skipped"], manifest["count"]), (1, 1, 4))
+        self.assertEqual(os.readlink(os.path.join(self.root, CURRENT_LINK)), "v0002")
+        self.assertEqual(read_manifest(os.path.join(self.root, "v0001"))["count"], 3)
+
+    def test_refuses_to_mix_embedding_endpoints(self):
+        self.build()
+        self.write("rice.txt", "Transplant rice seedlings at 20 x 15 cm.")
+
+        with self.assertRaises(ValueError):
+            self.build(endpoint=index_builder.BATCH_ENDPOINT)
+        self.assertEqual(self.build(endpoint=index_builder.BATCH_ENDPOINT, rebuild=True)["version"], "v0002")
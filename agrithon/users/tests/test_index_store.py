@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from users.index_store import (
+    META_FILE, MmapVectorStore, documents_for_rows, index_params, is_mmap_index, load_vector_store,
+    write_mmap_index,
+)
+
+
+class FixedEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0] if "wheat" in text else [0.0, 0.0, 1.0]
+
+
+class MmapIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "index")
+        self.vectors = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [0.9, 0.1, 0]], dtype=np.float32)
+        self.documents = [
+            Document(page_content="wheat sowing in november", metadata={"crop": "wheat"}),
+            Document(page_content="rice transplanting", metadata={"crop": "rice"}),
+            Document(page_content="onion storage", metadata={"crop": "onion"}),
+            Document(page_content="wheat irrigation schedule", metadata={"crop": "wheat"}),
+        ]
+        write_mmap_index(self.path, self.vectors, self.documents, extra_meta={"source": "test"})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_a_complete_directory(self):
+        self.assertTrue(is_mmap_index(self.path))
+        with open(os.path.join(self.path, META_FILE)) as f:
+            meta = json.load(f)
+        self.assertEqual((meta["count"], meta["dim"], meta["index_type"]), (4, 3, "flat"))
+        self.assertEqual(meta["source"], "test")
+
+    def test_flat_search_matches_brute_force(self):
+        store = MmapVectorStore(self.path, FixedEmbeddings())
+        query = np.array([0.95, 0.05, 0.0], dtype=np.float32)
+
+        rows, distances = store.search_rows(query, k=2)
+
+        expected = np.argsort(((self.vectors - query) ** 2).sum(axis=1))[:2]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        np.testing.assert_allclose(distances, ((self.vectors[expected] - query) ** 2).sum(axis=1), atol=1e-5)
+
+    def test_documents_come_back_in_row_order_with_metadata(self):
+        store = load_vector_store(self.path, FixedEmbeddings())
+        docs = documents_for_rows(store, [3, 0])
+        self.assertEqual([doc.page_content for doc in docs], ["wheat irrigation schedule", "wheat sowing in november"])
+        self.assertEqual(docs[0].metadata, {"crop": "wheat"})
+
+        results = store.similarity_search("wheat", k=1)
+        self.assertEqual(results[0].page_content, "wheat sowing in november")
+
+    def test_store_is_read_only(self):
+        store = MmapVectorStore(self.path, FixedEmbeddings())
+        with self.assertRaises(NotImplementedError):
+            store.add_texts(["new"])
+
+    def test_rejects_mismatched_inputs_and_unknown_params(self):
+        with self.assertRaises(ValueError):
+            write_mmap_index(os.path.join(self.tmp.name, "bad"), self.vectors[:2], self.documents)
+        with self.assertRaises(ValueError):
+            index_params("annoy")
+        with self.assertRaises(ValueError):
+            index_params("hnsw", {"nprobe": 4})
+        self.assertEqual(index_params("hnsw", {"ef_search": 128})["ef_search"], 128)
+
+    def test_hnsw_directory_searches_through_faiss(self):
+        path = os.path.join(self.tmp.name, "hnsw")
+        write_mmap_index(path, self.vectors, self.documents, index_type="hnsw", params={"M": 8})
+        store = MmapVectorStore(path, FixedEmbeddings(), search_params={"ef_search": 16})
+
+        rows, _ = store.search_rows(np.array([0.0, 0.0, 1.0], dtype=np.float32), k=1)
+
+        self.assertIsNotNone(store.ann_index)
+        self.assertEqual(rows.tolist(), [2])
+
+    def test_hnsw_index_is_memory_mapped(self):
+        import faiss
+
+        path = os.path.join(self.tmp.name, "hnsw")
+        write_mmap_index(path, self.vectors, self.documents, index_type="hnsw", params={"M": 8})
+        read_index = faiss.read_index
+        flags = []
+
+        def recording_read_index(filename, *args):
+            flags.append(args[0] if args else 0)
+            return read_index(filename, *args)
+
+        with mock.patch.object(faiss, "read_index", recording_read_index):
+            store = MmapVectorStore(path, FixedEmbeddings())
+
+        self.assertTrue(flags[0] & faiss.IO_FLAG_MMAP_IFC)
+        self.assertEqual(store.search_rows(np.array([0.0, 1.0, 0.0], dtype=np.float32), k=1)[0].tolist(), [1])
+
+    def test_ivfpq_reranks_candidates_exactly(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(200, 8)).astype(np.float32)
+        documents = [Document(page_content=f"chunk {row}") for row in range(200)]
+        path = os.path.join(self.tmp.name, "ivfpq")
+        write_mmap_index(path, vectors, documents, index_type="ivfpq", params={"nlist": 2, "m": 4, "nbits": 4})
+        store = MmapVectorStore(path, FixedEmbeddings(), search_params={"nprobe": 2, "rerank": 8})
+
+        rows, distances = store.search_rows(vectors[17], k=3)
+
+        self.assertEqual(int(rows[0]), 17)
+        self.assertAlmostEqual(float(distances[0]), 0.0, places=4)
+
+    def test_ivfpq_refuses_too_small_corpora(self):
+        with self.assertRaises(ValueError):
+            write_mmap_index(os.path.join(self.tmp.name, "tiny"), self.vectors, self.documents, index_type="ivfpq",
+                             params={"m": 3, "nbits": 4})
@@ -0,0 +1,48 @@
+from django.test import SimpleTestCase
+
+from users.intent_classifier import get_intent_classifier, normalize
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_drops_punctuation_and_emoji_and_squeezes_letters(self):
+        self.assertEqual(normalize("Hiii!!! 🙏 Namaste,  ji"), "hi namaste ji")
+
+    def test_keeps_indic_vowel_signs(self):
+        self.assertEqual(normalize("नमस्ते 🙏"), "नमस्ते")
+
+
+class IntentClassifierTests(SimpleTestCase):
+    def setUp(self):
+        self.classifier = get_intent_classifier()
+
+    def assertLabel(self, message, label, source):
+        prediction = self.classifier.classify(message)
+        self.assertIsNotNone(prediction, message)
+        self.assertEqual((prediction.label, prediction.source), (label, source), message)
+
+    def test_whole_message_lexicon_matches(self):
+        self.assertLabel("Namaste ji 🙏", "greeting", "lexicon")
+        self.assertLabel("hello, help me please", "help", "lexicon")
+        self.assertLabel("ਸਤ ਸ੍ਰੀ ਅਕਾਲ", "greeting", "lexicon")
+        self.assertLabel("Thank you so much", "ack", "lexicon")
+        self.assertLabel("2", "ack", "lexicon")
+
+    def test_greeting_with_a_question_is_not_a_greeting(self):
+        prediction = self.classifier.classify("hello, my wheat leaves have yellow rust")
+        self.assertTrue(prediction is None or prediction.label != "greeting")
+
+    def test_centroids_label_clear_questions(self):
+        self.assertLabel("aphids on my mustard", "pest", "centroid")
+        self.assertLabel("tomato mandi rate today", "crop_price", "centroid")
+
+    def test_unclear_messages_go_to_the_llm(self):
+        self.assertIsNone(self.classifier.classify(""))
+        self.assertIsNone(self.classifier.classify("🙏🙏"))
+        self.assertIsNone(self.classifier.classify("qwzx vbnm"))
+        self.assertGreater(self.classifier.stats()["low_confidence"], 0)
+
+    def test_centroids_never_decide_a_message_is_not_a_query(self):
+        for message in ("can you help me with my cotton crop", "how are you"):
+            with self.subTest(message=message):
+                self.assertIsNone(self.classifier.classify(message))
+        self.assertGreater(self.classifier.stats()["non_query_deferred"], 0)
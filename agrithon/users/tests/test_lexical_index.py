@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from users.index_store import MmapVectorStore, write_mmap_index
+from users.lexical_index import BM25Index, HybridRetriever, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "Spray Confidor 200 SL for aphids on cotton.",
+    "Amistar Top controls blast in paddy.",
+    "Colonel-S is a sulphur fungicide for powdery mildew.",
+    "Irrigate wheat at crown root initiation.",
+]
+
+
+class OneHotEmbeddings:
+    """Embeds every query onto the wheat chunk, so only BM25 can find the brand names."""
+    def embed_query(self, text):
+        return [0.0, 0.0, 0.0, 1.0]
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_hyphenated_words_are_kept_and_split(self):
+        self.assertEqual(tokenize("Colonel-S, ＣＯＮＦＩＤＯＲ"), ["colonel-s", "colonel", "s", "confidor"])
+
+
+class BM25IndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index.build(TEXTS)
+
+    def test_exact_brand_names_rank_first(self):
+        rows, scores = self.index.search("which dose of confidor", k=2)
+        self.assertEqual(rows.tolist(), [0])
+        self.assertGreater(scores[0], 0)
+
+    def test_unknown_terms_return_nothing(self):
+        rows, _ = self.index.search("tractor subsidy")
+        self.assertEqual(len(rows), 0)
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "lexical.npz")
+            self.index.save(path)
+            loaded = BM25Index.load(path)
+        self.assertEqual(loaded.search("colonel-s")[0].tolist(), self.index.search("colonel-s")[0].tolist())
+
+
+class FusionTests(SimpleTestCase):
+    def test_rows_found_by_both_rankers_win(self):
+        self.assertEqual(reciprocal_rank_fusion([[1, 2, 3], [3, 1]])[:2], [1, 3])
+
+    def test_hybrid_retriever_surfaces_lexical_hits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_mmap_index(tmp, np.eye(4, dtype=np.float32), [Document(page_content=text) for text in TEXTS])
+            store = MmapVectorStore(tmp, OneHotEmbeddings())
+            retriever = HybridRetriever(vectorstore=store, lexical_index=BM25Index.build(TEXTS), k=2, candidates=1)
+
+            docs = retriever.invoke("Amistar dose")
+            rows, best_distance = retriever.search("Amistar dose")
+
+        self.assertEqual({doc.page_content for doc in docs}, {TEXTS[1], TEXTS[3]})
+        self.assertEqual(sorted(rows), [1, 3])
+        self.assertAlmostEqual(best_distance, 0.0)
@@ -0,0 +1,158 @@
+import asyncio
+
+from django.test import SimpleTestCase
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+
+from users.llm_cache import CachedStructuredOutput, LLMResponseCache, prompt_text, schema_fingerprint
+
+
+class Label(BaseModel):
+    intent: str
+
+
+class OtherLabel(BaseModel):
+    intent: str
+    confidence: float
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.fail = False
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        value = self.values.get(key)
+        return value.encode("utf-8") if value is not None else None
+
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        self.values[key] = value
+        self.ttls[key] = ex
+
+
+class FakeRunnable:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def invoke(self, prompt, config=None, **kwargs):
+        self.calls += 1
+        return self.result
+
+    async def ainvoke(self, prompt, config=None, **kwargs):
+        self.calls += 1
+        return self.result
+
+
+class KeyTests(SimpleTestCase):
+    def test_key_covers_model_temperature_schema_and_prompt(self):
+        cache = LLMResponseCache()
+        base = cache.key("gemini", 0, "abc", "hi")
+        self.assertEqual(base, cache.key("gemini", 0.0, "abc", "hi"))
+        self.assertEqual(len({
+            base,
+            cache.key("gemini-pro", 0, "abc", "hi"),
+            cache.key("gemini", 0.2, "abc", "hi"),
+            cache.key("gemini", 0, "def", "hi"),
+            cache.key("gemini", 0, "abc", "hello"),
+        }), 5)
+
+    def test_schema_fingerprint_changes_with_fields(self):
+        self.assertEqual(schema_fingerprint(Label), schema_fingerprint(Label))
+        self.assertNotEqual(schema_fingerprint(Label), schema_fingerprint(OtherLabel))
+
+    def test_prompt_text_of_messages_and_prompt_values(self):
+        messages = [SystemMessage(content="classify"), HumanMessage(content="1")]
+        prompt = ChatPromptTemplate.from_messages([("system", "classify"), ("human", "{text}")])
+        self.assertEqual(prompt_text(messages), prompt_text(prompt.invoke({"text": "1"})))
+        self.assertNotEqual(prompt_text(messages), prompt_text([HumanMessage(content="1")]))
+        self.assertEqual(prompt_text("hi"), "hi")
+
+
+class LLMResponseCacheTests(SimpleTestCase):
+    def test_local_hit(self):
+        cache = LLMResponseCache()
+        cache.set("k", Label(intent="greeting"))
+        self.assertEqual(cache.get("k", Label), Label(intent="greeting"))
+        self.assertIsNone(cache.get("other", Label))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_shared_hit_fills_the_local_tier(self):
+        redis = FakeRedis()
+        LLMResponseCache(redis, ttl_seconds=60).set("k", Label(intent="price"))
+        self.assertEqual(redis.ttls["k"], 60)
+
+        cache = LLMResponseCache(redis)
+        self.assertEqual(cache.get("k", Label), Label(intent="price"))
+        redis.fail = True
+        self.assertEqual(cache.get("k", Label), Label(intent="price"))
+        stats = cache.stats()
+        self.assertEqual((stats["shared_hits"], stats["hits"], stats["shared_errors"]), (1, 1, 0))
+
+    def test_unreadable_shared_entry_is_a_miss(self):
+        redis = FakeRedis()
+        redis.values["k"] = '{"intent": "price"}'
+        cache = LLMResponseCache(redis)
+        self.assertIsNone(cache.get("k", OtherLabel))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_redis_errors_are_misses(self):
+        redis = FakeRedis()
+        redis.fail = True
+        cache = LLMResponseCache(redis)
+        cache.set("k", Label(intent="price"))
+        self.assertIsNone(cache.get("missing", Label))
+        self.assertEqual(cache.stats()["shared_errors"], 2)
+
+    def test_local_tier_is_bounded(self):
+        cache = LLMResponseCache(local_max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, Label(intent=key))
+        self.assertIsNone(cache.get("a", Label))
+        self.assertEqual(cache.stats()["local_entries"], 2)
+
+    def test_expired_entries_are_dropped(self):
+        cache = LLMResponseCache(ttl_seconds=-1)
+        cache.set("k", Label(intent="price"))
+        self.assertIsNone(cache.get("k", Label))
+        self.assertEqual(cache.stats()["local_entries"], 0)
+
+
+class CachedStructuredOutputTests(SimpleTestCase):
+    def wrap(self, runnable, cache=None):
+        return CachedStructuredOutput(runnable, cache or LLMResponseCache(), "gemini", 0, Label)
+
+    def test_invoke_calls_the_llm_once_per_prompt(self):
+        runnable = FakeRunnable(Label(intent="greeting"))
+        cached = self.wrap(runnable)
+        self.assertEqual(cached.invoke("hi"), Label(intent="greeting"))
+        self.assertEqual(cached.invoke("hi"), Label(intent="greeting"))
+        self.assertEqual(runnable.calls, 1)
+        cached.invoke("hello")
+        self.assertEqual(runnable.calls, 2)
+
+    def test_ainvoke_shares_the_cache(self):
+        runnable = FakeRunnable(Label(intent="greeting"))
+        cached = self.wrap(runnable)
+        cached.invoke("hi")
+        self.assertEqual(asyncio.run(cached.ainvoke("hi")), Label(intent="greeting"))
+        asyncio.run(cached.ainvoke("hello"))
+        asyncio.run(cached.ainvoke("hello"))
+        self.assertEqual(runnable.calls, 2)
+
+    def test_results_of_other_types_are_not_cached(self):
+        runnable = FakeRunnable({"intent": "greeting"})
+        cache = LLMResponseCache()
+        cached = self.wrap(runnable, cache)
+        cached.invoke("hi")
+        cached.invoke("hi")
+        self.assertEqual(runnable.calls, 2)
+        self.assertEqual(cache.stats()["stores"], 0)
@@ -0,0 +1,106 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from pydantic import BaseModel
+
+from users.llm_cache import CachedStructuredOutput, LLMResponseCache
+from users.llm_pool import CircuitBreaker, LLMPool, LLMUnavailableError
+
+
+class ScriptedChatModel(FakeListChatModel):
+    """Answers from `responses`; a response of "ERROR" raises instead."""
+    def _call(self, *args, **kwargs):
+        response = super()._call(*args, **kwargs)
+        if response == "ERROR":
+            raise ConnectionError("gemini is down")
+        return response
+
+
+def factory(responses):
+    def build(callbacks, **options):
+        return ScriptedChatModel(responses=responses, callbacks=callbacks)
+    return build
+
+
+class Label(BaseModel):
+    label: str
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures_and_half_opens_later(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        with mock.patch("users.llm_pool.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        with mock.patch("users.llm_pool.time.monotonic", return_value=131.0):
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, "half_open")
+            self.assertFalse(breaker.allow())  # only one trial call at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0)
+        breaker.state = "open"
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+
+class LLMPoolTests(SimpleTestCase):
+    def test_clients_are_shared_per_profile(self):
+        pool = LLMPool({"chat": {}}, factory=factory(["hi"]))
+        self.assertIs(pool.get("chat"), pool.get("chat"))
+        with self.assertRaises(KeyError):
+            pool.get("unknown")
+
+    def test_open_circuit_rejects_calls_without_calling_the_model(self):
+        pool = LLMPool({"chat": {}}, breaker={"failure_threshold": 2, "reset_seconds": 60},
+                       factory=factory(["ERROR", "ERROR", "never sent"]))
+        llm = pool.get("chat")
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                llm.invoke("hello")
+
+        with self.assertRaises(LLMUnavailableError):
+            llm.invoke("hello")
+        stats = pool.stats()["chat"]
+        self.assertEqual((stats["failures"], stats["rejected_open"], stats["circuit"]), (2, 1, "open"))
+
+    def test_busy_profile_rejects_instead_of_queueing(self):
+        pool = LLMPool({"chat": {"max_concurrency": 1, "queue_timeout": 0.01}}, factory=factory(["ok"]))
+        llm = pool.get("chat")
+        guard = llm.callbacks[0]
+        guard._acquire("other-run")  # a call already in flight
+        try:
+            with self.assertRaises(LLMUnavailableError):
+                llm.invoke("hello")
+        finally:
+            guard._release("other-run", failed=False)
+
+        self.assertEqual(llm.invoke("hello").content, "ok")
+        self.assertEqual(pool.stats()["chat"]["rejected_busy"], 1)
+
+    def test_slots_are_returned_after_concurrent_calls(self):
+        pool = LLMPool({"chat": {"max_concurrency": 2, "queue_timeout": 5}}, factory=factory(["ok"]))
+        llm = pool.get("chat")
+        threads = [threading.Thread(target=llm.invoke, args=("hello",)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = pool.stats()["chat"]
+        self.assertEqual((stats["calls"], stats["in_flight"]), (6, 0))
+
+    def test_only_temperature_zero_classification_profiles_are_cached(self):
+        profiles = {"classifier": {"temperature": 0, "classification": True}, "chat": {"temperature": 0.7}}
+        pool = LLMPool(profiles, factory=factory(["ok"]), response_cache=LLMResponseCache())
+        with mock.patch.object(ScriptedChatModel, "with_structured_output", return_value=mock.Mock()):
+            self.assertIsInstance(pool.structured("classifier", Label), CachedStructuredOutput)
+            self.assertNotIsInstance(pool.structured("chat", Label), CachedStructuredOutput)
+            self.assertIs(pool.structured("classifier", Label), pool.structured("classifier", Label))
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from users.price_store import MandiPriceStore, format_price_summary, load_price_csvs
+
+CSV = """State,District,Market,Commodity,Variety,Arrival_Date,Min_x0020_Price,Max_x0020_Price,Modal_x0020_Price
+Maharashtra,Nashik,Lasalgaon,Onion,Red,05/01/2024,1000,1600,1400
+Maharashtra,Nashik,Lasalgaon,Onion,Red,20/01/2024,1200,1800,1600
+Maharashtra,Nashik,Pimpalgaon,Onion,Red,10/02/2024,1300,2000,1650
+Maharashtra,Pune,Pune,Onion,Red,11/03/2024,,,
+Himachal Pradesh,Shimla,Shimla,Apple,Royal,12/03/2024,"4,000","8,000","6,500"
+Maharashtra,Nashik,Lasalgaon,,Red,12/03/2024,1,2,3
+"""
+
+
+class MandiPriceStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(self.tmp.name, "prices.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write(CSV)
+        db_path = os.path.join(self.tmp.name, "prices.sqlite3")
+        self.loaded = load_price_csvs(db_path, [csv_path])
+        self.store = MandiPriceStore(db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rows_without_a_commodity_are_skipped(self):
+        self.assertEqual(self.loaded, 5)
+
+    def test_names_resolve_fuzzily(self):
+        self.assertEqual(self.store.match("commodity", "onions"), "Onion")
+        self.assertEqual(self.store.match("state", "himachal"), "Himachal Pradesh")
+        self.assertIsNone(self.store.match("commodity", "saffron"))
+
+    def test_month_names_resolve_to_the_latest_year_with_data(self):
+        self.assertEqual(self.store.resolve_month("January", "Onion"), "2024-01")
+        self.assertEqual(self.store.resolve_month("March 2023", "Onion"), "2023-03")
+        self.assertIsNone(self.store.resolve_month("", "Onion"))
+
+    def test_summary_has_monthly_trend_and_change(self):
+        summary = self.store.price_summary("onion", state="maharashtra", district="nashik")
+
+        self.assertEqual([month["month"] for month in summary["months"]], ["2024-01", "2024-02"])
+        self.assertEqual(summary["months"][0]["modal_price"], 1500.0)
+        self.assertEqual(summary["months"][1]["change_pct"], 10.0)
+        self.assertIn("Min 1300, Max 2000, average modal 1650", format_price_summary(summary))
+
+    def test_unknown_district_widens_to_the_state(self):
+        summary = self.store.price_summary("apple", state="himachal", district="kullu")
+        self.assertEqual((summary["state"], summary["district"]), ("Himachal Pradesh", None))
+        self.assertEqual(summary["months"][-1]["modal_price"], 6500.0)
+
+    def test_months_without_prices_format_as_not_available(self):
+        summary = self.store.price_summary("onion", state="maharashtra")
+        self.assertIsNone(summary["months"][-1]["modal_price"])
+
+        text = format_price_summary(summary)
+
+        self.assertIn("Min N/A, Max N/A, average modal N/A", text)
+        self.assertIn("- 2024-02: 1650 (+10.0% vs previous month)", text)
+        self.assertNotIn("- 2024-03", text)
+
+    def test_missing_database_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            MandiPriceStore(os.path.join(self.tmp.name, "missing.sqlite3"))
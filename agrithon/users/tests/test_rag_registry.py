@@ -0,0 +1,52 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from users.rag_registry import RAGEngineRegistry
+
+
+class RAGEngineRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = RAGEngineRegistry({"price": "/indexes/price", "pesticide": "/indexes/pesticide"})
+
+    def test_nothing_is_loaded_until_first_use(self):
+        self.assertFalse(self.registry.is_warm("price"))
+        self.assertEqual(self.registry.status()["price"]["warm"], False)
+        self.assertEqual(self.registry.cache_stats(), {})
+
+    def test_unknown_engine_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            self.registry.get("weather")
+
+    def test_concurrent_gets_build_each_engine_once(self):
+        barrier = threading.Barrier(8)
+        engines = []
+
+        def build(name):
+            return mock.Mock(name=name, relevance_gate=None, context_compressor=None, speculator=None)
+
+        with mock.patch.object(self.registry, "_build", side_effect=build) as built:
+            def worker():
+                barrier.wait()
+                engines.append(self.registry.get("price"))
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(built.call_count, 1)
+        self.assertTrue(all(engine is engines[0] for engine in engines))
+        self.assertTrue(self.registry.is_warm("price"))
+        self.assertFalse(self.registry.is_warm("pesticide"))
+
+    def test_warm_up_swallows_failures_and_get_retries(self):
+        with mock.patch.object(self.registry, "_build", side_effect=RuntimeError("index missing")):
+            self.registry.warm_up(["price"])
+        self.assertFalse(self.registry.is_warm("price"))
+
+        engine = mock.Mock(relevance_gate=None, context_compressor=None, speculator=None)
+        with mock.patch.object(self.registry, "_build", return_value=engine):
+            self.assertIs(self.registry.get("price"), engine)
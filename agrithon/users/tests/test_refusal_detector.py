@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from users import refusal_detector
+from users.refusal_detector import RefusalDetector, _tail_lines, load_examples
+
+CONFIDENT = (
+    "For whitefly in cotton, install yellow sticky traps (10 per acre) and spray Neem oil 5 ml per litre. "
+    "If the count crosses 6-8 adults per leaf, spray Flonicamid 50 WG at 60 g per acre."
+)
+
+
+def examples():
+    with open(refusal_detector.EXAMPLES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RefusalDetectorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.detector = RefusalDetector(examples(), audit_rate=0.0)
+
+    def test_flags_refusal_phrases(self):
+        result = self.detector.check("Unfortunately, the provided context does not contain any details on that crop.")
+        self.assertTrue(result.flagged)
+        self.assertEqual(result.reason, "pattern")
+
+    def test_flags_short_answers(self):
+        result = self.detector.check("Maybe.")
+        self.assertTrue(result.flagged)
+        self.assertEqual(result.reason, "short")
+
+    def test_clears_confident_answers(self):
+        result = self.detector.check(CONFIDENT)
+        self.assertFalse(result.flagged)
+        self.assertLess(result.score, self.detector.threshold)
+
+    def test_classifier_flag_above_threshold(self):
+        detector = RefusalDetector(examples(), threshold=0.0)
+        self.assertEqual(detector.check(CONFIDENT).reason, "classifier")
+
+    def test_review_skips_unflagged_answers(self):
+        detector = RefusalDetector(examples(), audit_rate=0.0)
+        regenerate = mock.Mock(return_value="rewritten")
+        self.assertEqual(detector.review(CONFIDENT, "whitefly?", regenerate), CONFIDENT)
+        regenerate.assert_not_called()
+        self.assertEqual(detector.stats()["skipped"], 1)
+
+    def test_review_counts_guardrail_outcomes(self):
+        detector = RefusalDetector(examples(), audit_rate=0.0)
+        answer = "I'm sorry, I don't have information about that."
+        reviewed = detector.review(answer, "q", lambda: "Spray Mancozeb 2.5 g per litre at the first sign of spots.")
+        self.assertTrue(reviewed.startswith("Spray"))
+        detector.review(answer, "q", lambda: answer)
+        stats = detector.stats()
+        self.assertEqual(stats["flagged_pattern"], 2)
+        self.assertEqual((stats["true_positives"], stats["false_positives"]), (1, 1))
+
+    def test_is_rewrite_ignores_formatting(self):
+        self.assertFalse(RefusalDetector.is_rewrite(CONFIDENT, f"**{CONFIDENT}**\n"))
+        self.assertTrue(RefusalDetector.is_rewrite("I don't know.", CONFIDENT))
+
+    def test_save_and_load_keep_scores(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model")
+            self.detector.save(path)
+            loaded = RefusalDetector.load(path, threshold=0.7)
+        self.assertEqual(loaded.threshold, 0.7)
+        for answer in (CONFIDENT, "Sorry, no data."):
+            self.assertAlmostEqual(loaded.score(answer), self.detector.score(answer), places=5)
+
+    def test_load_rejects_other_features(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.npz")
+            self.detector.save(path)
+            with mock.patch.object(refusal_detector, "REFUSAL_PATTERNS", refusal_detector.REFUSAL_PATTERNS[:1]):
+                with self.assertRaises(ValueError):
+                    RefusalDetector.load(path)
+
+
+class LoadExamplesTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log_path = os.path.join(tmp.name, "outcomes.jsonl")
+        with open(self.log_path, "w", encoding="utf-8") as f:
+            for i in range(50):
+                f.write(json.dumps({"answer": f"answer {i}", "refusal": i % 2 == 0}) + "\n")
+            f.write("not json\n")
+
+    def test_tail_lines_reads_only_the_end(self):
+        lines = _tail_lines(self.log_path, 3, block_size=16)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])["answer"], "answer 48")
+        self.assertEqual(lines[-1], "not json")
+        self.assertEqual(_tail_lines(self.log_path, 0), [])
+        self.assertEqual(len(_tail_lines(self.log_path, 1000)), 51)
+
+    def test_load_examples_caps_the_log(self):
+        seeded = len(examples())
+        loaded = load_examples(self.log_path, max_records=11)
+        self.assertEqual(len(loaded), seeded + 10)  # the unreadable line is skipped
+        self.assertEqual(loaded[seeded]["answer"], "answer 40")
+        self.assertEqual(len(load_examples(None)), seeded)
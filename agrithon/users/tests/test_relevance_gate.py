@@ -0,0 +1,51 @@
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from users.relevance_gate import RelevanceGate, content_words, keyword_overlap
+
+
+class KeywordOverlapTests(SimpleTestCase):
+    def test_content_words_drop_stopwords_numbers_and_single_letters(self):
+        self.assertEqual(content_words("What is the best fungicide for wheat in 2024, a?"), {"fungicide", "wheat"})
+
+    def test_overlap_is_the_share_of_query_words_found(self):
+        self.assertEqual(keyword_overlap("wheat rust fungicide", "Yellow rust in wheat"), 2 / 3)
+        self.assertEqual(keyword_overlap("how to?", "anything"), 0.0)
+
+
+class RelevanceGateTests(SimpleTestCase):
+    def setUp(self):
+        self.gate = RelevanceGate("pesticide", max_distance=0.8, min_keyword_overlap=0.2)
+        self.docs = [Document(page_content="Spray Confidor for aphids on cotton.")]
+
+    def test_no_documents_is_irrelevant(self):
+        decision = self.gate.evaluate("aphids on cotton", [], None)
+        self.assertFalse(decision.relevant)
+        self.assertEqual(decision.reason, "no_documents")
+
+    def test_far_hit_without_keywords_is_gated(self):
+        decision = self.gate.evaluate("tractor loan subsidy", self.docs, best_distance=1.2)
+        self.assertFalse(decision.relevant)
+        self.assertEqual(decision.reason, "far_and_no_keywords")
+
+    def test_either_signal_keeps_the_rag_path(self):
+        self.assertTrue(self.gate.evaluate("tractor loan subsidy", self.docs, best_distance=0.3).relevant)
+        self.assertTrue(self.gate.evaluate("aphids on cotton", self.docs, best_distance=1.2).relevant)
+        self.assertEqual(self.gate.stats(), {"passed": 2, "gated": 0, "gated_ratio": 0.0})
+
+    def test_without_a_distance_threshold_only_keywords_count(self):
+        gate = RelevanceGate("price", max_distance=None)
+        self.assertEqual(gate.evaluate("tractor loan", self.docs, best_distance=0.01).reason, "no_keywords")
+
+    def test_weak_keyword_match_far_away_is_gated(self):
+        # BM25 hits always share a word with the question; one shared word in four is not enough.
+        decision = self.gate.evaluate("cotton tractor loan subsidy", self.docs, best_distance=1.2)
+        self.assertEqual(decision.keyword_overlap, 0.25)
+        self.assertEqual(RelevanceGate("pesticide", max_distance=0.8).evaluate(
+            "cotton tractor loan subsidy", self.docs, best_distance=1.2).reason, "far_and_no_keywords")
+
+    def test_log_does_not_contain_the_question(self):
+        with self.assertLogs("users.relevance_gate", level="INFO") as logs:
+            self.gate.evaluate("my phone number is 9876543210", self.docs, best_distance=0.3)
+        self.assertNotIn("9876543210", logs.output[0])
+        self.assertIn("query_chars=29", logs.output[0])
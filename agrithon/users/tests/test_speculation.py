@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from users.speculation import FallbackSpeculator
+
+DOCS = [Document(page_content="Yellow rust in wheat: spray propiconazole at 1 ml per litre.")]
+
+
+class PredictionTests(SimpleTestCase):
+    def setUp(self):
+        self.speculator = FallbackSpeculator("price", min_observations=2)
+
+    def test_unseen_topics_use_live_data_words_and_keyword_overlap(self):
+        self.assertTrue(self.speculator.predict("today's onion rate in Nashik", DOCS))
+        self.assertTrue(self.speculator.predict("goat shed design", DOCS))
+        self.assertFalse(self.speculator.predict("propiconazole dose for wheat yellow rust", DOCS))
+
+    def test_seen_topics_use_their_fallback_rate(self):
+        for _ in range(2):
+            self.speculator.record("goat shed design", fell_back=False)
+        self.assertFalse(self.speculator.predict("Goat shed design?", DOCS))
+
+        for _ in range(3):
+            self.speculator.record("propiconazole dose for wheat yellow rust", fell_back=True)
+        self.assertTrue(self.speculator.predict("propiconazole dose for wheat yellow rust", DOCS))
+        self.assertEqual(self.speculator.stats()["missed_fallbacks"], 3)
+
+
+class RunTests(SimpleTestCase):
+    def setUp(self):
+        self.speculator = FallbackSpeculator("price")
+
+    def test_fallback_uses_the_web_answer_started_alongside(self):
+        rag_response, web_response = self.speculator.run(
+            "onion price", lambda: (time.sleep(0.05), "SEARCH_NEEDED: no data")[1],
+            lambda: (time.sleep(0.05), "₹1,850/quintal")[1],
+        )
+
+        self.assertEqual((rag_response, web_response), ("SEARCH_NEEDED: no data", "₹1,850/quintal"))
+        stats = self.speculator.stats()
+        self.assertEqual(stats["fallback_won"], 1)
+        self.assertGreater(stats["saved_llm_seconds"], 0)
+
+    def test_rag_answer_discards_the_web_call(self):
+        release = threading.Event()
+        web_calls = []
+
+        def web_call():
+            web_calls.append(1)
+            release.wait(1)
+            return "web"
+
+        rag_response, web_response = self.speculator.run("onion price", lambda: "RAG answer", web_call)
+        release.set()
+
+        self.assertEqual((rag_response, web_response), ("RAG answer", None))
+        self.assertEqual(self.speculator.stats()["rag_won"], 1)
+
+    def test_async_run_cancels_the_losing_web_call(self):
+        cancelled = []
+
+        async def rag_call():
+            await asyncio.sleep(0.01)
+            return "RAG answer"
+
+        async def web_call():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "web"
+
+        result = asyncio.run(self.speculator.arun("onion price", rag_call, web_call))
+
+        self.assertEqual(result, ("RAG answer", None))
+        self.assertEqual(cancelled, [True])
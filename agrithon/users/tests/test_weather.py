@@ -0,0 +1,81 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+from langchain_core.messages import AIMessage
+
+from users.weather import WeatherService, WeatherUnavailableError, format_forecast, forecast_window
+
+
+def forecast_day(day: int, rain: int = None):
+    daytime = {"weatherCondition": {"description": {"text": "Sunny"}}}
+    if rain is not None:
+        daytime["precipitation"] = {"probability": {"percent": rain}}
+    return {
+        "interval": {"startTime": f"2025-10-{day:02d}T00:00:00Z"},
+        "maxTemperature": {"degrees": 31}, "minTemperature": {"degrees": 20},
+        "daytimeForecast": daytime,
+    }
+
+
+DAYS = [forecast_day(day, rain=10 * day) for day in range(19, 29)]
+
+
+class ForecastWindowTests(SimpleTestCase):
+    def test_day_words_in_english_hinglish_and_hindi(self):
+        self.assertEqual(forecast_window("Will it rain tomorrow?"), (1, 1))
+        self.assertEqual(forecast_window("kal barish hogi kya"), (1, 1))
+        self.assertEqual(forecast_window("परसों मौसम कैसा रहेगा"), (2, 1))
+        self.assertEqual(forecast_window("aaj ka mausam"), (0, 1))
+        self.assertEqual(forecast_window("is hafte barish"), (0, 7))
+
+    def test_day_counts_are_capped(self):
+        self.assertEqual(forecast_window("weather for the next 5 days"), (0, 5))
+        self.assertEqual(forecast_window("forecast for 30 days"), (0, 10))
+        self.assertEqual(forecast_window("weather please"), (0, 3))
+
+
+class FormatForecastTests(SimpleTestCase):
+    def test_one_line_per_day_with_optional_rain(self):
+        text = format_forecast([forecast_day(19, rain=10), forecast_day(20)])
+        self.assertEqual(text.splitlines(), [
+            "📅 Sunday, Oct 19: 🌡️ 20°C / 31°C, 🌧️ 10% rain, ☀️ Sunny",
+            "📅 Monday, Oct 20: 🌡️ 20°C / 31°C, ☀️ Sunny",
+        ])
+
+
+class WeatherServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.service = WeatherService("key")
+        self.response = mock.Mock()
+        self.response.json.return_value = {"forecastDays": DAYS}
+        patcher = mock.patch.object(self.service._session, "get", return_value=self.response)
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_answer_slices_the_requested_days_from_one_call(self):
+        answer = self.service.answer("Will it rain day after tomorrow?", 31.1, 77.2)
+
+        self.assertEqual(answer, format_forecast(DAYS[2:3]))
+        self.assertEqual(self.get.call_count, 1)
+        self.assertEqual(self.get.call_args.kwargs["params"]["days"], 3)
+
+    def test_api_errors_raise_weather_unavailable(self):
+        self.response.raise_for_status.side_effect = requests.HTTPError("500")
+        with self.assertRaises(WeatherUnavailableError):
+            self.service.forecast(31.1, 77.2, 3)
+        self.assertEqual(self.service.stats()["api_errors"], 1)
+
+    def test_missing_api_key_raises_without_calling(self):
+        with self.assertRaises(WeatherUnavailableError):
+            WeatherService("").forecast(31.1, 77.2, 3)
+
+    def test_phrasing_falls_back_to_the_template(self):
+        llm = mock.Mock()
+        llm.invoke.return_value = AIMessage(content="Light rain tomorrow; delay spraying.")
+        self.service._llm = llm
+        self.assertTrue(self.service.answer("rain tomorrow?", 31.1, 77.2).startswith("Light rain tomorrow"))
+
+        llm.invoke.side_effect = TimeoutError("slow")
+        self.assertEqual(self.service.answer("rain tomorrow?", 31.1, 77.2), format_forecast(DAYS[1:2]))
+        self.assertEqual(self.service.stats()["phrasing_errors"], 1)
@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+# The module builds its structured classifier client at import time.
+with mock.patch("users.llm_pool.get_structured_llm"):
+    from users import whatsapp_bot_handler
+from users.whatsapp_bot_handler import (
+    AddressExtractionResult, ClassifiedMessage, FarmingQuery, GreetingCheckResult, MessageClassification,
+    PINCODECheckResult,
+)
+
+CLASSIFICATION = MessageClassification(
+    is_greeting=False, is_pincode=True, pincode="171001", is_address=True, state="Himachal Pradesh",
+    district="Shimla", city="", village="Rampur", is_query=True, query_summary="Apple scab on leaves.",
+    query_type="disease",
+)
+
+
+class ClassifiedMessageTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(whatsapp_bot_handler, "classify_message", return_value=CLASSIFICATION)
+        self.classify_message = patcher.start()
+        self.addCleanup(patcher.stop)
+        # No local intent prediction, so every check needs the combined classification.
+        classifier = mock.Mock()
+        classifier.classify.return_value = None
+        patcher = mock.patch.object(whatsapp_bot_handler, "get_intent_classifier", return_value=classifier)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_classifies_at_most_once_per_message(self):
+        message = ClassifiedMessage("Rampur, Shimla. My apple leaves have black spots")
+
+        message.greeting()
+        message.pincode()
+        message.address()
+        message.farmer_query()
+
+        self.classify_message.assert_called_once_with("Rampur, Shimla. My apple leaves have black spots")
+
+    def test_maps_fields_into_each_result(self):
+        message = ClassifiedMessage("Village Rampur near Shimla, apple leaves have scab")
+
+        self.assertEqual(message.greeting(), GreetingCheckResult(is_greeting=False))
+        self.assertEqual(message.pincode(), PINCODECheckResult(is_pincode=True, pincode="171001"))
+        self.assertEqual(message.address(), AddressExtractionResult(
+            is_address=True, state="Himachal Pradesh", district="Shimla", city="", village="Rampur",
+        ))
+        self.assertEqual(message.farmer_query(), FarmingQuery(
+            is_query=True, query_summary="Apple scab on leaves.", query_type="disease",
+        ))
+
+    def test_pincode_regex_skips_the_llm(self):
+        for text, pincode in (("my pincode is 141001", "141001"), ("141 001", "141001"), ("pin: 141-001", "141001")):
+            with self.subTest(text=text):
+                self.assertEqual(ClassifiedMessage(text).pincode(), PINCODECheckResult(is_pincode=True, pincode=pincode))
+        self.classify_message.assert_not_called()
+
+    def test_phone_numbers_are_not_pincodes(self):
+        ClassifiedMessage("call me on 98765 43210").pincode()
+        self.classify_message.assert_called_once()
+
+    def test_local_predictions_skip_the_llm(self):
+        classifier = whatsapp_bot_handler.get_intent_classifier()
+        classifier.classify.return_value = mock.Mock(label="greeting")
+        message = ClassifiedMessage("namaste")
+
+        self.assertTrue(message.greeting().is_greeting)
+        self.assertFalse(message.farmer_query().is_query)
+        self.classify_message.assert_not_called()
@@ -1,6 +1,6 @@
 
 from django.urls import path
-from .views import CreateUserView, PhoneChecker, WhatsappChatManager, home,CallBotManager,AppSmsHandler,SaveDataToDatabase,SaveAppHistory,AppChatManager,FarmerCropAPIView,ChatHistoryView
+from .views import CreateUserView, PhoneChecker, WhatsappChatManager, home,CallBotManager,AppSmsHandler,SaveDataToDatabase,SaveAppHistory,AppChatManager,FarmerCropAPIView,ChatHistoryView,RAGStatusView
 
 urlpatterns = [
     path('', home, name='home'),  # root URL
@@ -14,4 +14,5 @@ urlpatterns = [
     path('app/ai/',AppChatManager.as_view(),name="add history"),
     path('app/farmer-crops/', FarmerCropAPIView.as_view(), name='farmer-crops'),
     path('app/chat-history/', ChatHistoryView.as_view(), name="chat-history"),
+    path('app/rag-status/', RAGStatusView.as_view(), name="rag-status"),
 ]
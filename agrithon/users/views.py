@@ -12,18 +12,21 @@ from langdetect import detect
 from django.http import HttpResponse
 from django.utils import timezone
 import time
-from langchain_google_genai import ChatGoogleGenerativeAI
 from geopy.geocoders import Nominatim
 from django.core.cache import cache
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain.tools import tool
+from langchain.tools import StructuredTool, tool
 from django.shortcuts import render
 from django.conf import settings # Import Django's settings
-from .whatsapp_bot_handler import check_greeting,INTRO_TEXT,check_pincode_intent,extract_address_details,analyze_farmer_query,get_weather_forecast_for_user,get_confident_answer_string
-# Assuming you have a file for your RAG engines
-from .pesticide_bot import RAGQueryEngineWithMemory
+from .whatsapp_bot_handler import ClassifiedMessage,INTRO_TEXT,get_weather_forecast_for_user,get_confident_answer_string
+# RAG engines are loaded lazily and shared through the registry
+from .rag_registry import rag_registry
+from .price_store import format_price_summary, get_price_store
+from .gazetteer import get_gazetteer
+from .llm_pool import DEGRADED_REPLY, LLMUnavailableError, get_llm, get_llm_pool
+from .chat_agent import PrebuiltAgent, current_agent_user
+from .weather import get_weather_service
+from .refusal_detector import get_refusal_detector, review_answer
 from .models import Chats
 import re
 import os
@@ -40,13 +43,9 @@ from django.core.cache import cache
 from .models import User, FarmerCrops
 from .serializers import FarmerCropsSerializer
 
-# --- Define Paths and Initialize Engines ---
-# It's good practice to define paths relative to your project if possible
-FAISS_INDEX_PATH_PESTICIDE = "/home/shivam/Desktop/learning/hacarhon/agrithon/users/faiss_index_agri_pesticide"
-FAISS_INDEX_PATH_PRICE = "/home/shivam/Desktop/learning/hacarhon/agrithon/users/faiss_index_agri"
-
-pesticide_engine = RAGQueryEngineWithMemory(index_path=FAISS_INDEX_PATH_PESTICIDE)
-price_engine = RAGQueryEngineWithMemory(index_path=FAISS_INDEX_PATH_PRICE)
+# --- RAG Engines ---
+# Index paths are configured in rag_registry.py (RAG_INDEX_PATH_* env vars). Engines are
+# only built on their first question, so importing this module stays cheap.
 
 # --- Utility Functions ---
 def fast_check_pincode(text: str) -> dict:
@@ -58,9 +57,78 @@ def fast_check_pincode(text: str) -> dict:
     else:
         return {"is_pincode": False, "pincode": None}
 
+def _resolve_location(text: str, pincode: str = None):
+    """
+    Resolves the place named in a free-text address from the offline gazetteer; the user's
+    pincode only breaks ties. None when the gazetteer isn't loaded or has no match.
+    """
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    try:
+        return gazetteer.resolve(text, pincode=pincode)
+    except Exception as e:
+        print(f"⚠️ Gazetteer lookup failed: {e}")
+        return None
+
+def _pincode_location(pincode: str):
+    """The gazetteer location of a pincode, or None. Use it only for messages known to be addresses."""
+    gazetteer = get_gazetteer()
+    if gazetteer is None or not pincode:
+        return None
+    try:
+        return gazetteer.by_pincode(pincode)
+    except Exception as e:
+        print(f"⚠️ Gazetteer lookup failed: {e}")
+        return None
+
+def _user_region(user_profile) -> str:
+    """Returns "state/district" for the user, used to scope cached RAG answers."""
+    parts = [getattr(user_profile, "state", "") or "", getattr(user_profile, "district", "") or ""]
+    return "/".join(part.strip() for part in parts if part.strip())
+
+@tool
+def get_mandi_prices(commodity: str, state: str = "", district: str = "", market: str = "", month: str = "") -> str:
+    """
+    Use this FIRST for crop/commodity price questions (mandi rates, min/max/modal price, price trends).
+    Pass the commodity name and, if the user mentioned them, state, district, market and month
+    (e.g. "March" or "2023-03"). State and district default to the user's profile.
+    """
+    user_profile = current_agent_user()
+    store = get_price_store()
+    if store is None:
+        return "Mandi price data is not available. Use get_general_agriculture_information instead."
+    try:
+        summary = store.price_summary(
+            commodity,
+            state=state or getattr(user_profile, "state", ""),
+            district=district or ("" if state else getattr(user_profile, "district", "")),
+            market=market,
+            month=month,
+        )
+        if summary is not None:
+            return f"📊 Mandi Prices:\n\n{format_price_summary(summary)}"
+    except Exception as e:
+        logger.error(f"Mandi price tool error for user {user_profile.phone}: {e}")
+    return f"No mandi price data found for {commodity}. Use get_general_agriculture_information instead."
+
 def home(request):
     return render(request, 'home.html')
 
+class RAGStatusView(APIView):
+    """Reports which RAG engines are loaded; usable as a readiness probe."""
+    def get(self, request):
+        engines = rag_registry.status()
+        detector = get_refusal_detector()
+        return Response({
+            "ready": all(info["warm"] for info in engines.values()),
+            "engines": engines,
+            "caches": rag_registry.cache_stats(),
+            "llm": get_llm_pool().stats(),
+            "weather": get_weather_service().stats(),
+            "guardrail": detector.stats() if detector else None
+        })
+
 # --- API Views ---
 class CreateUserView(APIView):
     def post(self, request):
@@ -109,80 +177,125 @@ from langchain_core.messages import messages_from_dict, messages_to_dict
 
 # Place this function with your other helper functions in views.py
 
+# --- Contextual agent ---
+# The contextual agents (here and for AppChatManager) are built once; their tools read
+# the user being answered from current_agent_user() instead of closing over it.
+
+@tool("get_weather_forecast")
+def get_profile_weather_forecast(query: str) -> str:
+    """
+    Useful for getting the weather forecast for the user's location.
+    The user's location is already known from their profile.
+    """
+    user_profile = current_agent_user()
+    lat = getattr(user_profile, 'latitude', None)
+    lon = getattr(user_profile, 'longitude', None)
+
+    if not lat or not lon:
+        return "I can't provide a weather forecast because your location is not set. Please provide a PIN code and address first. 📍"
+    try:
+        weather_info = get_weather_forecast_for_user(query, lat, lon)
+        return f"🌤️ Weather Information:\n\n{weather_info}"
+    except Exception as e:
+        logger.error(f"Weather tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble getting weather information right now. Please try again later. ☁️"
+
+def get_crop_disease_information(query: str) -> str:
+    """
+    Useful for diagnosing crop diseases or getting information on pesticides and treatments.
+    """
+    user_profile = current_agent_user()
+    try:
+        result = rag_registry.get("pesticide").ask_question(
+            query, session_id=str(user_profile.phone), region=_user_region(user_profile)
+        )
+        return f"🌿 Crop Disease Information:\n\n{result}"
+    except Exception as e:
+        logger.error(f"Disease tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble accessing disease information. Please try again later. 🌿"
+
+def get_general_agriculture_information(query: str) -> str:
+    """
+    Useful for general agriculture questions like crop selection and yield improvement,
+    and for price questions that get_mandi_prices has no data for.
+    """
+    user_profile = current_agent_user()
+    try:
+        result = rag_registry.get("price").ask_question(
+            query, session_id=str(user_profile.phone), region=_user_region(user_profile)
+        )
+        return f"🌾 Agricultural Information:\n\n{result}"
+    except Exception as e:
+        logger.error(f"Agriculture tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble accessing that information. Please try again later. 🌾"
+
+async def get_crop_disease_information_async(query: str) -> str:
+    user_profile = current_agent_user()
+    try:
+        engine = await rag_registry.aget("pesticide")
+        result = await engine.ask_question_async(
+            query, session_id=str(user_profile.phone), region=_user_region(user_profile)
+        )
+        return f"🌿 Crop Disease Information:\n\n{result}"
+    except Exception as e:
+        logger.error(f"Disease tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble accessing disease information. Please try again later. 🌿"
+
+async def get_general_agriculture_information_async(query: str) -> str:
+    user_profile = current_agent_user()
+    try:
+        engine = await rag_registry.aget("price")
+        result = await engine.ask_question_async(
+            query, session_id=str(user_profile.phone), region=_user_region(user_profile)
+        )
+        return f"🌾 Agricultural Information:\n\n{result}"
+    except Exception as e:
+        logger.error(f"Agriculture tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble accessing that information. Please try again later. 🌾"
+
+# Used by _get_contextual_ai_reply and its async counterpart. The RAG tools also have async
+# implementations for `ainvoke`; the other tools are quick or sync-only and run in a thread there.
+_contextual_agent = PrebuiltAgent(
+    lambda: get_llm("agent"),
+    [
+        get_profile_weather_forecast,
+        StructuredTool.from_function(func=get_crop_disease_information, coroutine=get_crop_disease_information_async),
+        StructuredTool.from_function(
+            func=get_general_agriculture_information, coroutine=get_general_agriculture_information_async
+        ),
+        get_mandi_prices,
+    ],
+    "You are a helpful and friendly farming assistant. Use the user's profile and chat history to provide accurate, concise, and relevant answers. If you don't know the answer, say so clearly.",
+    verbose=settings.AGENT_VERBOSE,
+    handle_parsing_errors=True,
+)
+
 def _get_contextual_ai_reply(user_input: str, history: list, user_profile: User) -> str:
     """
     Uses a LangChain agent with tools to generate a contextual response.
     This is the CORE AI LOGIC for both App and WhatsApp.
     """
-    # --- 1. Define Tools the AI can use ---
-    @tool
-    def get_weather_forecast(query: str) -> str:
-        """
-        Useful for getting the weather forecast for the user's location.
-        The user's location is already known from their profile.
-        """
-        lat = getattr(user_profile, 'latitude', None)
-        lon = getattr(user_profile, 'longitude', None)
-        
-        if not lat or not lon:
-            return "I can't provide a weather forecast because your location is not set. Please provide a PIN code and address first. 📍"
-        try:
-            weather_info = get_weather_forecast_for_user(query, lat, lon)
-            return f"🌤️ Weather Information:\n\n{weather_info}"
-        except Exception as e:
-            logger.error(f"Weather tool error for user {user_profile.phone}: {e}")
-            return "I'm having trouble getting weather information right now. Please try again later. ☁️"
-
-    @tool
-    def get_crop_disease_information(query: str) -> str:
-        """
-        Useful for diagnosing crop diseases or getting information on pesticides and treatments.
-        """
-        try:
-            # FIX: Removed the 'chat_history' argument. The engine uses session_id for memory.
-            result = pesticide_engine.ask_question(
-                query, 
-                session_id=str(user_profile.phone)
-            )
-            return f"🌿 Crop Disease Information:\n\n{result}"
-        except Exception as e:
-            logger.error(f"Disease tool error for user {user_profile.phone}: {e}")
-            return "I'm having trouble accessing disease information. Please try again later. 🌿"
+    try:
+        response = _contextual_agent.invoke(user_input, history, user_profile)
+        return response.get("output", "I'm sorry, I couldn't process that. Could you please rephrase?")
+    except LLMUnavailableError as e:
+        logger.warning(f"LLM unavailable for user {user_profile.phone}: {e}")
+        return DEGRADED_REPLY
+    except Exception as e:
+        logger.error(f"LangChain Agent Error for user {user_profile.phone}: {e}", exc_info=True)
+        return "I'm having a little trouble understanding. Could you please rephrase your question? 🌱"
 
-    @tool
-    def get_general_agriculture_information(query: str) -> str:
-        """
-        Useful for general agriculture questions like crop prices, crop selection, and yield improvement.
-        """
-        try:
-            # FIX: Removed the 'chat_history' argument. The engine uses session_id for memory.
-            result = price_engine.ask_question(
-                query, 
-                session_id=str(user_profile.phone)
-            )
-            return f"🌾 Agricultural Information:\n\n{result}"
-        except Exception as e:
-            logger.error(f"Agriculture tool error for user {user_profile.phone}: {e}")
-            return "I'm having trouble accessing that information. Please try again later. 🌾"
-
-    # --- 2. Set up the Agent (No changes needed here) ---
-    tools = [get_weather_forecast, get_crop_disease_information, get_general_agriculture_information]
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful and friendly farming assistant. Use the user's profile and chat history to provide accurate, concise, and relevant answers. If you don't know the answer, say so clearly."),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}"),
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
-    ])
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.1, convert_system_message_to_human=True)
-    agent = create_openai_tools_agent(llm, tools, prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
-    
+async def _get_contextual_ai_reply_async(user_input: str, history: list, user_profile: User) -> str:
+    """
+    Async counterpart of _get_contextual_ai_reply for ASGI callers: the agent and RAG
+    tools run on `ainvoke`, so waiting on Gemini and Ollama doesn't hold a thread.
+    """
     try:
-        response = agent_executor.invoke({
-            "input": user_input, 
-            "chat_history": history
-        })
+        response = await _contextual_agent.ainvoke(user_input, history, user_profile)
         return response.get("output", "I'm sorry, I couldn't process that. Could you please rephrase?")
+    except LLMUnavailableError as e:
+        logger.warning(f"LLM unavailable for user {user_profile.phone}: {e}")
+        return DEGRADED_REPLY
     except Exception as e:
         logger.error(f"LangChain Agent Error for user {user_profile.phone}: {e}", exc_info=True)
         return "I'm having a little trouble understanding. Could you please rephrase your question? 🌱"
@@ -375,9 +488,11 @@ class WhatsappChatManager(APIView):
             return self._get_help_message()
 
         current_state = session_data.get("state")
+        # Classified at most once per request, and only if the current state needs it
+        message = ClassifiedMessage(incoming_msg)
         
         if current_state is None:
-            return self._handle_initial_state(incoming_msg, session_data)
+            return self._handle_initial_state(message, session_data)
         elif current_state == AWAITING_GREETING_NUMBER:
             return self._handle_greeting_response(session_data)
         elif current_state == AWAITING_LANGUAGE_CHOICE:
@@ -385,16 +500,16 @@ class WhatsappChatManager(APIView):
         elif current_state == AWAITING_PIN_CODE:
             return self._handle_pincode_input(incoming_msg, session_data)
         elif current_state == AWAITING_ADDRESS:
-            return self._handle_address_input(incoming_msg, session_data)
+            return self._handle_address_input(message, session_data)
         elif current_state == AWAITING_PROBLEM_TYPE:
             return self._handle_problem_query(incoming_msg, session_data, user, memory)
         else:
             session_data["state"] = None
             return "I'm not sure how to help with that. Type 'help' for options or describe your farming question."
        
-    def _handle_initial_state(self, incoming_msg, session_data):
+    def _handle_initial_state(self, message, session_data):
         """Handle the initial user interaction"""
-        if check_greeting(incoming_msg):
+        if message.greeting().is_greeting:
             session_data["state"] = AWAITING_GREETING_NUMBER
             return INTRO_TEXT
         else:
@@ -447,29 +562,33 @@ class WhatsappChatManager(APIView):
             
             return f"Please provide a valid 6-digit PIN code (e.g., 123456). Attempt {session_data['retry_count']}/3"
 
-    def _handle_address_input(self, incoming_msg, session_data):
+    def _handle_address_input(self, message, session_data):
         """Handle address input with geocoding"""
         try:
-            result = extract_address_details(incoming_msg).model_dump()
+            # The offline gazetteer answers most addresses without the LLM or Nominatim
+            local_location = _resolve_location(message.text, pincode=session_data.get("pincode"))
+            if local_location is not None:
+                return self._save_address(
+                    session_data, local_location.latitude, local_location.longitude, local_location.address()
+                )
+
+            result = message.address().model_dump()
             
             if result.get("is_address"):
-                # Try to geocode the address
-                location = geolocator.geocode(incoming_msg, timeout=10)
+                address = {key: result.get(key, "") for key in ("state", "district", "city", "village")}
+                # An address the gazetteer can't name is still in the area of the user's pincode
+                pincode_location = _pincode_location(session_data.get("pincode"))
+                if pincode_location is not None:
+                    return self._save_address(
+                        session_data, pincode_location.latitude, pincode_location.longitude,
+                        {**pincode_location.address(), **{key: value for key, value in address.items() if value}}
+                    )
+                
+                # Last resort: geocode the address with Nominatim
+                location = geolocator.geocode(message.text, timeout=10)
                 
                 if location:
-                    session_data["latitude"] = location.latitude
-                    session_data["longitude"] = location.longitude
-                    session_data["address"] = {
-                        "state": result.get("state", ""),
-                        "district": result.get("district", ""),
-                        "city": result.get("city", ""),
-                        "village": result.get("village", "")
-                    }
-                    session_data["state"] = AWAITING_PROBLEM_TYPE
-                    session_data["retry_count"] = 0
-                    
-                    address_summary = f"State: {result.get('state', 'N/A')}, District: {result.get('district', 'N/A')}, City: {result.get('city', 'N/A')}"
-                    return f"Excellent! Your location has been saved: {address_summary} 📍✅\n\nNow, what farming question can I help you with? You can ask about:\n• Crop diseases 🦠\n• Weather forecasts ☀️🌧️\n• Crop prices 💰\n• Farming advice 🌾"
+                    return self._save_address(session_data, location.latitude, location.longitude, address)
                 else:
                     session_data["retry_count"] = session_data.get("retry_count", 0) + 1
                     
@@ -494,6 +613,16 @@ class WhatsappChatManager(APIView):
             session_data["state"] = AWAITING_PROBLEM_TYPE
             return "Let's continue. What farming question can I help you with? 🌱"
 
+    def _save_address(self, session_data, latitude, longitude, address):
+        session_data["latitude"] = latitude
+        session_data["longitude"] = longitude
+        session_data["address"] = address
+        session_data["state"] = AWAITING_PROBLEM_TYPE
+        session_data["retry_count"] = 0
+        
+        address_summary = f"State: {address.get('state') or 'N/A'}, District: {address.get('district') or 'N/A'}, City: {address.get('city') or 'N/A'}"
+        return f"Excellent! Your location has been saved: {address_summary} 📍✅\n\nNow, what farming question can I help you with? You can ask about:\n• Crop diseases 🦠\n• Weather forecasts ☀️🌧️\n• Crop prices 💰\n• Farming advice 🌾"
+
     # In class WhatsappChatManager:
 
     def _handle_problem_query(self, incoming_msg, session_data, user, memory):
@@ -508,6 +637,9 @@ class WhatsappChatManager(APIView):
             # 2. Add user's location from session to the user object so the tool can find it
             user.latitude = session_data.get("latitude")
             user.longitude = session_data.get("longitude")
+            address = session_data.get("address") or {}
+            user.state = address.get("state", "")
+            user.district = address.get("district", "")
 
             # 3. Call the unified agent to get a contextual reply
             ai_reply = _get_contextual_ai_reply(
@@ -538,7 +670,7 @@ class WhatsappChatManager(APIView):
         """Handle crop disease queries"""
         try:
             # Your engine's `ask_question` method now needs to accept `chat_history`
-            result = pesticide_engine.ask_question(
+            result = rag_registry.get("pesticide").ask_question(
                 query, 
                 session_id=str(phone_number),
                 chat_history=chat_history # Pass the context
@@ -552,7 +684,7 @@ class WhatsappChatManager(APIView):
         """Handle general agriculture queries"""
         try:
             # Your engine's `ask_question` method now needs to accept `chat_history`
-            result = price_engine.ask_question(
+            result = rag_registry.get("price").ask_question(
                 query, 
                 session_id=str(phone_number),
                 chat_history=chat_history # Pass the context
@@ -760,7 +892,7 @@ class CallBotManager(APIView):
             return "Please tell me your city or village name for weather information.", "location"
         
         try:
-            location = geolocator.geocode(user_input, timeout=10)
+            location = _resolve_location(user_input) or geolocator.geocode(user_input, timeout=10)
             if location:
                 session_data["latitude"] = location.latitude
                 session_data["longitude"] = location.longitude
@@ -1295,6 +1427,55 @@ def _convert_db_history_to_langchain_messages(db_history: list) -> list:
 
 
 
+# --- App agent tools ---
+# Same RAG engines as the WhatsApp agent, but the weather tool geocodes the profile address.
+
+@tool("get_weather_forecast")
+def get_address_weather_forecast(query: str) -> str:
+    """
+    Useful for getting the weather forecast for the user's location.
+    Use this for any questions about weather, rain, temperature, or climate.
+    The user's location is already known.
+    """
+    user_profile = current_agent_user()
+    full_address = f"{user_profile.address}".strip()
+    if not full_address:
+        return "I can't provide a weather forecast because your address is not set in your profile. Please update it. 📍"
+    try:
+        location = _resolve_location(full_address) or geolocator.geocode(full_address, timeout=10)
+        if not location:
+            return "I couldn't find your location from your profile address. Please check that it is correct. 📍"
+        weather_info = get_weather_forecast_for_user(query, location.latitude, location.longitude)
+        return f"🌤️ Weather Information:\n\n{weather_info}"
+    except Exception as e:
+        logger.error(f"Weather tool error for user {user_profile.phone}: {e}")
+        return "I'm having trouble getting weather information right now. Please try again later. ☁️"
+
+_app_agent = PrebuiltAgent(
+    lambda: get_llm("agent"),
+    [
+        get_address_weather_forecast,
+        StructuredTool.from_function(
+            func=get_crop_disease_information,
+            description=(
+                "Useful for diagnosing crop diseases or getting information on pesticides and treatments.\n"
+                "Use this for questions about sick plants, pests, insects, fungus, or crop health issues."
+            ),
+        ),
+        StructuredTool.from_function(
+            func=get_general_agriculture_information,
+            description=(
+                "Useful for general agriculture questions like crop selection and yield improvement,\n"
+                "and for price questions that get_mandi_prices has no data for.\n"
+                "Use this for questions about markets, what to plant, or how to increase farm output."
+            ),
+        ),
+        get_mandi_prices,
+    ],
+    "You are a helpful and friendly farming assistant...",
+    verbose=settings.AGENT_VERBOSE,
+)
+
 class AppChatManager(APIView):
     def get(self, request):
         phone = request.query_params.get("phone")
@@ -1428,7 +1609,6 @@ class AppChatManager(APIView):
         Evaluates a bot's answer. If it's a low-confidence refusal, it
         generates a new, better answer. Otherwise, it returns the original.
         """
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.2)
         system_prompt = """
         You are an expert AI quality assurance system for a farming assistant bot.
 
@@ -1449,8 +1629,9 @@ class AppChatManager(APIView):
             HumanMessage(content="Provide the direct answer string based on the rules.")
         ]
         try:
-            response = llm.invoke(messages)
-            final_answer = strip_markdown(response.content.strip())
+            final_answer = strip_markdown(review_answer(
+                incoming_msg, original_query, lambda: get_llm("guardrail").invoke(messages).content
+            ).strip())
             return final_answer[:997] + "..." if len(final_answer) > 1000 else final_answer
         except Exception as e:
             logger.error(f"QA Guardrail LLM call failed: {e}. Falling back to the original message.")
@@ -1466,73 +1647,12 @@ class AppChatManager(APIView):
         """
         Uses a LangChain agent with tools to generate a contextual response.
         """
-        # --- 1. Define Tools the AI can use ---
-        # The agent will have access to the 'user_profile' object from this scope.
-
-        @tool
-        def get_weather_forecast(query: str) -> str:
-            """
-            Useful for getting the weather forecast for the user's location.
-            Use this for any questions about weather, rain, temperature, or climate.
-            The user's location is already known.
-            """
-            full_address = f"{user_profile.address}".strip()
-            if not full_address:
-                return "I can't provide a weather forecast because your address is not set in your profile. Please update it. 📍"
-            try:
-                # Assuming geolocator and get_weather_forecast_for_user are available
-                location = geolocator.geocode(full_address, timeout=10)
-                if not location:
-                    return "I couldn't find your location from your profile address. Please check that it is correct. 📍"
-                weather_info = get_weather_forecast_for_user(query, location.latitude, location.longitude)
-                return f"🌤️ Weather Information:\n\n{weather_info}"
-            except Exception as e:
-                logger.error(f"Weather tool error for user {user_profile.phone}: {e}")
-                return "I'm having trouble getting weather information right now. Please try again later. ☁️"
-
-        @tool
-        def get_crop_disease_information(query: str) -> str:
-            """
-            Useful for diagnosing crop diseases or getting information on pesticides and treatments.
-            Use this for questions about sick plants, pests, insects, fungus, or crop health issues.
-            """
-            try:
-                # Assuming pesticide_engine is available
-                result = pesticide_engine.ask_question(query, session_id=str(user_profile.phone))
-                return f"🌿 Crop Disease Information:\n\n{result}"
-            except Exception as e:
-                logger.error(f"Disease tool error for user {user_profile.phone}: {e}")
-                return "I'm having trouble accessing disease information. Please try again later. 🌿"
-
-        @tool
-        def get_general_agriculture_information(query: str) -> str:
-            """
-            Useful for general agriculture questions like crop prices, crop selection, and yield improvement.
-            Use this for questions about markets, what to plant, or how to increase farm output.
-            """
-            try:
-                # Assuming price_engine is available
-                result = price_engine.ask_question(query, session_id=str(user_profile.phone))
-                return f"🌾 Agricultural Information:\n\n{result}"
-            except Exception as e:
-                logger.error(f"Agriculture tool error for user {user_profile.phone}: {e}")
-                return "I'm having trouble accessing that information. Please try again later. 🌾"
-
-
-        # --- 2. Set up the Agent ---
-        tools = [get_weather_forecast, get_crop_disease_information, get_general_agriculture_information]
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful and friendly farming assistant..."),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("user", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.1, convert_system_message_to_human=True)
-        agent = create_openai_tools_agent(llm, tools, prompt)
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
         try:
-            response = agent_executor.invoke({"input": user_input, "chat_history": history})
+            response = _app_agent.invoke(user_input, history, user_profile)
             return response.get("output", "I'm sorry, I couldn't process that. Could you please rephrase?")
+        except LLMUnavailableError as e:
+            logger.warning(f"LLM unavailable for user {user_profile.phone}: {e}")
+            return DEGRADED_REPLY
         except Exception as e:
             logger.error(f"LangChain Agent Error for user {user_profile.phone}: {e}", exc_info=True)
             return "I'm having a little trouble understanding. Could you please rephrase your question? 🌱"
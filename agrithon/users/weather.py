@@ -0,0 +1,193 @@
+# File: weather.py
+"""
+Direct weather answers for a user whose coordinates are already known.
+
+Weather questions used to go through a nested tool-calling agent: a
+`hub.pull` of the agent prompt from the LangChain hub, a Gemini call to pick
+the forecast tool and its arguments (lat/lon we already had), the forecast
+API itself, and a second Gemini call to write the reply. Here the number of
+days is read from the question with a few keyword rules, the forecast API is
+called directly and the reply is filled into a fixed template:
+
+    question -> forecast_window() -> Google Weather API -> format_forecast()
+
+That is one network hop, or none when the user's geohash cell is already in
+the ForecastCache (forecast_cache.py). Optional LLM phrasing
+(WEATHER_LLM_PHRASING) rewrites the templated forecast as a direct answer to
+the question using the vendored PHRASING_PROMPT; it falls back to the
+template if the LLM fails.
+"""
+import re
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+import requests
+from langchain_core.prompts import ChatPromptTemplate
+
+from .forecast_cache import ForecastCache
+from .intent_classifier import normalize
+
+FORECAST_URL = "https://weather.googleapis.com/v1/forecast/days:lookup"
+MAX_FORECAST_DAYS = 10
+DEFAULT_FORECAST_DAYS = 3
+
+# (pattern, first day offset, number of days) over the normalized question; the first match wins.
+# Patterns are space-delimited because \b splits Devanagari words at vowel signs.
+DAY_WINDOWS = [
+    (re.compile(r" (day after tomorrow|parso|परसों) "), 2, 1),
+    (re.compile(r" (tomorrow|tmrw|kal|कल) "), 1, 1),
+    (re.compile(r" (today|tonight|aaj|abhi|आज|अभी) "), 0, 1),
+    (re.compile(r" (week|weekly|hafte|hafta|saptah|हफ्ते|हफ़्ते|सप्ताह) "), 0, 7),
+]
+DAY_COUNT = re.compile(r" (\d{1,2}) ?(days?|din|दिन) ")
+
+# Vendored prompt for the optional phrasing step (no hub.pull at request time).
+PHRASING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a farming assistant. Answer the farmer's weather question using ONLY the forecast "
+               "below. Be brief (under 80 words), mention rain and temperature if relevant, and add one "
+               "practical farming tip if it follows from the forecast. Do not invent numbers.\n\n"
+               "Forecast:\n{forecast}"),
+    ("human", "{question}"),
+])
+
+
+def forecast_window(question: str) -> tuple:
+    """Returns (first day offset, number of days) the question asks about; 0 is today."""
+    text = f" {normalize(question)} "
+    for pattern, start, days in DAY_WINDOWS:
+        if pattern.search(text):
+            return start, days
+    match = DAY_COUNT.search(text)
+    if match:
+        return 0, max(1, min(int(match.group(1)), MAX_FORECAST_DAYS))
+    return 0, DEFAULT_FORECAST_DAYS
+
+
+def format_forecast(days: list) -> str:
+    """One line per day: date, min/max temperature, rain chance (when given) and conditions."""
+    lines = []
+    for day in days:
+        date_obj = datetime.fromisoformat(day["interval"]["startTime"].replace("Z", "+00:00"))
+        daytime = day.get("daytimeForecast", {})
+        max_temp = day.get("maxTemperature", {}).get("degrees", "N/A")
+        min_temp = day.get("minTemperature", {}).get("degrees", "N/A")
+        description = daytime.get("weatherCondition", {}).get("description", {}).get("text", "N/A")
+        rain = daytime.get("precipitation", {}).get("probability", {}).get("percent")
+        rain_text = f", 🌧️ {rain}% rain" if rain is not None else ""
+        lines.append(f"📅 {date_obj.strftime('%A, %b %d')}: 🌡️ {min_temp}°C / {max_temp}°C{rain_text}, ☀️ {description}")
+    return "\n".join(lines)
+
+
+class WeatherUnavailableError(RuntimeError):
+    """The forecast API is not configured or did not return a forecast."""
+
+
+class WeatherService:
+    def __init__(self, api_key: str, timeout: float = 10, llm=None, cache: ForecastCache = None):
+        """
+        `llm` is a chat model or a zero-argument callable returning one; None disables phrasing.
+        With a `cache`, the full 10-day forecast of the user's geohash cell is fetched once and
+        every window is sliced from it.
+        """
+        self.api_key = api_key
+        self.timeout = timeout
+        self._llm = llm
+        self.cache = cache
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._counters = {"answers": 0, "api_calls": 0, "api_errors": 0, "phrased": 0, "phrasing_errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def fetch_days(self, latitude: float, longitude: float, days: int) -> list:
+        """The API's `forecastDays` for the next `days` days (today first)."""
+        if not self.api_key:
+            raise WeatherUnavailableError("Weather API key is not configured.")
+        if self.cache is None:
+            return self._request(latitude, longitude, days)
+        try:
+            forecast_days = self.cache.get_or_fetch(
+                latitude, longitude, lambda lat, lon: self._request(lat, lon, MAX_FORECAST_DAYS)
+            )
+        except FutureTimeoutError as e:
+            raise WeatherUnavailableError("Timed out waiting for another forecast request.") from e
+        return forecast_days[:days]
+
+    def _request(self, latitude: float, longitude: float, days: int) -> list:
+        params = {
+            "key": self.api_key, "location.latitude": latitude, "location.longitude": longitude,
+            "days": max(1, min(days, MAX_FORECAST_DAYS)),
+        }
+        self._count("api_calls")
+        try:
+            response = self._session.get(FORECAST_URL, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            forecast_days = response.json().get("forecastDays", [])
+        except (requests.RequestException, ValueError) as e:
+            self._count("api_errors")
+            raise WeatherUnavailableError(f"Forecast request failed: {e}") from e
+        if not forecast_days:
+            raise WeatherUnavailableError("Forecast response had no days.")
+        return forecast_days
+
+    def forecast(self, latitude: float, longitude: float, days: int) -> str:
+        return format_forecast(self.fetch_days(latitude, longitude, days))
+
+    def answer(self, question: str, latitude: float, longitude: float) -> str:
+        """Forecast for the days the question asks about, templated (or phrased by the LLM if enabled)."""
+        self._count("answers")
+        start, days = forecast_window(question)
+        forecast = format_forecast(self.fetch_days(latitude, longitude, start + days)[start:start + days])
+        if self._llm is None:
+            return forecast
+        try:
+            llm = self._llm() if callable(self._llm) and not hasattr(self._llm, "invoke") else self._llm
+            reply = llm.invoke(PHRASING_PROMPT.format_messages(forecast=forecast, question=question))
+            self._count("phrased")
+            return f"{reply.content.strip()}\n\n{forecast}"
+        except Exception as e:
+            self._count("phrasing_errors")
+            print(f"⚠️ Weather phrasing failed, sending the plain forecast: {e}")
+            return forecast
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_weather_service() -> WeatherService:
+    """Process-wide service configured from settings.WEATHER_*."""
+    global _service
+    if _service is None:
+        from django.conf import settings
+        with _service_lock:
+            if _service is None:
+                llm = None
+                if getattr(settings, "WEATHER_LLM_PHRASING", False):
+                    from .llm_pool import get_llm
+                    llm = lambda: get_llm("weather")
+                cache = None
+                if getattr(settings, "WEATHER_CACHE_ENABLED", False):
+                    from django_redis import get_redis_connection
+                    cache = ForecastCache(
+                        get_redis_connection("default"),
+                        precision=settings.WEATHER_CACHE_GEOHASH_PRECISION,
+                        refresh_seconds=settings.WEATHER_CACHE_REFRESH_SECONDS,
+                    )
+                _service = WeatherService(
+                    getattr(settings, "WEATHER_API_KEY", ""),
+                    timeout=getattr(settings, "WEATHER_TIMEOUT_SECONDS", 10),
+                    llm=llm,
+                    cache=cache,
+                )
+    return _service